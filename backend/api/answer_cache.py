@@ -0,0 +1,139 @@
+# /app/api/answer_cache.py
+
+import os
+import re
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+
+# Rutas cuyas respuestas no dependen de datos en tiempo real ni de los números exactos
+# de la pregunta (las cotizaciones, noticias, divisas y cálculos nunca se cachean).
+DEFAULT_CACHEABLE_ROUTES = "RAG_NASDAQ,CONSEJO_GENERAL,FUERA_DE_TEMA,RECOMENDACION_COMPRA,RECOMENDACION_PORTAFOLIO,CONSEJO_DE_INVERSION"
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def numbers_signature(question: str) -> tuple:
+    """
+    Números presentes en la pregunta. "ingresos de Apple en 2021" y "en 2022" son
+    casi idénticas para el modelo de embeddings, así que solo se reutiliza una
+    respuesta si los números coinciden exactamente.
+    """
+    return tuple(sorted(set(_NUMBER_RE.findall(question))))
+
+
+class SemanticAnswerCache:
+    """
+    Caché de respuestas de /ask por similitud coseno entre embeddings de preguntas.
+
+    Las entradas se agrupan por ruta (route, sub_route): una pregunta solo puede
+    reutilizar respuestas de su misma ruta. La expulsión es por TTL y, al superar
+    `maxsize`, por LRU. Se vacía cuando cambia la generación de la ingestión.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl_seconds: float = 3600, threshold: float = 0.95,
+                 routes=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.routes = set(routes) if routes is not None else None
+        self._clock = clock
+        self._lock = threading.Lock()
+        # clave incremental -> (scope, vector normalizado, firma numérica, valor, timestamp)
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._generation = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    def accepts(self, sub_route: str) -> bool:
+        return self.maxsize > 0 and (self.routes is None or sub_route in self.routes)
+
+    def check_generation(self, generation: int):
+        """Vacía la caché si la ingestión modificó el corpus."""
+        with self._lock:
+            if generation != self._generation:
+                if self._entries:
+                    print(f"DEBUG: La generación de la ingestión cambió ({self._generation} -> {generation}). Vaciando caché de respuestas.")
+                    self.invalidations += 1
+                self._entries.clear()
+                self._generation = generation
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, scope: tuple, embedding, signature: tuple = ()):
+        """
+        Devuelve (valor, similitud) de la entrada más parecida de la misma ruta,
+        o None si ninguna supera el umbral.
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            now = self._clock()
+            best_key, best_score = None, -1.0
+            stale = []
+            for key, (entry_scope, vector, entry_signature, _, created) in self._entries.items():
+                if now - created > self.ttl_seconds:
+                    stale.append(key)
+                    continue
+                if entry_scope != scope or entry_signature != signature:
+                    continue
+                score = float(vector @ query)
+                if score > best_score:
+                    best_key, best_score = key, score
+            for key in stale:
+                del self._entries[key]
+                self.expired += 1
+
+            if best_key is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key][3], best_score
+
+    def put(self, scope: tuple, embedding, value, signature: tuple = ()):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[self._next_key] = (scope, self._normalize(embedding), signature, value, self._clock())
+            self._next_key += 1
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl_seconds,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "expired": self.expired,
+            "invalidations": self.invalidations,
+        }
+
+
+def answer_cache_from_env() -> SemanticAnswerCache:
+    routes = os.getenv("ANSWER_CACHE_ROUTES", DEFAULT_CACHEABLE_ROUTES)
+    return SemanticAnswerCache(
+        maxsize=int(os.getenv("ANSWER_CACHE_SIZE", 512)),
+        ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 3600)),
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95)),
+        routes=[r.strip() for r in routes.split(",") if r.strip()],
+    )
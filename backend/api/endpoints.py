@@ -1,29 +1,63 @@
 # /app/api/endpoints.py
 
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
+import os
 import json
+import time
+import asyncio
 
-from rag.retriever import retrieve_chunks
-from llm.router import route_question
-from llm.evaluator import are_chunks_sufficient
-from llm.generator import generate_rag_answer, generate_fallback_answer, handle_conversational_and_calculations
+from rag.retriever import retrieve_chunks_async, get_cache_stats, embed_query, INFER_FILTERS
+from rag.executor import run_in_retrieval_pool, get_executor_stats
+from rag.context_packing import pack_context, get_packing_stats
+from rag.metrics import LatencyRecorder
+from api.answer_cache import answer_cache_from_env, numbers_signature
+from api.singleflight import SingleFlight, SINGLEFLIGHT_ENABLED, normalize_question
+from api.quote_cache import quote_cache_from_env, QUOTE_CACHE_ENABLED
+from ingestion.config import GENERATION_FILE_PATH
+from ingestion.generation import read_generation
+from llm.router import route_and_extract_async, get_router_stats
+from llm.evaluator import are_chunks_sufficient_async, sufficiency_gate
+from llm.generator import generate_rag_answer_async, generate_fallback_answer_async, handle_conversational_and_calculations_async, local_conversational_answer
+from llm.generator import stream_rag_answer, stream_fallback_answer, stream_conversational_and_calculations, stream_news_summary, GenerationError
 from external_apis.financial_data import get_stock_quote, get_exchange_rate
-from llm.extractor import extract_financial_info
+from llm.extractor import extract_financial_info_async, local_extractor
+from llm.speculation import SpeculativeBranch, SpeculationStats, estimate_tokens
+from llm.response_cache import get_llm_cache_stats
+from llm.history import history_compactor, get_history_stats
+from llm.provider import get_provider_stats
+from llm.scheduler import get_scheduler_stats
+from calculations.compound_interest import compound_interest_answer, compound_interest_calculator
+from calculations.arithmetic import arithmetic_evaluator
 from external_apis.news_api import get_financial_news # ¡Nueva importación!
-from llm.generator import generate_news_summary # ¡Nueva importación!
+from llm.generator import generate_news_summary_async # ¡Nueva importación!
 
 
 from feedback.database import get_db, FeedbackLog
 
 router = APIRouter()
 
+# Caché semántica de respuestas (ver api/answer_cache.py)
+answer_cache = answer_cache_from_env()
+# Latencia total de /ask y time-to-first-token de /ask/stream
+ask_latency = LatencyRecorder()
+# "off": evaluador y luego generación; "rag": evaluador y generación RAG en paralelo;
+# "rag+fallback": además arranca la generación de fallback (ver _speculative_rag_answer)
+SPECULATIVE_MODE = os.getenv("SPECULATIVE_MODE", "off").lower()
+speculation_stats = SpeculationStats()
+# Coalescencia de requests idénticas en curso (ver api/singleflight.py)
+singleflight = SingleFlight()
+# Cotizaciones con TTL corto, stale-while-revalidate y consulta por lotes (ver api/quote_cache.py)
+quote_cache = quote_cache_from_env(get_stock_quote)
+
 # --- MODELOS ---
 class QuestionRequest(BaseModel):
     question: str
     chat_history: Optional[List[Dict[str, str]]] = None
+    chat_id: Optional[str] = None
 
 class FeedbackPayload(BaseModel):
     question: str
@@ -33,70 +67,276 @@ class FeedbackPayload(BaseModel):
     feedback_details: Optional[str] = None
     retrieved_chunks: Optional[list] = []
 
-# --- ENDPOINT /ask (CON LÓGICA COMPLETA) ---
-@router.post("/ask")
-async def ask(request: QuestionRequest):
+# --- PIPELINE DE /ask ---
+# Un único pipeline produce eventos (tipo, datos) que /ask junta en una respuesta JSON
+# y /ask/stream envía como server-sent events a medida que ocurren:
+#   status -> {"stage": ...}                   progreso (ruta elegida, búsqueda, etc.)
+#   chunks -> [chunks serializados]            referencias recuperadas para RAG
+#   token  -> {"text": ...}                    fragmento incremental de la respuesta
+#   error  -> {"detail": ..., "partial": True}  la generación se cortó a mitad de la respuesta
+#   done   -> {"answer": ..., "retrieved_chunks": [...]}  (con "incomplete": True si hubo error)
+async def _single(coro):
+    # Adapta una respuesta completa a la interfaz de fragmentos
+    yield await coro
+
+def _rag_pieces(question, chunks, chat_history, stream):
+    return (stream_rag_answer(question, chunks, chat_history) if stream
+            else _single(generate_rag_answer_async(question, chunks, chat_history)))
+
+def _fallback_pieces(question, chat_history, stream):
+    return (stream_fallback_answer(question, chat_history) if stream
+            else _single(generate_fallback_answer_async(question, chat_history)))
+
+async def _speculative_rag_answer(question, chunks, chat_history, stream):
+    """
+    Modo especulativo de RAG_NASDAQ: el evaluador y la generación RAG (y en
+    "rag+fallback" también la de fallback) arrancan a la vez. Cuando el evaluador
+    decide, se cancela la rama perdedora y se devuelven los fragmentos de la ganadora.
+    """
+    history_text = " ".join(msg.get("content") or "" for msg in chat_history or [])
+    context_text = "".join(chunk.page_content for chunk in chunks)
+    rag = SpeculativeBranch("rag", _rag_pieces(question, chunks, chat_history, stream),
+                            estimate_tokens(question + history_text + context_text))
+    fallback = None
+    if SPECULATIVE_MODE == "rag+fallback":
+        fallback = SpeculativeBranch("fallback", _fallback_pieces(question, chat_history, stream),
+                                     estimate_tokens(question + history_text))
     try:
-        route, sub_route = route_question(request.question)
-        print(f"Ruta principal: {route}, Sub-ruta: {sub_route}")
+        sufficient = await are_chunks_sufficient_async(question, chunks)
+    except BaseException:
+        rag.cancel()
+        if fallback:
+            fallback.cancel()
+        raise
 
-        bot_answer = ""
-        retrieved_chunks_for_response = []
+    if sufficient:
+        print("Los chunks son suficientes. Usando RAG (especulativo).")
+        if fallback:
+            fallback.cancel(speculation_stats)
+        speculation_stats.record_run("rag")
+        return rag.pieces()
 
-        if route == "CONVERSACIONAL":
-            bot_answer = handle_conversational_and_calculations(request.question, sub_route, request.chat_history)
-        
-        elif route == "DATOS_ESPECIFICOS":
-            if sub_route == "RAG_NASDAQ":
-                chunks = retrieve_chunks(request.question, top_k=3)
-                retrieved_chunks_for_response = chunks
+    print("Los chunks NO son suficientes. Usando Fallback (especulativo).")
+    rag.cancel(speculation_stats)
+    speculation_stats.record_run("fallback")
+    return fallback.pieces() if fallback else _fallback_pieces(question, chat_history, stream)
+
+async def _ask_events(request: QuestionRequest, stream: bool = False):
+    question, chat_history = request.question, request.chat_history
+    # Las preguntas iguales (normalizadas) y sin historial que llegan a la vez comparten
+    # una sola ejecución del enrutado y, si caen en la misma ruta, del resto del pipeline
+    coalesce = SINGLEFLIGHT_ENABLED and not _has_prior_history(question, chat_history)
+    normalized = normalize_question(question)
+
+    # En modo combinado, `extracted` ya trae las entidades y se evita la llamada al extractor
+    if coalesce:
+        route, sub_route, extracted = await singleflight.do(
+            ("route", normalized), lambda: route_and_extract_async(question))
+    else:
+        route, sub_route, extracted = await route_and_extract_async(question)
+    print(f"Ruta principal: {route}, Sub-ruta: {sub_route}")
+    yield "status", {"stage": "routed", "route": route, "sub_route": sub_route}
 
-                if are_chunks_sufficient(request.question, chunks):
+    if coalesce:
+        events = singleflight.events(
+            ("answer", normalized, route, sub_route, stream),
+            lambda: _answer_events(request, route, sub_route, extracted, stream))
+    else:
+        events = _answer_events(request, route, sub_route, extracted, stream)
+    async for event in events:
+        yield event
+
+async def _answer_events(request: QuestionRequest, route: str, sub_route: str, extracted, stream: bool):
+    question, chat_history = request.question, request.chat_history
+
+    # Solo las preguntas sin historial previo pueden reutilizar respuestas de otros usuarios
+    cache_embedding = None
+    if answer_cache.accepts(sub_route) and not _has_prior_history(question, chat_history):
+        cache_embedding = await run_in_retrieval_pool(_question_embedding, question)
+    if cache_embedding is not None:
+        answer_cache.check_generation(read_generation(GENERATION_FILE_PATH))
+        cached = answer_cache.get((route, sub_route), cache_embedding, numbers_signature(question))
+        if cached:
+            cached_response, similarity = cached
+            print(f"DEBUG: Respuesta servida desde la caché semántica (similitud {similarity:.3f}).")
+            yield "status", {"stage": "cached", "similarity": round(similarity, 4)}
+            if cached_response["retrieved_chunks"]:
+                yield "chunks", cached_response["retrieved_chunks"]
+            yield "token", {"text": cached_response["answer"]}
+            yield "done", cached_response
+            return
+
+    bot_answer = ""
+    pieces = None
+    generation_failed = False
+    retrieved_chunks_for_response = []
+
+    if route == "CONVERSACIONAL":
+        # Las respuestas fijas (FUERA_DE_TEMA) no esperan a que se resuma el historial
+        bot_answer = local_conversational_answer(question, sub_route) or ""
+        if not bot_answer:
+            chat_history = await history_compactor.compact_async(request.chat_id, chat_history)
+            pieces = (stream_conversational_and_calculations(question, sub_route, chat_history) if stream
+                      else _single(handle_conversational_and_calculations_async(question, sub_route, chat_history)))
+    
+    elif route == "DATOS_ESPECIFICOS":
+        if sub_route == "RAG_NASDAQ":
+            yield "status", {"stage": "retrieving"}
+            # Con RETRIEVAL_INFER_FILTERS el pre-filtro por ticker también usa las empresas que
+            # reconoce el extractor local ("Apple" -> AAPL), no solo los tickers en mayúsculas
+            ticker_hints = list(local_extractor.companies(question) or {}) if INFER_FILTERS else None
+            chunks = await retrieve_chunks_async(question, top_k=3, ticker_hints=ticker_hints)
+            retrieved_chunks_for_response = chunks
+            yield "chunks", serialize_chunks(chunks)
+
+            yield "status", {"stage": "evaluating"}
+            # El historial se ajusta al presupuesto de tokens antes de armar cualquier prompt
+            chat_history = await history_compactor.compact_async(request.chat_id, chat_history)
+            # La compuerta por scores decide sola fuera de su banda de incertidumbre
+            # (usa los chunks tal cual, igual que en la calibración)
+            sufficient = sufficiency_gate.decide(chunks)
+            # Evaluador y generador reciben el contexto empaquetado: vecinos fusionados y sin texto repetido
+            context = pack_context(chunks)
+            if sufficient is None and SPECULATIVE_MODE != "off" and context:
+                pieces = await _speculative_rag_answer(question, context, chat_history, stream)
+            else:
+                if sufficient is None:
+                    sufficient = await are_chunks_sufficient_async(question, context)
+                if sufficient:
                     print("Los chunks son suficientes. Usando RAG.")
-                    bot_answer = generate_rag_answer(request.question, chunks, request.chat_history)
+                    pieces = _rag_pieces(question, context, chat_history, stream)
                 else:
                     print("Los chunks NO son suficientes. Usando Fallback.")
-                    bot_answer = generate_fallback_answer(request.question, request.chat_history)
-            
-            elif sub_route == "API_COTIZACION":
-                # Lógica para extraer el símbolo de la acción de la pregunta
-                # Por simplicidad, usaremos un mock. En un caso real, esto sería un LLM.
-                stock_symbol, _, _ = extract_financial_info(request.question, sub_route)
-                if stock_symbol:
-                    bot_answer = get_stock_quote(stock_symbol)
-                else:
-                    bot_answer = "No pude identificar el símbolo de la acción en tu pregunta. Por favor, sé más específico."
+                    pieces = _fallback_pieces(question, chat_history, stream)
+        
+        elif sub_route == "API_COTIZACION":
+            # Lógica para extraer el símbolo de la acción de la pregunta
+            # Por simplicidad, usaremos un mock. En un caso real, esto sería un LLM.
+            stock_symbol, _, _ = extracted or await extract_financial_info_async(question, sub_route)
+            if stock_symbol:
+                bot_answer = await asyncio.to_thread(quote_cache.get if QUOTE_CACHE_ENABLED else get_stock_quote, stock_symbol)
+            else:
+                bot_answer = "No pude identificar el símbolo de la acción en tu pregunta. Por favor, sé más específico."
 
-            elif sub_route == "NOTICIAS": # ¡Nueva ruta!
-                entity, _, _ = extract_financial_info(request.question, sub_route)
-                if entity:
-                    news_articles = get_financial_news(entity)
-                    bot_answer = generate_news_summary(news_articles, entity)
+        elif sub_route == "NOTICIAS": # ¡Nueva ruta!
+            entity, _, _ = extracted or await extract_financial_info_async(question, sub_route)
+            if entity:
+                news_articles = await asyncio.to_thread(get_financial_news, entity)
+                pieces = (stream_news_summary(news_articles, entity) if stream
+                          else _single(generate_news_summary_async(news_articles, entity)))
+            else:
+                bot_answer = "No pude identificar la empresa o el tema para buscar noticias. Por favor, sé más específico."
+
+    elif route == "CALCULOS_Y_PROYECCIONES":
+        if sub_route == "TIPO_DE_CAMBIO":
+            from_currency, to_currency, amount_str = extracted or await extract_financial_info_async(question, sub_route)
+            try:
+                if from_currency and to_currency and amount_str:
+                    amount = float(amount_str)
+                    bot_answer = await asyncio.to_thread(get_exchange_rate, amount, from_currency, to_currency)
                 else:
-                    bot_answer = "No pude identificar la empresa o el tema para buscar noticias. Por favor, sé más específico."
-
-        elif route == "CALCULOS_Y_PROYECCIONES":
-            if sub_route == "TIPO_DE_CAMBIO":
-                from_currency, to_currency, amount_str = extract_financial_info(request.question, sub_route)
-                try:
-                    if from_currency and to_currency and amount_str:
-                        amount = float(amount_str)
-                        bot_answer = get_exchange_rate(amount, from_currency, to_currency)
-                    else:
-                        bot_answer = "No pude entender la conversión de monedas que solicitas. Por favor, especifica una cantidad, la moneda de origen y la de destino (ej: '100 USD a EUR')."
-                except ValueError:
-                    bot_answer = "Por favor, ingresa una cantidad numérica válida para la conversión."
+                    bot_answer = "No pude entender la conversión de monedas que solicitas. Por favor, especifica una cantidad, la moneda de origen y la de destino (ej: '100 USD a EUR')."
+            except ValueError:
+                bot_answer = "Por favor, ingresa una cantidad numérica válida para la conversión."
 
-        return {
-            "question": request.question,
-            "answer": (bot_answer or "").strip(),
-            "retrieved_chunks": serialize_chunks(retrieved_chunks_for_response),
-        }
+        elif sub_route == "INTERES_COMPUESTO":
+            # Se calcula localmente, sin pasar por el LLM
+            bot_answer = compound_interest_answer(question)
+
+        elif sub_route == "CALCULO_GENERAL":
+            # Primero el evaluador local; si no es una cuenta simple, el modelo conversacional.
+            # El historial solo se resume (una llamada a Gemini) si hace falta el modelo.
+            bot_answer = local_conversational_answer(question, sub_route) or ""
+            if not bot_answer:
+                chat_history = await history_compactor.compact_async(request.chat_id, chat_history)
+                pieces = (stream_conversational_and_calculations(question, sub_route, chat_history) if stream
+                          else _single(handle_conversational_and_calculations_async(question, sub_route, chat_history)))
+
+    if pieces is not None:
+        yield "status", {"stage": "generating"}
+        parts = []
+        try:
+            async for piece in pieces:
+                parts.append(piece)
+                yield "token", {"text": piece}
+        except GenerationError as e:
+            generation_failed = True
+            yield "error", {"detail": str(e), "partial": True}
+        bot_answer = "".join(parts)
+    elif bot_answer:
+        yield "token", {"text": bot_answer}
+
+    response = {
+        "answer": (bot_answer or "").strip(),
+        "retrieved_chunks": serialize_chunks(retrieved_chunks_for_response),
+    }
+    if generation_failed:
+        response["incomplete"] = True
+    elif cache_embedding is not None and response["answer"] and not _is_error_answer(response["answer"]):
+        answer_cache.put((route, sub_route), cache_embedding, response, numbers_signature(question))
+
+    yield "done", response
+
+# --- ENDPOINT /ask (CON LÓGICA COMPLETA) ---
+@router.post("/ask")
+async def ask(request: QuestionRequest):
+    try:
+        start = time.perf_counter()
+        async for event, data in _ask_events(request):
+            if event == "done":
+                ask_latency.record("ask_total", (time.perf_counter() - start) * 1000)
+                return {"question": request.question, **data}
 
     except Exception as e:
         print(f"ERROR CRÍTICO EN EL ENDPOINT /ask: {e}")
         raise HTTPException(status_code=500, detail=f"Error inesperado en el backend: {e}")
 
+# --- ENDPOINT /ask/stream (SERVER-SENT EVENTS) ---
+@router.post("/ask/stream")
+async def ask_stream(request: QuestionRequest):
+    async def event_source():
+        start = time.perf_counter()
+        first_token = True
+        try:
+            async for event, data in _ask_events(request, stream=True):
+                if event == "token" and first_token:
+                    first_token = False
+                    ask_latency.record("stream_time_to_first_token", (time.perf_counter() - start) * 1000)
+                if event == "done":
+                    ask_latency.record("stream_total", (time.perf_counter() - start) * 1000)
+                    data = {"question": request.question, **data}
+                yield _sse(event, data)
+        except Exception as e:
+            print(f"ERROR CRÍTICO EN EL ENDPOINT /ask/stream: {e}")
+            yield _sse("error", {"detail": f"Error inesperado en el backend: {e}"})
+
+    # X-Accel-Buffering evita que un proxy (nginx) acumule los eventos antes de enviarlos
+    return StreamingResponse(event_source(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --- ENDPOINT /metrics ---
+@router.get("/metrics")
+async def metrics():
+    return {
+        "retrieval": get_cache_stats(),
+        "answer_cache": answer_cache.stats(),
+        "router": get_router_stats(),
+        "retrieval_executor": get_executor_stats(),
+        "ask_latency": ask_latency.stats(),
+        "speculation": {"mode": SPECULATIVE_MODE, **speculation_stats.stats()},
+        "sufficiency_gate": sufficiency_gate.stats(),
+        "llm_cache": get_llm_cache_stats(),
+        "chat_history": get_history_stats(),
+        "context_packing": get_packing_stats(),
+        "llm_provider": get_provider_stats(),
+        "llm_scheduler": get_scheduler_stats(),
+        "singleflight": singleflight.stats(),
+        "local_extractor": local_extractor.stats(),
+        "compound_interest": compound_interest_calculator.stats(),
+        "arithmetic": arithmetic_evaluator.stats(),
+        "quote_cache": quote_cache.stats(),
+    }
+
 # --- ENDPOINT /feedback se mantiene igual ---
 @router.post("/feedback")
 async def handle_feedback(payload: FeedbackPayload, db: Session = Depends(get_db)):
@@ -125,4 +365,26 @@ def serialize_chunks(chunks):
             "page_content": getattr(c, "page_content", None),
             "metadata": getattr(c, "metadata", None),
         }
-    return [_one(c) for c in chunks or []]
\ No newline at end of file
+    return [_one(c) for c in chunks or []]
+
+def _has_prior_history(question, chat_history):
+    """El frontend incluye la pregunta actual al final de chat_history; esa no cuenta como historial."""
+    prior = list(chat_history or [])
+    if prior and prior[-1].get("role") == "user" and (prior[-1].get("content") or "").strip() == question.strip():
+        prior = prior[:-1]
+    return bool(prior)
+
+def _question_embedding(question):
+    try:
+        return embed_query(question)
+    except Exception as e:
+        print(f"DEBUG: No se pudo calcular el embedding para la caché de respuestas: {e}")
+        return None
+
+def _is_error_answer(answer):
+    # Los generadores devuelven estos mensajes cuando falla Gemini (y quote_cache cuando falla
+    # el proveedor de cotizaciones); no se cachean
+    return answer.startswith(("Error:", "Hubo un error", "No pude obtener la cotización"))
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,294 @@
+# /app/api/quote_cache.py
+
+import os
+import json
+import time
+import threading
+import urllib.parse
+import urllib.request
+from collections import OrderedDict, Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+
+QUOTE_CACHE_ENABLED = os.getenv("QUOTE_CACHE_ENABLED", "true").lower() == "true"
+# Servicio de cotizaciones HTTP con consulta por lotes (p. ej. benchmarks/fake_quote_server.py).
+# Sin él se usa external_apis.financial_data.get_stock_quote símbolo por símbolo.
+QUOTE_SERVICE_URL = os.getenv("QUOTE_SERVICE_URL", "")
+QUOTE_SERVICE_TIMEOUT_SECONDS = float(os.getenv("QUOTE_SERVICE_TIMEOUT_SECONDS", 5))
+
+
+class QuoteCache:
+    """
+    Caché de cotizaciones por símbolo con TTL corto y stale-while-revalidate:
+      - hasta `ttl_seconds` la cotización se sirve tal cual
+      - hasta `stale_seconds` se sirve la vieja y se refresca en segundo plano
+      - después se busca en el momento; si el proveedor falla, se sirve la vieja
+        mientras no pase `error_grace_seconds` (stale-if-error)
+
+    Los símbolos que faltan se piden juntos en una sola llamada a `fetch_many`
+    (de a `batch_size`), y si varias requests piden el mismo símbolo a la vez
+    comparten la llamada. El refresco periódico (start_refresher) mantiene al día
+    los `refresh_top_n` símbolos más consultados, también en un solo lote.
+    """
+
+    def __init__(self, fetch_one=None, fetch_many=None, ttl_seconds: float = 15, stale_seconds: float = 120,
+                 maxsize: int = 2048, batch_size: int = 50, refresh_interval_seconds: float = 10,
+                 refresh_top_n: int = 20, error_grace_seconds: float = 600, clock=time.monotonic):
+        if fetch_one is None and fetch_many is None:
+            raise ValueError("QuoteCache necesita fetch_one o fetch_many")
+        self.fetch_one = fetch_one
+        self.fetch_many = fetch_many
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = max(stale_seconds, ttl_seconds)
+        self.error_grace_seconds = max(error_grace_seconds, self.stale_seconds)
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.refresh_top_n = refresh_top_n
+        self.clock = clock
+        self._entries = OrderedDict()   # símbolo -> (cotización, momento de la consulta)
+        self._in_flight = {}            # símbolo -> Future de la consulta en curso
+        self._heat = Counter()          # consultas por símbolo, con decaimiento en cada refresco
+        self._lock = threading.Lock()
+        self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="quote-revalidate")
+        self._refresher = None
+        self._stop = threading.Event()
+        self.counts = {
+            "hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "upstream_calls": 0,
+            "symbols_fetched": 0, "revalidations": 0, "refreshes": 0, "errors": 0, "stale_on_error": 0,
+        }
+
+    @staticmethod
+    def _normalize(symbol: str) -> str:
+        return symbol.strip().upper()
+
+    def _store(self, quotes: dict):
+        now = self.clock()
+        with self._lock:
+            for symbol, quote in quotes.items():
+                self._entries[symbol] = (quote, now)
+                self._entries.move_to_end(symbol)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _call_upstream(self, symbols: list) -> dict:
+        """Una llamada al proveedor por lote (o una por símbolo si no hay consulta por lotes)."""
+        quotes = {}
+        if self.fetch_many:
+            for i in range(0, len(symbols), self.batch_size):
+                batch = symbols[i:i + self.batch_size]
+                quotes.update(self.fetch_many(batch))
+                with self._lock:
+                    self.counts["upstream_calls"] += 1
+                    self.counts["symbols_fetched"] += len(batch)
+        else:
+            for symbol in symbols:
+                quotes[symbol] = self.fetch_one(symbol)
+                with self._lock:
+                    self.counts["upstream_calls"] += 1
+                    self.counts["symbols_fetched"] += 1
+        return quotes
+
+    def _fetch(self, symbols: list) -> dict:
+        """Busca los símbolos compartiendo las consultas en curso; devuelve {símbolo: cotización}."""
+        own, waiting = [], {}
+        with self._lock:
+            for symbol in symbols:
+                future = self._in_flight.get(symbol)
+                if future is None:
+                    self._in_flight[symbol] = Future()
+                    own.append(symbol)
+                else:
+                    waiting[symbol] = future
+                    self.counts["coalesced"] += 1
+
+        results = {}
+        if own:
+            try:
+                quotes = self._call_upstream(own)
+                self._store(quotes)
+            except Exception as e:
+                with self._lock:
+                    self.counts["errors"] += 1
+                    futures = [self._in_flight.pop(symbol) for symbol in own]
+                for future in futures:
+                    future.set_exception(e)
+                raise
+            with self._lock:
+                futures = {symbol: self._in_flight.pop(symbol) for symbol in own}
+            for symbol, future in futures.items():
+                future.set_result(quotes.get(symbol))
+                results[symbol] = quotes.get(symbol)
+
+        for symbol, future in waiting.items():
+            results[symbol] = future.result()
+        return results
+
+    def _revalidate(self, symbols: list, field: str = "revalidations"):
+        """Refresca en segundo plano los símbolos que no tengan ya una consulta en curso."""
+        with self._lock:
+            symbols = [s for s in symbols if s not in self._in_flight]
+            if not symbols:
+                return
+            self.counts[field] += len(symbols)
+
+        def _run():
+            try:
+                self._fetch(symbols)
+            except Exception as e:
+                print(f"DEBUG: No se pudieron refrescar las cotizaciones {symbols}: {e}")
+        self._background.submit(_run)
+
+    def get_many(self, symbols) -> dict:
+        symbols = list(dict.fromkeys(self._normalize(s) for s in symbols if s and s.strip()))
+        now = self.clock()
+        results, stale, missing = {}, [], []
+        with self._lock:
+            self._heat.update(symbols)
+            for symbol in symbols:
+                entry = self._entries.get(symbol)
+                age = now - entry[1] if entry else None
+                if entry and age < self.ttl_seconds:
+                    self.counts["hits"] += 1
+                    results[symbol] = entry[0]
+                elif entry and age < self.stale_seconds:
+                    self.counts["stale_hits"] += 1
+                    results[symbol] = entry[0]
+                    stale.append(symbol)
+                else:
+                    self.counts["misses"] += 1
+                    missing.append(symbol)
+
+        if stale:
+            self._revalidate(stale)
+        if missing:
+            try:
+                results.update(self._fetch(missing))
+            except Exception:
+                # Si el proveedor falla se sirve la última cotización conocida, si no es demasiado vieja
+                recovered = self._recover_stale(missing, now)
+                if len(recovered) < len(missing):
+                    raise
+                results.update(recovered)
+        return results
+
+    def _recover_stale(self, symbols: list, now: float) -> dict:
+        recovered = {}
+        with self._lock:
+            for symbol in symbols:
+                entry = self._entries.get(symbol)
+                if entry and now - entry[1] < self.error_grace_seconds:
+                    recovered[symbol] = entry[0]
+                    self.counts["stale_on_error"] += 1
+        return recovered
+
+    def get(self, symbol: str):
+        """Como get_many para un símbolo, pero si el proveedor falla devuelve un aviso (que no se cachea)."""
+        symbol = self._normalize(symbol)
+        try:
+            return self.get_many([symbol]).get(symbol)
+        except Exception as e:
+            print(f"DEBUG: No se pudo obtener la cotización de {symbol}: {e}")
+            return quote_unavailable_message(symbol)
+
+    # --- Refresco periódico de los símbolos más consultados ---
+
+    def refresh_hottest(self):
+        """Refresca en un lote los más consultados que estén por vencer, y decae el contador de consultas."""
+        now = self.clock()
+        due = []
+        with self._lock:
+            for symbol, _ in self._heat.most_common(self.refresh_top_n):
+                entry = self._entries.get(symbol)
+                if entry is None or now - entry[1] >= self.ttl_seconds / 2:
+                    due.append(symbol)
+            self._heat = Counter({s: c // 2 for s, c in self._heat.items() if c // 2 > 0})
+        if due:
+            self._revalidate(due, field="refreshes")
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval_seconds):
+            try:
+                self.refresh_hottest()
+            except Exception as e:
+                print(f"DEBUG: Error en el refresco de cotizaciones: {e}")
+
+    def start_refresher(self):
+        if self._refresher is not None or self.refresh_interval_seconds <= 0:
+            return
+        self._stop.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="quote-refresher", daemon=True)
+        self._refresher.start()
+
+    def stop_refresher(self):
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join(timeout=1)
+            self._refresher = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._heat.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.counts["hits"] + self.counts["stale_hits"] + self.counts["misses"]
+            return {
+                "enabled": QUOTE_CACHE_ENABLED,
+                "size": len(self._entries),
+                "ttl_seconds": self.ttl_seconds,
+                "stale_seconds": self.stale_seconds,
+                "batched": self.fetch_many is not None,
+                "refresher_running": self._refresher is not None,
+                **self.counts,
+                "hit_rate": round((self.counts["hits"] + self.counts["stale_hits"]) / lookups, 4) if lookups else 0.0,
+                "hottest": [symbol for symbol, _ in self._heat.most_common(5)],
+            }
+
+
+# --- Cliente del servicio de cotizaciones por lotes ---
+
+def quote_unavailable_message(symbol: str) -> str:
+    return f"No pude obtener la cotización de {symbol} en este momento. Intenta de nuevo en unos minutos."
+
+
+def format_quote(symbol: str, quote) -> str:
+    if not quote:
+        return f"No encontré la cotización de {symbol}. Verifica que el símbolo sea correcto."
+    change = quote.get("change_percent")
+    change_text = f" ({change:+.2f}% en el día)" if change is not None else ""
+    return f"El precio actual de {symbol} es {quote['price']:.2f} {quote.get('currency', 'USD')}{change_text}."
+
+
+def http_quote_fetcher(base_url: str, timeout: float = QUOTE_SERVICE_TIMEOUT_SECONDS):
+    """
+    fetch_many contra un servicio con GET /quotes?symbols=AAPL,MSFT que responde
+    {"quotes": {"AAPL": {"price": ..., "change_percent": ..., "currency": ...}}}.
+    Devuelve la respuesta ya redactada, igual que get_stock_quote.
+    """
+    def fetch_many(symbols):
+        query = urllib.parse.urlencode({"symbols": ",".join(symbols)})
+        with urllib.request.urlopen(f"{base_url.rstrip('/')}/quotes?{query}", timeout=timeout) as resp:
+            quotes = json.loads(resp.read()).get("quotes", {})
+        return {symbol: format_quote(symbol, quotes.get(symbol)) for symbol in symbols}
+    return fetch_many
+
+
+def quote_cache_from_env(fetch_one=None) -> QuoteCache:
+    cache = QuoteCache(
+        fetch_one=fetch_one,
+        fetch_many=http_quote_fetcher(QUOTE_SERVICE_URL) if QUOTE_SERVICE_URL else None,
+        ttl_seconds=float(os.getenv("QUOTE_TTL_SECONDS", 15)),
+        stale_seconds=float(os.getenv("QUOTE_STALE_SECONDS", 120)),
+        maxsize=int(os.getenv("QUOTE_CACHE_SIZE", 2048)),
+        batch_size=int(os.getenv("QUOTE_BATCH_SIZE", 50)),
+        refresh_interval_seconds=float(os.getenv("QUOTE_REFRESH_INTERVAL_SECONDS", 10)),
+        refresh_top_n=int(os.getenv("QUOTE_REFRESH_TOP_N", 20)),
+        error_grace_seconds=float(os.getenv("QUOTE_STALE_IF_ERROR_SECONDS", 600)),
+    )
+    # Por defecto el refresco solo corre con el servicio por lotes: con fetch_one serían
+    # refresh_top_n llamadas sueltas cada pocos segundos aunque nadie pregunte
+    refresher_default = "true" if cache.fetch_many is not None else "false"
+    if QUOTE_CACHE_ENABLED and os.getenv("QUOTE_REFRESHER_ENABLED", refresher_default).lower() == "true":
+        cache.start_refresher()
+    return cache
@@ -0,0 +1,107 @@
+# /app/api/singleflight.py
+
+import os
+import re
+import asyncio
+import threading
+import unicodedata
+from llm.provider import llm_call_counter
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+
+_END = object()
+
+
+def normalize_question(question: str) -> str:
+    """Minúsculas, sin signos de apertura/cierre ni espacios repetidos."""
+    text = unicodedata.normalize("NFC", question).casefold()
+    text = re.sub(r"[¿?¡!.,;:\"']+", " ", text)
+    return " ".join(text.split())
+
+
+class _Flight:
+    def __init__(self):
+        self.events = []
+        self.subscribers = []
+        self.joined = 0
+        self.finished = False
+        self.llm_calls = [0]
+        self.task = None
+
+
+class SingleFlight:
+    """
+    Coalescencia de ejecuciones en curso: la primera request con una clave lanza la
+    ejecución (un generador asíncrono de eventos) en una tarea propia, y las que llegan
+    con la misma clave mientras sigue en curso reciben los mismos eventos, incluidos
+    los ya emitidos. Si todos los suscriptores se van, la ejecución se cancela.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.counts = {"leaders": 0, "followers": 0, "saved_llm_calls": 0}
+
+    async def _run(self, key, flight: _Flight, events_factory):
+        # Las llamadas al LLM hechas dentro de la ejecución se cuentan en flight.llm_calls
+        token = llm_call_counter.set(flight.llm_calls)
+        item = _END
+        try:
+            async for event in events_factory():
+                flight.events.append(event)
+                for queue in flight.subscribers:
+                    queue.put_nowait(event)
+        except Exception as e:
+            item = e
+        finally:
+            llm_call_counter.reset(token)
+            flight.finished = True
+            self._flights.pop(key, None)
+            for queue in flight.subscribers:
+                queue.put_nowait(item)
+            with self._lock:
+                self.counts["saved_llm_calls"] += flight.llm_calls[0] * (flight.joined - 1)
+
+    async def events(self, key, events_factory):
+        flight = self._flights.get(key)
+        if flight is None or flight.finished:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, events_factory))
+            with self._lock:
+                self.counts["leaders"] += 1
+        else:
+            with self._lock:
+                self.counts["followers"] += 1
+            print(f"DEBUG: Request sumada a una ejecución en curso ({len(flight.subscribers)} esperando).")
+
+        queue = asyncio.Queue()
+        for event in flight.events:
+            queue.put_nowait(event)
+        flight.subscribers.append(queue)
+        flight.joined += 1
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            flight.subscribers.remove(queue)
+            if not flight.subscribers and not flight.finished:
+                flight.task.cancel()
+
+    async def do(self, key, coro_factory):
+        """Igual que events() para una corrutina con un único resultado."""
+        async def _single():
+            yield await coro_factory()
+        result = None
+        async for result in self.events(key, _single):
+            pass
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"enabled": SINGLEFLIGHT_ENABLED, "in_flight": len(self._flights), **self.counts}
@@ -0,0 +1,101 @@
+# /app/benchmarks/embedding_engines.py
+"""
+Micro-benchmark de los motores de embeddings (PyTorch vs ONNX Runtime).
+
+Cada motor se mide en un subproceso nuevo para que el arranque en frío y la memoria
+residente (RSS) no se contaminen entre sí. Se reporta:
+  - cold_start_s : import + carga del modelo + primer encode
+  - rss_mb       : memoria residente del proceso después de cargar y codificar
+  - docs_per_s   : throughput de embed_documents (chunks de ~1000 caracteres)
+  - queries_per_s: throughput de embed_query (una pregunta por llamada)
+
+Uso (desde /app):
+    python -m benchmarks.embedding_engines [torch onnx onnx-int8]
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "/app/models/all-MiniLM-L6-v2-onnx")
+
+SAMPLE_QUERIES = [
+    "¿Qué hace Apple?", "historia de Microsoft", "ingresos de NVIDIA en 2023",
+    "what does Amazon do", "riesgos principales de Tesla", "dividendos de Cisco",
+]
+SAMPLE_CHUNK = (
+    "Net sales increased during 2021 compared to 2020 due primarily to higher net sales of iPhone, "
+    "Mac, iPad, Wearables, Home and Accessories and Services. La compañía reportó un crecimiento "
+    "sostenido en todos sus segmentos geográficos, con especial énfasis en la región de Asia Pacífico. "
+) * 4
+
+
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _build(engine):
+    if engine == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    from ingestion.onnx_embeddings import OnnxEmbeddings
+    return OnnxEmbeddings(ONNX_MODEL_DIR, quantized=engine == "onnx-int8")
+
+
+def run_child(engine, n_docs=256, n_queries=200):
+    start = time.perf_counter()
+    embeddings = _build(engine)
+    embeddings.embed_query("warmup")
+    cold_start = time.perf_counter() - start
+
+    docs = [f"{i} {SAMPLE_CHUNK}" for i in range(n_docs)]
+    start = time.perf_counter()
+    embeddings.embed_documents(docs)
+    docs_per_s = n_docs / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(n_queries):
+        embeddings.embed_query(f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} {i}")
+    queries_per_s = n_queries / (time.perf_counter() - start)
+
+    return {
+        "engine": engine,
+        "cold_start_s": round(cold_start, 3),
+        "rss_mb": round(_rss_mb(), 1),
+        "docs_per_s": round(docs_per_s, 1),
+        "queries_per_s": round(queries_per_s, 1),
+    }
+
+
+def main(engines):
+    rows = []
+    for engine in engines:
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.embedding_engines", "--child", engine],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"❌ {engine}: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'error'}")
+            continue
+        rows.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    if not rows:
+        return
+    headers = ["engine", "cold_start_s", "rss_mb", "docs_per_s", "queries_per_s"]
+    print(" | ".join(f"{h:>14}" for h in headers))
+    for row in rows:
+        print(" | ".join(f"{row[h]:>14}" for h in headers))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        print(json.dumps(run_child(sys.argv[2])))
+    else:
+        main(sys.argv[1:] or ["torch", "onnx", "onnx-int8"])
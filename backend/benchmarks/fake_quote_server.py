@@ -0,0 +1,110 @@
+# /app/benchmarks/fake_quote_server.py
+"""
+Servidor de cotizaciones falso para pruebas y benchmarks de api/quote_cache.py.
+
+Responde GET /quotes?symbols=AAPL,MSFT con precios deterministas por símbolo que
+hacen un pequeño paseo aleatorio en el tiempo, con una latencia simulada por
+llamada (no por símbolo, como un proveedor real con consulta por lotes). Los
+símbolos que empiezan con "X" no existen; GET /stats devuelve cuántas llamadas
+y símbolos atendió, para comparar con /metrics -> quote_cache.
+
+Uso:
+    python -m benchmarks.fake_quote_server [puerto] [latencia_ms] [tasa_de_errores]
+    python -m benchmarks.fake_quote_server 8765 150 0.05
+
+y levantar el backend apuntando a él:
+    QUOTE_SERVICE_URL=http://localhost:8765 uvicorn main:app
+
+Desde código (por ejemplo en una prueba) se puede levantar en un hilo:
+    server, url = start_fake_quote_server(latency_ms=50)
+    ...
+    server.shutdown()
+"""
+
+import sys
+import json
+import time
+import zlib
+import random
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Cada cuántos segundos cambia el precio simulado
+TICK_SECONDS = 1.0
+
+
+def fake_quote(symbol: str, now: float = None) -> dict:
+    """Precio base estable por símbolo más un paseo aleatorio que avanza un paso por tick."""
+    seed = zlib.crc32(symbol.encode())
+    base = 20 + seed % 480
+    tick = int((now if now is not None else time.time()) / TICK_SECONDS)
+    rng = random.Random(seed ^ tick)
+    change_percent = round(rng.gauss(0, 1.5), 2)
+    return {"price": round(base * (1 + change_percent / 100), 2), "change_percent": change_percent, "currency": "USD"}
+
+
+class FakeQuoteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms: float = 100, error_rate: float = 0.0):
+        super().__init__(address, _Handler)
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "symbols": 0, "errors": 0}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeQuoteServer
+
+    def _send(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path == "/stats":
+            with self.server.lock:
+                return self._send(200, dict(self.server.counts))
+        if url.path != "/quotes":
+            return self._send(404, {"error": "not found"})
+
+        symbols = [s.strip().upper() for s in urllib.parse.parse_qs(url.query).get("symbols", [""])[0].split(",") if s.strip()]
+        time.sleep(self.server.latency_ms / 1000)
+        with self.server.lock:
+            self.server.counts["requests"] += 1
+            self.server.counts["symbols"] += len(symbols)
+            failed = random.random() < self.server.error_rate
+            if failed:
+                self.server.counts["errors"] += 1
+        if failed:
+            return self._send(503, {"error": "simulated upstream error"})
+        now = time.time()
+        self._send(200, {"quotes": {s: fake_quote(s, now) for s in symbols if not s.startswith("X")}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_quote_server(port: int = 0, latency_ms: float = 100, error_rate: float = 0.0):
+    """Levanta el servidor en un hilo; con port=0 elige uno libre. Devuelve (servidor, url)."""
+    server = FakeQuoteServer(("127.0.0.1", port), latency_ms, error_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    server = FakeQuoteServer(("0.0.0.0", port), latency_ms, error_rate)
+    print(f"Servidor de cotizaciones falso en http://localhost:{port} (latencia {latency_ms} ms, errores {error_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
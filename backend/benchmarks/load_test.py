@@ -0,0 +1,114 @@
+# /app/benchmarks/load_test.py
+"""
+Prueba de carga de /ask contra un backend en ejecución (un solo worker de uvicorn).
+
+Para cada nivel de concurrencia lanza N clientes que envían preguntas en bucle
+durante `duration` segundos, y en paralelo sondea GET /metrics: si el event loop
+está bloqueado por una llamada síncrona, la latencia de /metrics sube junto con
+la de /ask. Reporta throughput (req/s), p50/p95 de /ask y p95 de la sonda.
+
+Uso:
+    python -m benchmarks.load_test [url] [duración_s] [concurrencias separadas por coma]
+    python -m benchmarks.load_test http://localhost:8000 20 1,4,16,32
+
+Para comparar antes/después, correrlo contra cada build con las mismas preguntas.
+
+Para medir solo el overhead propio (sin red ni API key), levantar el backend con el
+proveedor stub (ver llm/provider.py) y la caché de respuestas LLM apagada:
+    LLM_PROVIDER=stub STUB_LATENCY=lognormal:400,0.4 LLM_CACHE_ENABLED=false uvicorn main:app
+La latencia simulada acumulada por rol aparece en /metrics -> llm_provider.simulated_ms.
+"""
+
+import sys
+import json
+import time
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+QUESTIONS = [
+    "¿Qué hace Apple?",
+    "historia de Microsoft",
+    "¿cuáles fueron los ingresos de NVIDIA en 2021?",
+    "hola, ¿quién eres?",
+    "¿debo invertir en bonos?",
+    "principales riesgos de Tesla según su reporte anual",
+]
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+def _post(url, question, timeout):
+    body = json.dumps({"question": question, "chat_history": []}).encode()
+    req = urllib.request.Request(f"{url}/ask", data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        resp.read()
+
+
+def _get(url, timeout):
+    with urllib.request.urlopen(f"{url}/metrics", timeout=timeout) as resp:
+        resp.read()
+
+
+def run_level(url, concurrency, duration, timeout=120):
+    deadline = time.perf_counter() + duration
+    latencies, probe_latencies, errors = [], [], [0]
+    lock = threading.Lock()
+
+    def client(worker_id):
+        i = worker_id
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                _post(url, QUESTIONS[i % len(QUESTIONS)], timeout)
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            i += concurrency
+
+    def probe():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                _get(url, timeout)
+                probe_latencies.append(time.perf_counter() - start)
+            except Exception:
+                pass
+            time.sleep(0.1)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency + 1) as pool:
+        pool.submit(probe)
+        for worker_id in range(concurrency):
+            pool.submit(client, worker_id)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_s": round(_percentile(latencies, 0.50), 3),
+        "p95_s": round(_percentile(latencies, 0.95), 3),
+        "probe_p95_ms": round(_percentile(probe_latencies, 0.95) * 1000, 1),
+    }
+
+
+def main(url, duration, levels):
+    headers = ["concurrency", "requests", "errors", "rps", "p50_s", "p95_s", "probe_p95_ms"]
+    print(" | ".join(f"{h:>12}" for h in headers))
+    for concurrency in levels:
+        row = run_level(url, concurrency, duration)
+        print(" | ".join(f"{row[h]:>12}" for h in headers))
+
+
+if __name__ == "__main__":
+    url = sys.argv[1].rstrip("/") if len(sys.argv) > 1 else "http://localhost:8000"
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    levels = [int(c) for c in sys.argv[3].split(",")] if len(sys.argv) > 3 else [1, 4, 16, 32]
+    main(url, duration, levels)
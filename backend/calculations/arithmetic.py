@@ -0,0 +1,279 @@
+# /app/calculations/arithmetic.py
+"""
+Evaluador local de cuentas para la sub-ruta CALCULO_GENERAL.
+
+La pregunta se traduce a una expresión ("15% de 2300" -> 15/100*2300, "dividido
+entre" -> /, "elevado a" -> **) y se evalúa recorriendo su AST con una lista blanca
+de nodos, en aritmética decimal. Si queda alguna palabra que no se entiende, la
+pregunta no es una cuenta simple y se devuelve None para que la responda el LLM.
+"""
+
+import re
+import ast
+import time
+import threading
+from decimal import Decimal, localcontext, InvalidOperation, DivisionByZero, Overflow
+from typing import Optional
+from rag.metrics import LatencyRecorder
+from llm.local_extractor import fold, normalize_number
+
+MAX_EXPRESSION_LENGTH = 200
+MAX_NODES = 60
+# Exponente máximo aceptado en una potencia (evita cuentas de millones de dígitos)
+MAX_EXPONENT = 10000
+DECIMAL_PRECISION = 50
+# Decimales que se muestran en la respuesta
+DISPLAY_DECIMALS = 6
+
+# Frases de operadores; las de varias palabras van primero
+_PHRASES = [
+    ("por ciento de", "/100*"), ("percent of", "/100*"), ("% de", "/100*"), ("% del", "/100*"), ("% of", "/100*"),
+    ("por ciento", "/100"), ("percent", "/100"), ("%", "/100"),
+    ("multiplicado por", "*"), ("multiplied by", "*"), ("veces", "*"), ("times", "*"), ("por", "*"),
+    ("x", "*"), ("×", "*"), ("·", "*"),
+    ("dividido por", "/"), ("dividido entre", "/"), ("dividido en", "/"), ("dividido", "/"), ("divided by", "/"),
+    ("entre", "/"), ("over", "/"), ("÷", "/"),
+    ("sumado a", "+"), ("mas", "+"), ("plus", "+"),
+    ("menos", "-"), ("minus", "-"),
+    ("elevado a la potencia", "**"), ("elevado a la", "**"), ("elevado a", "**"), ("elevado", "**"),
+    ("a la potencia", "**"), ("to the power of", "**"), ("to the", "**"), ("^", "**"),
+    ("al cuadrado", "**2"), ("squared", "**2"), ("al cubo", "**3"), ("cubed", "**3"),
+    ("raiz cuadrada de", "sqrt"), ("raiz de", "sqrt"), ("square root of", "sqrt"), ("sqrt", "sqrt"),
+    ("valor absoluto de", "abs"), ("absolute value of", "abs"), ("abs", "abs"),
+]
+# Palabras que pueden rodear a la cuenta sin cambiarla
+_FILLER = {
+    "cuanto", "cuantos", "es", "son", "da", "seria", "serian", "calcula", "calcular", "calculame", "calculo",
+    "resultado", "resuelve", "dime", "me", "el", "la", "los", "las", "del", "de", "un", "una", "por", "favor",
+    "cual", "que", "y", "suma", "resta", "multiplica", "divide", "operacion", "cuenta", "hace", "hacer",
+    "what", "whats", "is", "the", "of", "how", "much", "calculate", "compute", "please", "result", "equals",
+    "igual", "a", "eso", "esto",
+}
+_FUNCTIONS = {"sqrt", "abs"}
+_TOKEN_RE = re.compile(r"\d[\d.,]*\d|\d|\*\*|[-+*/^()%×÷·]|[a-zñ]+")
+_NUMBER_TOKEN_RE = re.compile(r"\d[\d.,]*\d|\d")
+_PHRASE_TOKENS = [(tuple(_TOKEN_RE.findall(phrase)), operator) for phrase, operator in _PHRASES]
+
+_BINARY = {ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow}
+_UNARY = {ast.UAdd, ast.USub}
+_SYMBOLS = {"+": " + ", "-": " - ", "*": " × ", "/": " ÷ ", "**": "^", "/100*": "% × ", "/100": "%", "**2": "²", "**3": "³"}
+_MULTIPLIERS = {"mil": Decimal(1000), "k": Decimal(1000), "millones": Decimal(10) ** 6, "millon": Decimal(10) ** 6,
+                "million": Decimal(10) ** 6}
+
+
+class UnsafeExpression(Exception):
+    """La expresión usa algo fuera de la lista blanca o excede los límites."""
+
+
+def _match_phrase(tokens, i, parts):
+    """Operador que empieza en tokens[i] y cuántos tokens ocupa, o (None, 0)."""
+    for phrase, operator in _PHRASE_TOKENS:
+        if tuple(tokens[i:i + len(phrase)]) != phrase:
+            continue
+        # "por" y "x" son multiplicación solo entre dos términos ("por favor", "x" suelta)
+        if phrase in (("por",), ("x",)):
+            after = tokens[i + 1] if i + 1 < len(tokens) else None
+            if not parts or parts[-1] in ("+", "-", "*", "/", "**", "(") or after is None or after in _FILLER:
+                return None, 0
+        return operator, len(phrase)
+    return None, 0
+
+
+def _number(token: str, multiplier: Optional[str]) -> Optional[Decimal]:
+    # Decimal directo desde el texto: "0,1" es exactamente 0.1 y los enteros largos no pierden dígitos.
+    # Un "." solo es punto decimal: en "1000*1.005^12" el 1.005 no son mil cinco.
+    try:
+        value = Decimal(normalize_number(token, decimal_point=True))
+    except InvalidOperation:
+        return None
+    return value * _MULTIPLIERS[multiplier] if multiplier else value
+
+
+def _apply_relative_percent(parts) -> bool:
+    """
+    Reescribe "a + p" / "a - p" (con p seguido de %) como (a)*(1 + p/100) / (a)*(1 - p/100).
+    `a` es todo lo anterior; si deja un paréntesis abierto la cuenta es ambigua y no se toca.
+    """
+    left, sign, percent = parts[:-2], parts[-2], parts[-1]
+    if not left or left[-1] in ("+", "-", "*", "/", "**", "(") or left.count("(") != left.count(")"):
+        return False
+    parts[:] = ["(", *left, ")", "*", "(", "1", sign, percent, "/100", ")"]
+    return True
+
+
+def to_expression(question: str):
+    """
+    Traduce la pregunta a una expresión de Python cuyos números son nombres (n0, n1...).
+
+    Returns:
+        (expresión, {nombre: Decimal}, expresión para mostrar), o None si la pregunta
+        contiene algo que no es una cuenta.
+    """
+    tokens = _TOKEN_RE.findall(fold(question))
+    parts, shown, numbers = [], [], {}
+    has_operator = False
+    # Funciones escritas sin paréntesis ("raíz de 144") se cierran después del siguiente número
+    pending_close = 0
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if _NUMBER_TOKEN_RE.fullmatch(token):
+            multiplier = tokens[i + 1] if i + 1 < len(tokens) and tokens[i + 1] in _MULTIPLIERS else None
+            value = _number(token, multiplier)
+            if value is None:
+                return None
+            name = f"n{len(numbers)}"
+            numbers[name] = value
+            parts.append(name)
+            shown.append(format_decimal(value))
+            parts += [")"] * pending_close
+            shown += [")"] * pending_close
+            pending_close = 0
+            i += 2 if multiplier else 1
+            continue
+        if token in ("(", ")", "+", "-", "*", "/", "**"):
+            operator, length = token, 1
+        else:
+            operator, length = _match_phrase(tokens, i, parts)
+        if operator is None:
+            if token not in _FILLER:
+                return None
+            i += 1
+            continue
+        if operator in _FUNCTIONS:
+            parts.append(operator + "(")
+            shown.append("√(" if operator == "sqrt" else "abs(")
+            if i + length < len(tokens) and tokens[i + length] == "(":
+                length += 1
+            else:
+                pending_close += 1
+        elif operator == "/100" and len(parts) >= 3 and parts[-2] in ("+", "-") and parts[-1] in numbers:
+            # "100 + 10%" es 100 más su 10% (110), no 100 + 0,1
+            if not _apply_relative_percent(parts):
+                return None
+            shown.append(operator)
+        else:
+            parts.append(operator)
+            shown.append(operator)
+        has_operator = has_operator or operator not in ("(", ")")
+        i += length
+    if not numbers or not has_operator or pending_close:
+        return None
+    expression = "".join(parts)
+    return (expression, numbers, _pretty(shown)) if len(expression) <= MAX_EXPRESSION_LENGTH else None
+
+
+def _evaluate(node, numbers) -> Decimal:
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body, numbers)
+    if isinstance(node, ast.Name) and node.id in numbers:
+        return numbers[node.id]
+    # Solo los enteros que agregan las frases ("/100" del porcentaje, "**2" de "al cuadrado")
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        return Decimal(node.value)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY:
+        value = _evaluate(node.operand, numbers)
+        return -value if isinstance(node.op, ast.USub) else +value
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+        left, right = _evaluate(node.left, numbers), _evaluate(node.right, numbers)
+        if isinstance(node.op, ast.Add):
+            return left + right
+        if isinstance(node.op, ast.Sub):
+            return left - right
+        if isinstance(node.op, ast.Mult):
+            return left * right
+        if isinstance(node.op, ast.Div):
+            return left / right
+        if abs(right) > MAX_EXPONENT:
+            raise UnsafeExpression("exponente demasiado grande")
+        return left ** right
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS
+            and len(node.args) == 1 and not node.keywords):
+        value = _evaluate(node.args[0], numbers)
+        return value.sqrt() if node.func.id == "sqrt" else abs(value)
+    raise UnsafeExpression(f"nodo no permitido: {type(node).__name__}")
+
+
+def evaluate(expression: str, numbers: dict) -> Decimal:
+    """Evalúa una expresión aritmética con la lista blanca de nodos; los nombres son los números."""
+    tree = ast.parse(expression, mode="eval")
+    if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+        raise UnsafeExpression("expresión demasiado larga")
+    with localcontext() as ctx:
+        ctx.prec = DECIMAL_PRECISION
+        ctx.traps[DivisionByZero] = True
+        ctx.traps[Overflow] = True
+        return +_evaluate(tree, numbers)
+
+
+def format_decimal(value: Decimal) -> str:
+    """Separadores en español y como mucho DISPLAY_DECIMALS decimales: 3506.379... -> "≈ 3.506,379327"."""
+    if value.adjusted() >= DECIMAL_PRECISION or (value and value.adjusted() < -DISPLAY_DECIMALS):
+        # Muy grande o muy chico para mostrarlo con decimales fijos: notación científica
+        mantissa, exponent = f"{value:.{DISPLAY_DECIMALS}E}".split("E")
+        return f"≈ {mantissa.replace('.', ',')} × 10^{int(exponent)}"
+    with localcontext() as ctx:
+        ctx.prec = DECIMAL_PRECISION + DISPLAY_DECIMALS
+        rounded = value.quantize(Decimal(1).scaleb(-DISPLAY_DECIMALS))
+    text = f"{rounded:,f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    text = text.replace(",", "_").replace(".", ",").replace("_", ".")
+    return text if rounded == value else f"≈ {text}"
+
+
+def _pretty(shown) -> str:
+    text = ""
+    for i, part in enumerate(shown):
+        if part == "-" and (i == 0 or shown[i - 1].strip() in _SYMBOLS or shown[i - 1].endswith("(")):
+            text += "-"
+        else:
+            text += _SYMBOLS.get(part, part)
+    return " ".join(text.split())
+
+
+class ArithmeticEvaluator:
+    """Traduce y evalúa cuentas simples; latencias en microsegundos."""
+
+    def __init__(self):
+        self.latency = LatencyRecorder(unit="us")
+        self._lock = threading.Lock()
+        self.counts = {"answered": 0, "not_arithmetic": 0, "errors": 0}
+
+    def _count(self, field: str):
+        with self._lock:
+            self.counts[field] += 1
+
+    def answer(self, question: str) -> Optional[str]:
+        start = time.perf_counter_ns()
+        try:
+            parsed = to_expression(question)
+            if parsed is None:
+                self._count("not_arithmetic")
+                return None
+            expression, numbers, shown = parsed
+            try:
+                result = evaluate(expression, numbers)
+            except (DivisionByZero, ZeroDivisionError):
+                self._count("answered")
+                return f"`{shown}` no tiene resultado: incluye una división por cero."
+            except (SyntaxError, UnsafeExpression, InvalidOperation, Overflow, ValueError) as e:
+                print(f"DEBUG: '{expression}' no se pudo evaluar localmente: {e}")
+                self._count("errors")
+                return None
+            self._count("answered")
+            return f"`{shown}` = **{format_decimal(result)}**"
+        finally:
+            self.latency.record("total", (time.perf_counter_ns() - start) / 1000)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        return {**counts, "latency_us": self.latency.stats()}
+
+
+arithmetic_evaluator = ArithmeticEvaluator()
+
+
+def arithmetic_answer(question: str) -> Optional[str]:
+    return arithmetic_evaluator.answer(question)
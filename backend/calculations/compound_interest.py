@@ -0,0 +1,349 @@
+# /app/calculations/compound_interest.py
+"""
+Calculadora local de interés compuesto para la sub-ruta INTERES_COMPUESTO.
+
+Extrae de la pregunta el capital inicial, la tasa (o varias, o un rango), el plazo
+(uno o varios) y los aportes periódicos con su frecuencia, y calcula con NumPy la
+grilla completa de valores futuros tasa x plazo en una sola operación vectorizada.
+La respuesta es una tabla en Markdown armada sin llamar al LLM; las latencias de
+cada etapa se registran en microsegundos.
+"""
+
+import re
+import time
+import threading
+import numpy as np
+from typing import List, Optional
+from rag.metrics import LatencyRecorder
+from llm.local_extractor import parse_number
+
+# Tasas extra que se proyectan alrededor de una tasa única (en puntos porcentuales)
+RATE_SCENARIO_OFFSETS = (-2.0, -1.0, 0.0, 1.0, 2.0)
+MAX_RATE_SCENARIOS = 11
+# Filas máximas de la evolución año a año; en plazos largos se muestra cada k años
+MAX_SCHEDULE_ROWS = 30
+# Por encima de este saldo (o si NumPy desborda a inf/nan) la proyección no tiene sentido práctico
+MAX_PROJECTED_VALUE = 1e15
+
+# Períodos por año de cada frecuencia; None = capitalización continua
+FREQUENCIES = {
+    "diaria": 365, "diario": 365, "diariamente": 365, "daily": 365,
+    "semanal": 52, "semanales": 52, "semanalmente": 52, "weekly": 52,
+    "mensual": 12, "mensuales": 12, "mensualmente": 12, "monthly": 12,
+    "bimestral": 6, "bimestrales": 6, "bimestralmente": 6,
+    "trimestral": 4, "trimestrales": 4, "trimestralmente": 4, "quarterly": 4,
+    "semestral": 2, "semestrales": 2, "semestralmente": 2, "semiannually": 2,
+    "anual": 1, "anuales": 1, "anualmente": 1, "annually": 1, "yearly": 1,
+    "continua": None, "continuo": None, "continuamente": None, "continuously": None,
+}
+FREQUENCY_NAMES = {365: "diaria", 52: "semanal", 12: "mensual", 6: "bimestral", 4: "trimestral",
+                   2: "semestral", 1: "anual", None: "continua"}
+# "al mes", "por año", "cada trimestre"... -> períodos por año
+_PERIOD_NOUNS = {"día": 365, "dia": 365, "semana": 52, "mes": 12, "bimestre": 6, "trimestre": 4,
+                 "semestre": 2, "año": 1, "ano": 1, "day": 365, "week": 52, "month": 12, "quarter": 4, "year": 1}
+
+_NUMBER_RE = re.compile(r"(?<![\w.,])(\d[\d.,]*\d|\d)(?:\s*(k|mil millones|mil|millones|millón|millon|million|millions)\b)?", re.IGNORECASE)
+# Una cantidad puede ser la primera de una lista ("5, 10 y 20 años", "entre 4 y 8 %").
+# "a"/"al" no encadenan: en "5000 al 7%" el 5000 es el capital, no una tasa.
+_LIST_TAIL = r"(?:\s*(?:,|y|e|o|hasta|and|or|-|–)\s*\d[\d.,]*(?:\s*%)?)*"
+_PERCENT_RE = re.compile(_LIST_TAIL + r"\s*(%|por\s?ciento|percent)", re.IGNORECASE)
+_HORIZON_RE = re.compile(_LIST_TAIL + r"\s*(años|año|anos|years?|meses|mes|months?)\b", re.IGNORECASE)
+_FREQUENCY_WORDS = "|".join(sorted(FREQUENCIES, key=len, reverse=True))
+_PERIOD_WORDS = "|".join(sorted(_PERIOD_NOUNS, key=len, reverse=True))
+_PERIODIC_MARKER = rf"(?:(?:al|por|cada|a la|a|per|every)\s+({_PERIOD_WORDS})\b|({_FREQUENCY_WORDS})\b)"
+# Hasta dos palabras sin cifras entre el monto y la frecuencia ("200 dólares por mes")
+_CONTRIBUTION_AFTER_RE = re.compile(r"\s*(?:[^\d\s%]+\s+){0,2}?" + _PERIODIC_MARKER, re.IGNORECASE)
+_CONTRIBUTION_BEFORE_RE = re.compile(
+    r"(aport|deposit|depósit|ahorr|contribu|agreg|sum|add|sav)\w*\s+" + _PERIODIC_MARKER + r"\s+(?:de\s+|of\s+)?\W{0,4}$",
+    re.IGNORECASE,
+)
+_RATE_PERIOD_RE = re.compile(r"\s*(?:%|por\s?ciento|percent)\s*(?:de\s+interés\s+)?" + _PERIODIC_MARKER, re.IGNORECASE)
+_COMPOUNDING_RE = re.compile(
+    r"(?:capitaliza\w*|compuest[oa]|compounded|compounding)\s+(?:de\s+forma\s+|en\s+forma\s+)?(" + _FREQUENCY_WORDS + r")\b",
+    re.IGNORECASE,
+)
+_AT_START_RE = re.compile(r"(al|a)\s+(principio|inicio|comienzo)\s+de\s+cada|anticipad[oa]s?|at the (start|beginning)", re.IGNORECASE)
+_RANGE_BEFORE_RE = re.compile(r"(entre|del|de|from)\s*$", re.IGNORECASE)
+_RANGE_BETWEEN_RE = re.compile(r"^\s*%?\s*(y|al|a|hasta|to|and|-|–)\s*$", re.IGNORECASE)
+
+
+class CompoundInterestQuery:
+    def __init__(self, principal: float = 0.0, rates: Optional[List[float]] = None,
+                 years: Optional[List[float]] = None, contribution: float = 0.0,
+                 contributions_per_year: int = 12, compounding: Optional[int] = 1,
+                 at_start: bool = False, base_rate: Optional[float] = None):
+        self.principal = principal
+        self.rates = rates or []
+        self.years = years or []
+        self.contribution = contribution
+        self.contributions_per_year = contributions_per_year
+        self.compounding = compounding
+        self.at_start = at_start
+        self.base_rate = base_rate
+
+    def missing(self) -> List[str]:
+        missing = []
+        if self.principal <= 0 and self.contribution <= 0:
+            missing.append("el capital inicial o el aporte periódico")
+        if not self.rates:
+            missing.append("la tasa de interés anual")
+        if not self.years:
+            missing.append("el plazo")
+        return missing
+
+
+def _period_from_marker(match) -> Optional[int]:
+    noun, adjective = match.group(1), match.group(2)
+    if noun:
+        return _PERIOD_NOUNS[noun.lower()]
+    return FREQUENCIES[adjective.lower()]
+
+
+def _rate_scenarios(rates: List[float], text: str, rate_spans) -> List[float]:
+    """Una tasa -> escenarios alrededor; "entre 4% y 8%" -> el rango completo; varias -> esas."""
+    if len(rates) == 2:
+        (s1, e1), (s2, _) = rate_spans
+        if _RANGE_BEFORE_RE.search(text[:s1]) and _RANGE_BETWEEN_RE.match(text[e1:s2]):
+            low, high = sorted(rates)
+            step = max(0.5, np.ceil((high - low) / (MAX_RATE_SCENARIOS - 1) * 2) / 2)
+            return [float(r) for r in np.arange(low, high + step / 2, step)]
+    if len(rates) == 1:
+        return [rates[0] + offset for offset in RATE_SCENARIO_OFFSETS if rates[0] + offset >= 0]
+    return sorted(set(rates))
+
+
+def _default_horizons(years: float) -> List[float]:
+    """Un plazo único se acompaña de sus cuartos, para ver cómo crece el saldo."""
+    if years < 4 or years != int(years):
+        return [years]
+    return sorted({round(years * q) for q in (0.25, 0.5, 0.75)} | {years})
+
+
+def parse_question(question: str) -> CompoundInterestQuery:
+    text = " ".join(question.split())
+    query = CompoundInterestQuery()
+    rates, rate_spans, horizons = [], [], []
+    principal = None
+    monthly_rate = False
+
+    for m in _NUMBER_RE.finditer(text):
+        end = m.end()
+        before = text[max(0, m.start() - 40):m.start()]
+        percent = _PERCENT_RE.match(text, end)
+        # En una tasa un "." solo es punto decimal: "2.125%" no son 2125 %
+        value = parse_number(m.group(1), m.group(2), decimal_point=bool(percent))
+        if value is None:
+            continue
+
+        if percent:
+            rate_period = _RATE_PERIOD_RE.match(text, end)
+            if rate_period and _period_from_marker(rate_period) not in (None, 1):
+                # "1% mensual": tasa del período, se pasa a nominal anual
+                periods = _period_from_marker(rate_period)
+                value *= periods
+                monthly_rate = monthly_rate or periods
+            rates.append(value)
+            rate_spans.append((m.start(), end))
+            continue
+
+        horizon = _HORIZON_RE.match(text, end)
+        if horizon:
+            unit = horizon.group(1).lower()
+            horizons.append(value / 12 if unit.startswith("mes") or unit.startswith("month") else value)
+            continue
+
+        contribution_after = _CONTRIBUTION_AFTER_RE.match(text, end)
+        contribution_before = _CONTRIBUTION_BEFORE_RE.search(before)
+        if (contribution_after or contribution_before) and query.contribution == 0:
+            query.contribution = value
+            query.contributions_per_year = _period_from_marker(contribution_after or contribution_before) or 12
+            continue
+
+        # Un año calendario ("en 2030") no es un monto
+        if 1900 <= value <= 2100 and value == int(value) and re.search(r"\b(en|el|del|in)\s*$", before, re.IGNORECASE):
+            continue
+        if principal is None and value > 0:
+            principal = value
+
+    query.principal = principal or 0.0
+    if rates:
+        # Con una sola tasa se resalta esa; con varias o un rango, la del medio
+        query.base_rate = rates[0] if len(rates) == 1 else None
+        query.rates = _rate_scenarios(rates, text, rate_spans)
+    if horizons:
+        query.years = sorted(set(horizons)) if len(horizons) > 1 else _default_horizons(horizons[0])
+
+    compounding = _COMPOUNDING_RE.search(text)
+    if compounding:
+        query.compounding = FREQUENCIES[compounding.group(1).lower()]
+    elif monthly_rate:
+        query.compounding = monthly_rate
+    query.at_start = bool(query.contribution and _AT_START_RE.search(text))
+    return query
+
+
+def _growth(annual_rates: np.ndarray, compounding: Optional[int], years: np.ndarray) -> np.ndarray:
+    """(1 + r/m)^(m·t), o e^(r·t) con capitalización continua."""
+    if compounding is None:
+        return np.exp(annual_rates * years)
+    return np.exp(compounding * years * np.log1p(annual_rates / compounding))
+
+
+def future_values(principal: float, annual_rates, years, contribution: float = 0.0,
+                  contributions_per_year: int = 12, compounding: Optional[int] = 1,
+                  at_start: bool = False) -> np.ndarray:
+    """
+    Valor futuro para cada combinación tasa x plazo (tasas en tanto por uno).
+
+    Los aportes pueden tener otra frecuencia que la capitalización: se usa la tasa
+    efectiva de cada período de aporte. Si el plazo no es un número entero de
+    períodos, el último tramo sin aporte igual capitaliza.
+
+    Returns:
+        Matriz de forma (len(annual_rates), len(years)).
+    """
+    rates = np.asarray(annual_rates, dtype=float)[:, None]
+    t = np.asarray(years, dtype=float)[None, :]
+    values = principal * _growth(rates, compounding, t)
+    if contribution:
+        per_period = _growth(rates, compounding, np.float64(1.0 / contributions_per_year)) - 1
+        n = np.floor(contributions_per_year * t + 1e-9)
+        safe = np.where(per_period != 0, per_period, 1.0)
+        annuity = np.where(per_period != 0, np.expm1(n * np.log1p(per_period)) / safe, n)
+        if at_start:
+            annuity = annuity * (1 + per_period)
+        values = values + contribution * annuity * _growth(rates, compounding, t - n / contributions_per_year)
+    return values
+
+
+def schedule(query: CompoundInterestQuery, annual_rate: float):
+    """Evolución año a año a una tasa: (años, total aportado, saldo)."""
+    horizon = max(query.years)
+    step = max(1, int(np.ceil(horizon / MAX_SCHEDULE_ROWS)))
+    years = np.arange(step, np.floor(horizon) + 1, step, dtype=float)
+    if years.size == 0 or years[-1] != horizon:
+        years = np.append(years, horizon)
+    balances = future_values(query.principal, [annual_rate], years, query.contribution,
+                             query.contributions_per_year, query.compounding, query.at_start)[0]
+    contributed = query.principal + query.contribution * np.floor(query.contributions_per_year * years + 1e-9)
+    return years, contributed, balances
+
+
+def format_money(value: float) -> str:
+    """12345.6 -> "12.345,60"."""
+    return f"{value:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def format_number(value: float) -> str:
+    return f"{value:.4g}".replace(".", ",")
+
+
+def _format_years(years: float) -> str:
+    if years != int(years):
+        months = round(years * 12)
+        return f"{months} meses"
+    return f"{int(years)} año" if years == 1 else f"{int(years)} años"
+
+
+def _frequency_name(periods: Optional[int]) -> str:
+    return FREQUENCY_NAMES.get(periods, f"{periods} veces por año")
+
+
+def render_markdown(query: CompoundInterestQuery, grid: np.ndarray, years, contributed, balances) -> str:
+    base = query.base_rate if query.base_rate in query.rates else query.rates[len(query.rates) // 2]
+    terms = [f"capital inicial de **{format_money(query.principal)}**"] if query.principal else []
+    if query.contribution:
+        timing = "al inicio" if query.at_start else "al final"
+        terms.append(f"aportes de **{format_money(query.contribution)}** con frecuencia "
+                     f"{_frequency_name(query.contributions_per_year)} ({timing} de cada período)")
+    terms.append(f"capitalización {_frequency_name(query.compounding)}")
+
+    lines = ["### Proyección de interés compuesto", "", "Con " + ", ".join(terms) + ".", ""]
+    lines.append("| Tasa anual | " + " | ".join(_format_years(y) for y in query.years) + " |")
+    lines.append("|---:|" + "---:|" * len(query.years))
+    for rate, row in zip(query.rates, grid):
+        cells = [f"{format_number(rate)} %"] + [format_money(v) for v in row]
+        if rate == base:
+            cells = [f"**{c}**" for c in cells]
+        lines.append("| " + " | ".join(cells) + " |")
+
+    lines += ["", f"**Evolución a una tasa del {format_number(base)} %**", "",
+              "| Año | Total aportado | Intereses generados | Saldo |", "|---:|---:|---:|---:|"]
+    for year, paid, balance in zip(years, contributed, balances):
+        label = format_number(year) if year != int(year) else str(int(year))
+        lines.append(f"| {label} | {format_money(paid)} | {format_money(balance - paid)} | {format_money(balance)} |")
+
+    lines += ["", "_Cálculo local y determinista: no incluye impuestos, comisiones ni inflación, "
+                  "y las tasas futuras no están garantizadas._"]
+    return "\n".join(lines)
+
+
+def _missing_message(missing: List[str]) -> str:
+    needed = missing[0] if len(missing) == 1 else ", ".join(missing[:-1]) + " y " + missing[-1]
+    return (f"Para calcular el interés compuesto necesito {needed}. Por ejemplo: '¿Cuánto tendré si invierto 10.000 dólares al 6% anual durante 10 años, "
+              "aportando 200 al mes?'. También puedes pedir varias tasas ('entre 4% y 8%') o plazos ('a 5, 10 y 20 años').")
+
+
+def _out_of_range_message() -> str:
+    return (f"Con esos parámetros la proyección supera los {format_money(MAX_PROJECTED_VALUE)} y deja de ser un cálculo útil. "
+            "Revisa la tasa y el plazo (por ejemplo, una tasa mensual escrita como anual) o prueba con un plazo más corto.")
+
+
+def _in_range(*arrays) -> bool:
+    return all(np.isfinite(a).all() and (np.abs(a) <= MAX_PROJECTED_VALUE).all() for a in arrays)
+
+
+class CompoundInterestCalculator:
+    """Parseo + grilla vectorizada + Markdown, con latencias por etapa en microsegundos."""
+
+    def __init__(self):
+        self.latency = LatencyRecorder(unit="us")
+        self._lock = threading.Lock()
+        self.counts = {"answered": 0, "missing_parameters": 0, "out_of_range": 0, "scenarios": 0}
+
+    def answer(self, question: str) -> str:
+        start = time.perf_counter_ns()
+        query = parse_question(question)
+        parsed = time.perf_counter_ns()
+        self.latency.record("parse", (parsed - start) / 1000)
+
+        missing = query.missing()
+        if missing:
+            with self._lock:
+                self.counts["missing_parameters"] += 1
+            return _missing_message(missing)
+
+        rates = np.asarray(query.rates) / 100
+        with np.errstate(over="ignore", invalid="ignore"):
+            grid = future_values(query.principal, rates, query.years, query.contribution,
+                                 query.contributions_per_year, query.compounding, query.at_start)
+            base = query.base_rate if query.base_rate in query.rates else query.rates[len(query.rates) // 2]
+            years, contributed, balances = schedule(query, base / 100)
+        computed = time.perf_counter_ns()
+        self.latency.record("compute", (computed - parsed) / 1000)
+
+        if not _in_range(grid, contributed, balances):
+            with self._lock:
+                self.counts["out_of_range"] += 1
+            return _out_of_range_message()
+
+        markdown = render_markdown(query, grid, years, contributed, balances)
+        end = time.perf_counter_ns()
+        self.latency.record("render", (end - computed) / 1000)
+        self.latency.record("total", (end - start) / 1000)
+        with self._lock:
+            self.counts["answered"] += 1
+            self.counts["scenarios"] += grid.size
+        return markdown
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        return {**counts, "latency_us": self.latency.stats()}
+
+
+compound_interest_calculator = CompoundInterestCalculator()
+
+
+def compound_interest_answer(question: str) -> str:
+    return compound_interest_calculator.answer(question)
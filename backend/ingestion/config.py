@@ -12,6 +12,10 @@ PREFIX = os.getenv("PREFIX")
 
 # Configuración de archivos y directorios
 CHROMA_PERSIST_DIR = "/app/vector-store" 
+GENERATION_FILE_PATH = os.path.join(CHROMA_PERSIST_DIR, "ingestion_generation")
+SPARSE_INDEX_DIR = os.path.join(CHROMA_PERSIST_DIR, "sparse_index")
+QUANTIZED_STORE_DIR = os.path.join(CHROMA_PERSIST_DIR, "quantized")
+METADATA_SUMMARY_PATH = os.path.join(CHROMA_PERSIST_DIR, "metadata_summary.json")
 PROCESSED_FILES_PATH = "processed_pdfs.txt"
 PROBLEMATIC_FILES_PATH = "problematic_files.txt"
 LOG_FILE_PATH = "pdf_processing.log"
@@ -22,6 +26,10 @@ BATCH_SIZE = int(os.getenv("BATCH_SIZE", 10))
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1000))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 200))
 
+# Cuantización de embeddings: "none", "int8" o "pq"
+QUANTIZATION = os.getenv("QUANTIZATION", "none").lower()
+PQ_SUBSPACES = int(os.getenv("PQ_SUBSPACES", 16))
+
 # Configuración de archivos PDF
 MIN_FILE_SIZE = 1024  # 1KB
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
@@ -52,4 +60,7 @@ def setup_logging():
     return logging.getLogger(__name__)
 
 # Configuración de embeddings
-EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
\ No newline at end of file
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Motor: "torch" (sentence-transformers), "onnx" u "onnx-int8" (ONNX Runtime, ver onnx_embeddings.py)
+EMBEDDING_ENGINE = os.getenv("EMBEDDING_ENGINE", "torch").lower()
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "/app/models/all-MiniLM-L6-v2-onnx")
\ No newline at end of file
@@ -0,0 +1,49 @@
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Este módulo no importa config.py para poder usarse tanto desde la ingestión
+# (imports planos) como desde el backend (ingestion.generation).
+
+_lock = threading.Lock()
+
+
+def read_generation(path):
+    """
+    Lee el número de generación de la ingestión.
+
+    Args:
+        path (str): Ruta del archivo de generación
+
+    Returns:
+        int: Generación actual (0 si el archivo no existe o no se puede leer)
+    """
+    try:
+        with open(path, 'r') as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def bump_generation(path):
+    """
+    Incrementa la generación de forma atómica. Se llama cada vez que la ingestión
+    modifica el corpus, para que los lectores invaliden sus cachés.
+
+    Args:
+        path (str): Ruta del archivo de generación
+
+    Returns:
+        int: Nueva generación
+    """
+    with _lock:
+        generation = read_generation(path) + 1
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(f"{generation}\n")
+        os.replace(tmp_path, path)
+    logger.info(f"🔢 Generación de la ingestión actualizada a {generation}")
+    return generation
@@ -0,0 +1,123 @@
+import os
+import re
+import json
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Metadatos filtrables de cada chunk (además de source/page) y su índice precomputado.
+# Igual que sparse_index.py, no importa config.py para poder usarse desde el backend.
+
+FILTER_FIELDS = ("ticker", "year")
+
+_YEAR_RE = re.compile(r"(?<!\d)(19[89]\d|20\d{2})(?!\d)")
+_TICKER_RE = re.compile(r"^[A-Z]{1,5}$")
+# Tokens en mayúsculas habituales en las claves que no son tickers
+_NON_TICKER_TOKENS = {
+    "PDF", "K", "Q", "FORM", "SEC", "ANNUAL", "REPORT", "FY", "QTR", "NASDAQ", "US", "USA",
+    "INC", "CORP", "LTD", "PLC", "DEF", "PROXY", "S", "A", "AR",
+}
+
+_lock = threading.Lock()
+
+
+def parse_s3_key(key):
+    """
+    Extrae ticker y año de la clave del PDF en S3.
+    Ejemplos: "nasdaq/AAPL/2021/10-K.pdf", "filings/MSFT_10K_2020.pdf"
+
+    Returns:
+        dict: {"ticker": str, "year": int} con solo los campos encontrados
+    """
+    stem = os.path.splitext(key)[0]
+    metadata = {}
+
+    years = _YEAR_RE.findall(stem)
+    if years:
+        # El último año suele ser el del archivo (el de la carpeta puede ser un agrupador)
+        metadata["year"] = int(years[-1])
+
+    for token in re.split(r"[/_\-. ]+", stem):
+        if _TICKER_RE.match(token) and token not in _NON_TICKER_TOKENS:
+            metadata["ticker"] = token
+            break
+
+    return metadata
+
+
+def matches(metadata, filters):
+    """Indica si los metadatos de un chunk cumplen los filtros (valor o lista de valores)"""
+    for field, expected in (filters or {}).items():
+        value = (metadata or {}).get(field)
+        if isinstance(expected, (list, tuple, set)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class FilterIndex:
+    """Índice en memoria campo -> valor -> filas, para pre-filtrar backends NumPy"""
+
+    def __init__(self, metadatas):
+        buckets = {field: {} for field in FILTER_FIELDS}
+        for row, metadata in enumerate(metadatas):
+            for field in FILTER_FIELDS:
+                value = (metadata or {}).get(field)
+                if value is not None:
+                    buckets[field].setdefault(value, []).append(row)
+        self.rows_by_value = {
+            field: {value: np.asarray(rows, dtype=np.int64) for value, rows in values.items()}
+            for field, values in buckets.items()
+        }
+
+    def rows(self, filters):
+        """
+        Returns:
+            np.ndarray: Filas ordenadas que cumplen los filtros (None si no hay filtros)
+        """
+        selected = None
+        for field, expected in (filters or {}).items():
+            values = expected if isinstance(expected, (list, tuple, set)) else [expected]
+            by_value = self.rows_by_value.get(field, {})
+            parts = [by_value[v] for v in values if v in by_value]
+            rows = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+        return selected
+
+
+def read_metadata_summary(path):
+    """
+    Lee el resumen de metadatos del corpus: {"tickers": {ticker: {"count", "years"}}, "years": {...}}
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"tickers": {}, "years": {}}
+
+
+def update_metadata_summary(path, metadatas, reset=False):
+    """Suma al resumen en disco los metadatos de un lote recién guardado"""
+    with _lock:
+        summary = {"tickers": {}, "years": {}} if reset else read_metadata_summary(path)
+        for metadata in metadatas:
+            ticker = metadata.get("ticker")
+            year = metadata.get("year")
+            if ticker:
+                entry = summary["tickers"].setdefault(ticker, {"count": 0, "years": []})
+                entry["count"] += 1
+                if year and year not in entry["years"]:
+                    entry["years"] = sorted(entry["years"] + [year])
+            if year:
+                summary["years"][str(year)] = summary["years"].get(str(year), 0) + 1
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(summary, f)
+        os.replace(tmp_path, path)
+    return summary
@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import logging
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Motor de embeddings alternativo: all-MiniLM-L6-v2 exportado a ONNX (opcionalmente
+# cuantizado a int8) y ejecutado con ONNX Runtime, sin importar PyTorch.
+# Reproduce el pipeline de sentence-transformers: Transformer -> mean pooling -> normalización L2.
+# Igual que sparse_index.py, no importa config.py para poder usarse desde el backend.
+#
+# Exportación (requiere torch/transformers solo en este paso):
+#     python onnx_embeddings.py <directorio_salida> [nombre_modelo]
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model-int8.onnx"
+VERIFICATION_FILE = "verification.json"
+MAX_SEQ_LENGTH = 256  # el mismo límite que usa sentence-transformers para este modelo
+
+# Tolerancia mínima de similitud coseno contra los vectores de PyTorch
+TOLERANCES = {MODEL_FILE: 1e-4, QUANTIZED_MODEL_FILE: 2e-2}
+
+VERIFY_SENTENCES = [
+    "¿Qué hace Apple?",
+    "historia de Microsoft",
+    "Revenue for fiscal year 2021 increased 33% compared to 2020.",
+    "El índice NASDAQ Composite agrupa a más de 3.000 empresas.",
+    "Net income attributable to shareholders was $94.7 billion.",
+    "precio de AAPL",
+]
+
+
+class OnnxEmbeddings(Embeddings):
+    """Embeddings de MiniLM con ONNX Runtime, compatibles con la interfaz de LangChain"""
+
+    def __init__(self, model_dir, quantized=False, batch_size=32, require_verified=True):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_file = QUANTIZED_MODEL_FILE if quantized else MODEL_FILE
+        self.batch_size = batch_size
+
+        if require_verified:
+            check = read_verification(model_dir).get(self.model_file)
+            if not check or not check.get("passed"):
+                raise RuntimeError(
+                    f"{self.model_file} no tiene una verificación aprobada contra PyTorch en {model_dir}: {check}"
+                )
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, self.model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        logger.info(f"OnnxEmbeddings inicializado con {self.model_file}")
+
+    def _encode(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            encoded = self.tokenizer.encode_batch(texts[start:start + self.batch_size])
+            input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+            hidden = self.session.run(None, feeds)[0]
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.append(pooled)
+        return np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts):
+        # Igual que HuggingFaceEmbeddings, los saltos de línea se reemplazan por espacios
+        return self._encode([text.replace("\n", " ") for text in texts]).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def read_verification(model_dir):
+    try:
+        with open(os.path.join(model_dir, VERIFICATION_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def verify_embeddings(candidate, reference, tolerance, texts=VERIFY_SENTENCES):
+    """
+    Compara los vectores de un motor contra los de referencia (PyTorch)
+
+    Returns:
+        dict: Diferencia máxima, coseno mínimo y si pasa la tolerancia
+    """
+    a = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    b = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    min_cosine = float((a * b).sum(axis=1).min())
+    return {
+        "max_abs_diff": float(np.abs(a - b).max()),
+        "min_cosine": min_cosine,
+        "tolerance": tolerance,
+        "passed": min_cosine >= 1 - tolerance,
+    }
+
+
+def export_onnx_model(model_name, output_dir, quantize=True, opset=17):
+    """
+    Exporta el modelo a ONNX (y su versión int8 dinámica), y verifica ambos
+    contra sentence-transformers. El resultado queda en verification.json.
+
+    Returns:
+        dict: Resultado de la verificación por archivo de modelo
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["texto de ejemplo"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    model_path = os.path.join(output_dir, MODEL_FILE)
+    logger.info(f"📦 Exportando {model_name} a {model_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+            opset_version=opset,
+        )
+
+    files = [MODEL_FILE]
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(model_path, os.path.join(output_dir, QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+        files.append(QUANTIZED_MODEL_FILE)
+
+    reference = HuggingFaceEmbeddings(model_name=model_name)
+    results = {}
+    for model_file in files:
+        candidate = OnnxEmbeddings(output_dir, quantized=model_file == QUANTIZED_MODEL_FILE, require_verified=False)
+        results[model_file] = verify_embeddings(candidate, reference, TOLERANCES[model_file])
+        status = "✅" if results[model_file]["passed"] else "❌"
+        logger.info(f"{status} {model_file}: coseno mínimo {results[model_file]['min_cosine']:.6f}")
+
+    with open(os.path.join(output_dir, VERIFICATION_FILE), "w") as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(sys.argv) < 2:
+        print("Uso: python onnx_embeddings.py <directorio_salida> [nombre_modelo]")
+        sys.exit(1)
+    export_onnx_model(sys.argv[2] if len(sys.argv) > 2 else "sentence-transformers/all-MiniLM-L6-v2", sys.argv[1])
@@ -1,8 +1,8 @@
 import fitz  # PyMuPDF
 import logging
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
 from config import CHUNK_SIZE, CHUNK_OVERLAP
+from metadata_index import parse_s3_key
 
 logger = logging.getLogger(__name__)
 
@@ -12,7 +12,9 @@ class PDFProcessor:
     def __init__(self):
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=CHUNK_SIZE, 
-            chunk_overlap=CHUNK_OVERLAP
+            chunk_overlap=CHUNK_OVERLAP,
+            # Posición del chunk dentro de la página, para fusionar vecinos solapados al armar el contexto
+            add_start_index=True
         )
         logger.info(f"PDFProcessor inicializado con chunk_size={CHUNK_SIZE}, overlap={CHUNK_OVERLAP}")
     
@@ -33,21 +35,19 @@ class PDFProcessor:
             
             docs = []
             chunk_count = 0
+            # Ticker y año de la clave, para poder pre-filtrar las búsquedas
+            key_metadata = parse_s3_key(key)
             
             with fitz.open(stream=pdf_data, filetype="pdf") as pdf:
                 for page_num, page in enumerate(pdf):
                     page_text = page.get_text()
                     
                     if page_text.strip():
-                        chunks = self.text_splitter.split_text(page_text)
-                        chunk_count += len(chunks)
-                        
-                        page_docs = [
-                            Document(
-                                page_content=chunk,
-                                metadata={"source": key, "page": page_num}
-                            ) for chunk in chunks
-                        ]
+                        page_docs = self.text_splitter.create_documents(
+                            [page_text],
+                            metadatas=[{"source": key, "page": page_num, **key_metadata}]
+                        )
+                        chunk_count += len(page_docs)
                         docs.extend(page_docs)
             
             logger.info(f"✅ [{key}] {chunk_count} fragmentos generados")
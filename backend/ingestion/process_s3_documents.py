@@ -1,4 +1,5 @@
 import os
+import sys
 import time
 from config import AWS_BUCKET, PREFIX, WORKERS, BATCH_SIZE, setup_logging
 from s3_client import S3Client
@@ -70,6 +71,16 @@ class DocumentIngestionPipeline:
 
 def main():
     try:
+        # Backfills para chunks ingestados antes de que existieran los índices auxiliares
+        if "--rebuild-sparse-index" in sys.argv:
+            VectorStoreManager().rebuild_sparse_index()
+            return
+        if "--rebuild-quantized-store" in sys.argv:
+            VectorStoreManager().rebuild_quantized_store()
+            return
+        if "--backfill-metadata" in sys.argv:
+            VectorStoreManager().backfill_filter_metadata()
+            return
         pipeline = DocumentIngestionPipeline()
         pipeline.run()
     except Exception:
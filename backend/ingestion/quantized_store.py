@@ -0,0 +1,340 @@
+import os
+import json
+import uuid
+import shutil
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Almacenamiento comprimido de los embeddings para reducir la RAM del retriever.
+# Métodos:
+#   int8 : cuantización escalar simétrica por vector (1 byte por dimensión + 1 escala)
+#   pq   : product quantization, M subespacios x 256 centroides (M bytes por vector)
+# La búsqueda gruesa se hace sobre los códigos (en RAM) y los mejores candidatos se
+# re-puntúan de forma exacta con los vectores float16 de cada segmento (mmap, en disco).
+#
+# Estructura del directorio:
+#   config.json          : método y parámetros
+#   pq_codebooks.npy     : (M x 256 x D/M) float32, solo para pq
+#   seg-<id>/ids.json    : id del chunk en ChromaDB
+#   seg-<id>/meta.json   : metadatos de cada chunk (para pre-filtrar sin ir a ChromaDB)
+#   seg-<id>/codes.npy   : int8 (N x D) o uint8 (N x M)
+#   seg-<id>/scales.npy  : float32 (N,), solo para int8
+#   seg-<id>/vectors.npy : float16 (N x D) normalizados, para el re-scoring exacto
+# Igual que sparse_index.py, no importa config.py para poder usarse desde el backend.
+
+PQ_CENTROIDS = 256
+KMEANS_ITERATIONS = 20
+# Filas de códigos que se puntúan por vez en la búsqueda gruesa
+SCORE_BLOCK_ROWS = 4096
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def quantize_int8(vectors):
+    """Cuantización simétrica por vector: v ~= codes * scale"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def train_pq_codebooks(vectors, subspaces, seed=0):
+    """Entrena un codebook por subespacio con k-means (Lloyd)"""
+    n, dim = vectors.shape
+    if dim % subspaces:
+        raise ValueError(f"La dimensión {dim} no es divisible por {subspaces} subespacios")
+    sub_dim = dim // subspaces
+    k = min(PQ_CENTROIDS, n)
+    rng = np.random.default_rng(seed)
+
+    codebooks = np.zeros((subspaces, PQ_CENTROIDS, sub_dim), dtype=np.float32)
+    for m in range(subspaces):
+        data = vectors[:, m * sub_dim:(m + 1) * sub_dim]
+        centroids = data[rng.choice(n, size=k, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            distances = (data ** 2).sum(1)[:, None] - 2 * data @ centroids.T + (centroids ** 2).sum(1)[None, :]
+            assignment = distances.argmin(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, data)
+            counts = np.bincount(assignment, minlength=k)[:, None]
+            nonempty = counts[:, 0] > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty]
+        codebooks[m, :k] = centroids
+        # Si hay menos vectores que centroides, los sobrantes repiten el primero (nunca ganan)
+        codebooks[m, k:] = centroids[0]
+    return codebooks
+
+
+def encode_pq(vectors, codebooks):
+    subspaces, _, sub_dim = codebooks.shape
+    codes = np.empty((len(vectors), subspaces), dtype=np.uint8)
+    for m in range(subspaces):
+        data = vectors[:, m * sub_dim:(m + 1) * sub_dim]
+        centroids = codebooks[m]
+        distances = -2 * data @ centroids.T + (centroids ** 2).sum(1)[None, :]
+        codes[:, m] = distances.argmin(axis=1)
+    return codes
+
+
+class QuantizedStoreWriter:
+    """Agrega segmentos cuantizados durante la ingestión"""
+
+    def __init__(self, store_dir, method="int8", pq_subspaces=16):
+        if method not in ("int8", "pq"):
+            raise ValueError(f"Método de cuantización no soportado: {method}")
+        self.store_dir = store_dir
+        self.method = method
+        self.pq_subspaces = pq_subspaces
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._write_config()
+
+    def _write_config(self):
+        config_path = os.path.join(self.store_dir, "config.json")
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                existing = json.load(f)
+            if existing["method"] != self.method:
+                raise ValueError(
+                    f"El store en {self.store_dir} usa '{existing['method']}', no '{self.method}'. "
+                    "Vacíalo con clear() antes de cambiar de método."
+                )
+            self.pq_subspaces = existing.get("pq_subspaces", self.pq_subspaces)
+            return
+        with open(config_path, "w") as f:
+            json.dump({"method": self.method, "pq_subspaces": self.pq_subspaces}, f)
+
+    def _codebooks(self, vectors):
+        path = os.path.join(self.store_dir, "pq_codebooks.npy")
+        if os.path.exists(path):
+            return np.load(path)
+        # Los codebooks se entrenan con el primer lote y se reutilizan en los siguientes
+        logger.info(f"🧮 Entrenando codebooks PQ ({self.pq_subspaces} subespacios) con {len(vectors):,} vectores...")
+        codebooks = train_pq_codebooks(vectors, self.pq_subspaces)
+        np.save(path, codebooks)
+        return codebooks
+
+    def add(self, ids, embeddings, metadatas=None):
+        """
+        Agrega un lote de embeddings como un nuevo segmento
+
+        Args:
+            ids (list): Ids de los chunks (los mismos que en ChromaDB)
+            embeddings (list): Embeddings de cada chunk
+            metadatas (list): Metadatos de cada chunk (opcional)
+
+        Returns:
+            str: Nombre del segmento escrito (None si el lote estaba vacío)
+        """
+        if not ids:
+            return None
+
+        vectors = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        segment = f"seg-{uuid.uuid4().hex[:12]}"
+        tmp_dir = os.path.join(self.store_dir, f".{segment}.tmp")
+        os.makedirs(tmp_dir)
+
+        if self.method == "int8":
+            codes, scales = quantize_int8(vectors)
+            np.save(os.path.join(tmp_dir, "scales.npy"), scales)
+        else:
+            codes = encode_pq(vectors, self._codebooks(vectors))
+        np.save(os.path.join(tmp_dir, "codes.npy"), codes)
+        np.save(os.path.join(tmp_dir, "vectors.npy"), vectors.astype(np.float16))
+        with open(os.path.join(tmp_dir, "ids.json"), "w") as f:
+            json.dump(list(ids), f)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump([m or {} for m in (metadatas or [{}] * len(ids))], f, ensure_ascii=False)
+        os.replace(tmp_dir, os.path.join(self.store_dir, segment))
+
+        logger.info(f"🗜️ Segmento {self.method} {segment}: {len(ids):,} vectores ({codes.nbytes / 1024:.0f} KB de códigos)")
+        return segment
+
+    def clear(self):
+        """Elimina segmentos, codebooks y configuración"""
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._write_config()
+
+
+class QuantizedSnapshot:
+    """
+    Una carga del store: códigos, escalas, codebooks, vectores, ids y metadatos de los
+    mismos segmentos. No se modifica: QuantizedStore arma una nueva en cada recarga y la
+    publica con una sola asignación, así una búsqueda concurrente nunca mezcla los códigos
+    de una generación con los ids o los vectores de re-scoring de otra.
+    """
+
+    def __init__(self, signature=(), method=None, codes=None, scales=None, codebooks=None,
+                 vectors=(), ids=(), metadatas=()):
+        self.signature = signature
+        self.method = method
+        self.codes = codes
+        self.scales = scales
+        self.codebooks = codebooks
+        self.vectors = list(vectors)
+        self.segment_starts = np.cumsum([0] + [len(v) for v in self.vectors])
+        self.ids = list(ids)
+        self.metadatas = list(metadatas)
+        self.row_by_id = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+    def coarse_scores(self, query, rows=None):
+        """
+        Producto interno aproximado de una query normalizada contra los códigos (todos o `rows`).
+        Se recorre por bloques de SCORE_BLOCK_ROWS filas: NumPy pasa los códigos a float32 para
+        multiplicar, y hacerlo de una vez crearía una copia 4 veces más grande que los códigos.
+        """
+        n_rows = len(self.codes) if rows is None else len(rows)
+        out = np.empty(n_rows, dtype=np.float32)
+        tables = None
+        if self.method == "pq":
+            subspaces, _, sub_dim = self.codebooks.shape
+            tables = np.einsum("mkd,md->mk", self.codebooks, query.reshape(subspaces, sub_dim))
+        for start in range(0, n_rows, SCORE_BLOCK_ROWS):
+            block = slice(start, start + SCORE_BLOCK_ROWS)
+            block_rows = block if rows is None else rows[block]
+            codes = self.codes[block_rows]
+            if self.method == "int8":
+                out[block] = (codes.astype(np.float32) @ query) * self.scales[block_rows]
+            else:
+                out[block] = tables[np.arange(tables.shape[0])[None, :], codes].sum(axis=1)
+        return out
+
+    def exact_vectors(self, rows):
+        """Lee de disco los vectores float16 de las filas pedidas"""
+        rows = np.asarray(rows)
+        segments = np.searchsorted(self.segment_starts, rows, side="right") - 1
+        out = np.empty((len(rows), self.vectors[0].shape[1]), dtype=np.float32)
+        for i, (row, seg) in enumerate(zip(rows, segments)):
+            out[i] = self.vectors[seg][row - self.segment_starts[seg]]
+        return out
+
+    def search(self, embeddings, top_k, rerank_factor, rescore=True, rows=None):
+        n_rows = len(self.ids) if rows is None else len(rows)
+        if self.codes is None or n_rows == 0:
+            return [[] for _ in embeddings]
+
+        queries = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        n_candidates = min(n_rows, top_k * rerank_factor if rescore else top_k)
+        results = []
+        for query in queries:
+            coarse = self.coarse_scores(query, rows)
+            candidates = np.argpartition(-coarse, n_candidates - 1)[:n_candidates]
+            coarse = coarse[candidates]
+            if rows is not None:
+                candidates = np.asarray(rows)[candidates]
+            scores = self.exact_vectors(candidates) @ query if rescore else coarse
+            order = np.lexsort((candidates, -scores))[:top_k]
+            results.append([(int(candidates[i]), float(scores[i])) for i in order])
+        return results
+
+
+class QuantizedStore:
+    """
+    Lector del store cuantizado: búsqueda gruesa sobre los códigos y re-scoring
+    exacto de los candidatos. Se recarga cuando aparecen segmentos nuevos; quien
+    necesite ids y filas coherentes entre varias llamadas usa el snapshot que
+    devuelve ensure_loaded.
+    """
+
+    def __init__(self, store_dir, rerank_factor=10):
+        self.store_dir = store_dir
+        self.rerank_factor = rerank_factor
+        self._lock = threading.Lock()
+        self._snapshot = QuantizedSnapshot(signature=None)
+
+    def _dir_signature(self):
+        try:
+            return tuple(sorted(name for name in os.listdir(self.store_dir) if name.startswith("seg-")))
+        except OSError:
+            return ()
+
+    def _load(self, signature):
+        with open(os.path.join(self.store_dir, "config.json")) as f:
+            config = json.load(f)
+
+        codes, scales, vectors, ids, metadatas = [], [], [], [], []
+        for name in signature:
+            path = os.path.join(self.store_dir, name)
+            codes.append(np.load(os.path.join(path, "codes.npy")))
+            if config["method"] == "int8":
+                scales.append(np.load(os.path.join(path, "scales.npy")))
+            vectors.append(np.load(os.path.join(path, "vectors.npy"), mmap_mode="r"))
+            with open(os.path.join(path, "ids.json")) as f:
+                segment_ids = json.load(f)
+            ids.extend(segment_ids)
+            meta_path = os.path.join(path, "meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    metadatas.extend(json.load(f))
+            else:
+                metadatas.extend({} for _ in segment_ids)
+
+        method = config["method"]
+        return QuantizedSnapshot(
+            signature=signature,
+            method=method,
+            codes=np.concatenate(codes) if codes else None,
+            scales=np.concatenate(scales) if scales else None,
+            codebooks=(np.load(os.path.join(self.store_dir, "pq_codebooks.npy"))
+                       if method == "pq" and codes else None),
+            vectors=vectors,
+            ids=ids,
+            metadatas=metadatas,
+        )
+
+    def ensure_loaded(self) -> QuantizedSnapshot:
+        """Devuelve la carga vigente, recargando si cambiaron los segmentos."""
+        signature = self._dir_signature()
+        snapshot = self._snapshot
+        if signature == snapshot.signature:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if signature == snapshot.signature:
+                return snapshot
+            snapshot = self._load(signature)
+            self._snapshot = snapshot
+        logger.info(f" quantized_store.py: {len(snapshot.ids)} vectores {snapshot.method} cargados de {len(signature)} segmentos.")
+        return snapshot
+
+    @property
+    def snapshot(self) -> QuantizedSnapshot:
+        """Carga vigente sin comprobar si hay segmentos nuevos (para estado y métricas)."""
+        return self._snapshot
+
+    def search(self, embeddings, top_k, rescore=True, rows=None, snapshot=None):
+        """
+        Args:
+            rows: Subconjunto opcional de filas candidatas (pre-filtrado por metadatos)
+            snapshot: Carga sobre la que se calcularon `rows` (por defecto, la vigente)
+
+        Returns:
+            list: Por query, lista de (fila, score) ordenada por score descendente
+        """
+        snapshot = snapshot or self.ensure_loaded()
+        return snapshot.search(embeddings, top_k, self.rerank_factor, rescore=rescore, rows=rows)
+
+    def memory_report(self):
+        """Memoria residente de los códigos frente a la matriz float32 equivalente"""
+        snapshot = self.ensure_loaded()
+        n = len(snapshot.ids)
+        dim = snapshot.vectors[0].shape[1] if snapshot.vectors else 0
+        float32_bytes = n * dim * 4
+        resident = 0
+        for array in (snapshot.codes, snapshot.scales, snapshot.codebooks):
+            if array is not None:
+                resident += array.nbytes
+        return {
+            "method": snapshot.method,
+            "vectors": n,
+            "float32_bytes": float32_bytes,
+            "quantized_bytes": resident,
+            "compression_ratio": round(float32_bytes / resident, 2) if resident else 0.0,
+        }
@@ -0,0 +1,200 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import logging
+import threading
+from collections import Counter, defaultdict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Índice invertido en disco para la parte léxica (BM25) de la búsqueda híbrida.
+# Cada llamada a add() escribe un segmento inmutable con:
+#   terms.json    : vocabulario ordenado del segmento
+#   offsets.npy   : inicio de las postings de cada término (len = V + 1)
+#   postings.npy  : índice local del documento (int32)
+#   tfs.npy       : frecuencia del término en el documento (uint16)
+#   doc_lens.npy  : longitud en tokens de cada documento (int32)
+#   ids.json      : id del chunk en ChromaDB para cada índice local
+# Igual que generation.py, no importa config.py para poder usarse desde el backend.
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = {
+    "de", "la", "el", "en", "y", "a", "los", "las", "del", "que", "un", "una", "por", "con", "para",
+    "es", "se", "su", "al", "lo", "como", "the", "of", "and", "to", "in", "for", "on", "is", "by",
+    "with", "as", "at", "an", "or", "be", "are", "this", "that", "from", "it", "its",
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """Tokeniza en minúsculas conservando tickers, años y cifras."""
+    return [
+        token for token in _TOKEN_RE.findall(text.lower())
+        if token not in _STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+class SparseIndexWriter:
+    """Escribe segmentos del índice invertido durante la ingestión"""
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def add(self, ids, texts):
+        """
+        Agrega un lote de chunks como un nuevo segmento
+
+        Args:
+            ids (list): Ids de los chunks (los mismos que en ChromaDB)
+            texts (list): Texto de cada chunk
+
+        Returns:
+            str: Nombre del segmento escrito (None si el lote estaba vacío)
+        """
+        if not ids:
+            return None
+
+        postings = defaultdict(list)
+        doc_lens = np.zeros(len(ids), dtype=np.int32)
+        for local_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lens[local_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term].append((local_id, min(tf, np.iinfo(np.uint16).max)))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[term])
+        flat = [pair for term in terms for pair in postings[term]]
+        doc_array = np.fromiter((d for d, _ in flat), dtype=np.int32, count=len(flat))
+        tf_array = np.fromiter((tf for _, tf in flat), dtype=np.uint16, count=len(flat))
+
+        segment = f"seg-{uuid.uuid4().hex[:12]}"
+        tmp_dir = os.path.join(self.index_dir, f".{segment}.tmp")
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, "terms.json"), "w") as f:
+            json.dump(terms, f, ensure_ascii=False)
+        with open(os.path.join(tmp_dir, "ids.json"), "w") as f:
+            json.dump(list(ids), f)
+        np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+        np.save(os.path.join(tmp_dir, "postings.npy"), doc_array)
+        np.save(os.path.join(tmp_dir, "tfs.npy"), tf_array)
+        np.save(os.path.join(tmp_dir, "doc_lens.npy"), doc_lens)
+        os.replace(tmp_dir, os.path.join(self.index_dir, segment))
+
+        logger.info(f"🔤 Segmento léxico {segment}: {len(ids):,} chunks, {len(terms):,} términos")
+        return segment
+
+    def clear(self):
+        """Elimina todos los segmentos existentes"""
+        for name in os.listdir(self.index_dir):
+            if name.startswith("seg-") or name.endswith(".tmp"):
+                shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+
+
+class _Segment:
+    def __init__(self, path):
+        with open(os.path.join(path, "terms.json")) as f:
+            self.term_index = {term: i for i, term in enumerate(json.load(f))}
+        with open(os.path.join(path, "ids.json")) as f:
+            self.ids = json.load(f)
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.postings = np.load(os.path.join(path, "postings.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, "tfs.npy"), mmap_mode="r")
+        self.doc_lens = np.load(os.path.join(path, "doc_lens.npy")).astype(np.float32)
+
+    def term_postings(self, term):
+        i = self.term_index.get(term)
+        if i is None:
+            return None, None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.postings[start:end], self.tfs[start:end]
+
+
+class SparseIndex:
+    """
+    Lector BM25 sobre todos los segmentos del índice. Se recarga solo cuando
+    la ingestión agrega segmentos nuevos.
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._signature = None
+        self.segments = []
+        self.num_docs = 0
+        self.avg_doc_len = 0.0
+
+    def _dir_signature(self):
+        try:
+            return tuple(sorted(name for name in os.listdir(self.index_dir) if name.startswith("seg-")))
+        except OSError:
+            return ()
+
+    def ensure_loaded(self):
+        signature = self._dir_signature()
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            segments = [_Segment(os.path.join(self.index_dir, name)) for name in signature]
+            num_docs = sum(len(seg.ids) for seg in segments)
+            total_len = sum(float(seg.doc_lens.sum()) for seg in segments)
+            self.segments = segments
+            self.num_docs = num_docs
+            self.avg_doc_len = total_len / num_docs if num_docs else 0.0
+            self._signature = signature
+            logger.info(f" sparse_index.py: {len(segments)} segmentos cargados ({num_docs} chunks).")
+
+    def search(self, query, top_k):
+        """
+        Devuelve los top_k chunks por BM25.
+
+        Returns:
+            list: Tuplas (id, score) ordenadas por score descendente
+        """
+        self.ensure_loaded()
+        terms = set(tokenize(query))
+        if not terms or not self.num_docs:
+            return []
+
+        segments = self.segments
+        postings_by_term = {term: [seg.term_postings(term) for seg in segments] for term in terms}
+
+        results = []
+        scores_by_segment = [None] * len(segments)
+        for term, per_segment in postings_by_term.items():
+            df = sum(len(docs) for docs, _ in per_segment if docs is not None)
+            if df == 0:
+                continue
+            idf = np.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+            for s, (docs, tfs) in enumerate(per_segment):
+                if docs is None:
+                    continue
+                seg = segments[s]
+                if scores_by_segment[s] is None:
+                    scores_by_segment[s] = np.zeros(len(seg.ids), dtype=np.float32)
+                tf = np.asarray(tfs, dtype=np.float32)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * seg.doc_lens[docs] / self.avg_doc_len)
+                scores_by_segment[s][docs] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        for s, scores in enumerate(scores_by_segment):
+            if scores is None:
+                continue
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            results.extend((segments[s].ids[i], float(scores[i])) for i in top if scores[i] > 0)
+
+        results.sort(key=lambda pair: (-pair[1], pair[0]))
+        return results[:top_k]
+
+    def status(self):
+        return {"segments": len(self.segments), "documents": self.num_docs}
@@ -1,9 +1,19 @@
 import time
 import logging
 import os
+import uuid
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
-from config import CHROMA_PERSIST_DIR, EMBEDDING_MODEL
+from config import (
+    CHROMA_PERSIST_DIR, EMBEDDING_MODEL, GENERATION_FILE_PATH, SPARSE_INDEX_DIR,
+    QUANTIZED_STORE_DIR, QUANTIZATION, PQ_SUBSPACES, METADATA_SUMMARY_PATH,
+    EMBEDDING_ENGINE, ONNX_MODEL_DIR
+)
+from generation import bump_generation
+from metadata_index import parse_s3_key, update_metadata_summary
+from sparse_index import SparseIndexWriter
+from quantized_store import QuantizedStoreWriter
+from onnx_embeddings import OnnxEmbeddings
 
 logger = logging.getLogger(__name__)
 
@@ -11,13 +21,27 @@ class VectorStoreManager:
     """Maneja las operaciones de la base vectorial"""
     
     def __init__(self):
-        self.embedding_function = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        self.embedding_function = self._build_embedding_function()
         # --- CORRECCIÓN AQUÍ ---
         # Usamos la variable correcta importada desde config.py
         self.vector_dir = CHROMA_PERSIST_DIR
         self.collection_name = "financial_documents"
-        logger.info(f"VectorStoreManager inicializado con modelo: {EMBEDDING_MODEL}")
+        self.sparse_writer = SparseIndexWriter(SPARSE_INDEX_DIR)
+        self.quantized_writer = (
+            QuantizedStoreWriter(QUANTIZED_STORE_DIR, method=QUANTIZATION, pq_subspaces=PQ_SUBSPACES)
+            if QUANTIZATION != "none" else None
+        )
+        logger.info(f"VectorStoreManager inicializado con modelo: {EMBEDDING_MODEL} ({type(self.embedding_function).__name__})")
     
+    def _build_embedding_function(self):
+        """Crea el motor de embeddings configurado; si ONNX no está disponible, usa PyTorch"""
+        if EMBEDDING_ENGINE in ("onnx", "onnx-int8"):
+            try:
+                return OnnxEmbeddings(ONNX_MODEL_DIR, quantized=EMBEDDING_ENGINE == "onnx-int8")
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo cargar el motor {EMBEDDING_ENGINE} ({e}). Usando PyTorch.")
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+
     def initialize_store(self):
         """
         Asegura que el directorio para la base de datos persistente exista.
@@ -47,14 +71,29 @@ class VectorStoreManager:
             logger.info(f"💾 Guardando {len(documents):,} documentos en ChromaDB...")
             start_time = time.time()
             
-            Chroma.from_documents(
+            # Ids explícitos para que el índice léxico apunte a los mismos chunks que ChromaDB
+            ids = [str(uuid.uuid4()) for _ in documents]
+            vectorstore = Chroma.from_documents(
                 documents, 
                 embedding=self.embedding_function, 
+                ids=ids,
                 persist_directory=self.vector_dir,
                 collection_name=self.collection_name
             )
+            self.sparse_writer.add(ids, [doc.page_content for doc in documents])
+            if self.quantized_writer:
+                # Releemos los embeddings recién guardados en lugar de recalcularlos
+                stored = vectorstore._collection.get(ids=ids, include=["embeddings"])
+                embedding_by_id = dict(zip(stored["ids"], stored["embeddings"]))
+                self.quantized_writer.add(
+                    ids, [embedding_by_id[i] for i in ids], [doc.metadata for doc in documents]
+                )
+            update_metadata_summary(METADATA_SUMMARY_PATH, [doc.metadata for doc in documents])
             
             save_time = time.time() - start_time
+
+            # Avisamos a los lectores (backend) que el corpus cambió
+            bump_generation(GENERATION_FILE_PATH)
             
             logger.info(f"✅ Documentos guardados exitosamente en {save_time:.1f}s")
             return save_time
@@ -63,6 +102,92 @@ class VectorStoreManager:
             logger.error(f"❌ Error guardando documentos: {e}")
             raise
     
+    def rebuild_sparse_index(self, page_size=5000):
+        """
+        Reconstruye el índice léxico a partir de todo lo que ya está en ChromaDB
+        (necesario para los documentos ingestados antes de que existiera el índice).
+        """
+        try:
+            vectorstore = Chroma(
+                persist_directory=self.vector_dir,
+                embedding_function=self.embedding_function,
+                collection_name=self.collection_name
+            )
+            total = vectorstore._collection.count()
+            logger.info(f"🔤 Reconstruyendo índice léxico para {total:,} chunks...")
+
+            self.sparse_writer.clear()
+            for offset in range(0, total, page_size):
+                page = vectorstore._collection.get(include=["documents"], limit=page_size, offset=offset)
+                self.sparse_writer.add(page["ids"], page["documents"])
+
+            bump_generation(GENERATION_FILE_PATH)
+            logger.info("✅ Índice léxico reconstruido")
+            return total
+        except Exception as e:
+            logger.error(f"❌ Error reconstruyendo el índice léxico: {e}")
+            raise
+
+    def rebuild_quantized_store(self, page_size=5000):
+        """
+        Reconstruye el store cuantizado con todos los embeddings de ChromaDB
+        (necesario al activar QUANTIZATION sobre una base ya ingestada).
+        """
+        if not self.quantized_writer:
+            logger.warning("⚠️ QUANTIZATION=none, no hay store cuantizado que reconstruir")
+            return 0
+        try:
+            vectorstore = Chroma(
+                persist_directory=self.vector_dir,
+                embedding_function=self.embedding_function,
+                collection_name=self.collection_name
+            )
+            total = vectorstore._collection.count()
+            logger.info(f"🗜️ Reconstruyendo store {QUANTIZATION} para {total:,} vectores...")
+
+            self.quantized_writer.clear()
+            for offset in range(0, total, page_size):
+                page = vectorstore._collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+                self.quantized_writer.add(page["ids"], page["embeddings"], page["metadatas"])
+
+            bump_generation(GENERATION_FILE_PATH)
+            logger.info("✅ Store cuantizado reconstruido")
+            return total
+        except Exception as e:
+            logger.error(f"❌ Error reconstruyendo el store cuantizado: {e}")
+            raise
+
+    def backfill_filter_metadata(self, page_size=5000):
+        """
+        Agrega ticker y año (derivados de la clave S3) a los chunks ingestados antes
+        de que existieran esos metadatos, y regenera el resumen de metadatos.
+        """
+        try:
+            vectorstore = Chroma(
+                persist_directory=self.vector_dir,
+                embedding_function=self.embedding_function,
+                collection_name=self.collection_name
+            )
+            total = vectorstore._collection.count()
+            logger.info(f"🏷️ Completando ticker/año en {total:,} chunks...")
+
+            update_metadata_summary(METADATA_SUMMARY_PATH, [], reset=True)
+            for offset in range(0, total, page_size):
+                page = vectorstore._collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                metadatas = [
+                    {**(metadata or {}), **parse_s3_key((metadata or {}).get("source", ""))}
+                    for metadata in page["metadatas"]
+                ]
+                vectorstore._collection.update(ids=page["ids"], metadatas=metadatas)
+                update_metadata_summary(METADATA_SUMMARY_PATH, metadatas)
+
+            bump_generation(GENERATION_FILE_PATH)
+            logger.info("✅ Metadatos de filtrado completados")
+            return total
+        except Exception as e:
+            logger.error(f"❌ Error completando metadatos de filtrado: {e}")
+            raise
+
     def get_store_info(self):
         """Obtiene información sobre la base vectorial"""
         try:
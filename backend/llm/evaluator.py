@@ -1,15 +1,45 @@
-import os
-import google.generativeai as genai
+from llm.provider import get_model
+from llm.sufficiency_gate import SufficiencyGate
+from llm.response_cache import cached_generate, cached_generate_async
 
-# 1. Se configura el cliente de Gemini usando la variable de entorno
+# 1. El proveedor (Gemini o el stub local) se elige con LLM_PROVIDER, ver llm/provider.py
 try:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
     # 2. Se elige un modelo rápido y económico para la tarea de evaluación
-    model = genai.GenerativeModel('gemini-1.5-flash')
+    model = get_model('gemini-1.5-flash', role="evaluator")
 except Exception as e:
     print(f"Error al configurar la API de Gemini: {e}")
     model = None
 
+# Compuerta local por scores del retriever: solo se llama a Gemini dentro de la banda de incertidumbre
+sufficiency_gate = SufficiencyGate()
+
+def _sufficiency_prompt(question: str, chunks: list) -> str:
+    # Unimos el contenido de los chunks en un solo bloque de texto.
+    # Asumimos que 'chunks' es una lista de objetos Document con un atributo 'page_content'.
+    context_str = "\n---\n".join([chunk.page_content for chunk in chunks])
+    
+    # 3. Se crea un prompt único para Gemini.
+    prompt = f"""
+    Tu única tarea es evaluar si el 'Contexto' proporcionado contiene información suficiente y relevante para responder de manera directa a la 'Pregunta'.
+    Responde únicamente con la palabra 'sí' o 'no', sin ninguna otra explicación.
+
+    Contexto:
+    ---
+    {context_str}
+    ---
+    Pregunta: {question}
+
+    ¿Suficiente? (sí/no):
+    """
+    return prompt
+
+def _parse_decision(text: str) -> bool:
+    # Limpiamos la respuesta para asegurarnos de que solo leemos sí o no.
+    decision = text.strip().lower()
+    
+    # Devolvemos True si la respuesta contiene "sí".
+    return "sí" in decision
+
 def are_chunks_sufficient(question: str, chunks: list) -> bool:
     """
     Evalúa si los chunks de texto recuperados contienen la información 
@@ -31,35 +61,29 @@ def are_chunks_sufficient(question: str, chunks: list) -> bool:
     if not chunks:
         return False
 
-    # Unimos el contenido de los chunks en un solo bloque de texto.
-    # Asumimos que 'chunks' es una lista de objetos Document con un atributo 'page_content'.
-    context_str = "\n---\n".join([chunk.page_content for chunk in chunks])
-    
-    # 3. Se crea un prompt único para Gemini.
-    prompt = f"""
-    Tu única tarea es evaluar si el 'Contexto' proporcionado contiene información suficiente y relevante para responder de manera directa a la 'Pregunta'.
-    Responde únicamente con la palabra 'sí' o 'no', sin ninguna otra explicación.
-
-    Contexto:
-    ---
-    {context_str}
-    ---
-    Pregunta: {question}
-
-    ¿Suficiente? (sí/no):
-    """
-    
     try:
         # 4. Se llama a la API de Gemini en lugar de a la de OpenAI.
-        response = model.generate_content(prompt)
-        
-        # Limpiamos la respuesta para asegurarnos de que solo leemos sí o no.
-        decision = response.text.strip().lower()
-        
-        # Devolvemos True si la respuesta contiene "sí".
-        return "sí" in decision
+        text = cached_generate(model, _sufficiency_prompt(question, chunks), "evaluator")
+        return _parse_decision(text)
 
     except Exception as e:
         print(f"Error en el evaluador de suficiencia con Gemini: {e}")
         # En caso de error, es más seguro asumir que los chunks no son suficientes.
-        return False
\ No newline at end of file
+        return False
+
+async def are_chunks_sufficient_async(question: str, chunks: list) -> bool:
+    """Versión asíncrona de are_chunks_sufficient (no bloquea el event loop)."""
+    if not model:
+        print("El modelo de Gemini no está disponible. Asumiendo que los chunks no son suficientes.")
+        return False
+
+    if not chunks:
+        return False
+
+    try:
+        text = await cached_generate_async(model, _sufficiency_prompt(question, chunks), "evaluator")
+        return _parse_decision(text)
+
+    except Exception as e:
+        print(f"Error en el evaluador de suficiencia con Gemini: {e}")
+        return False
@@ -1,22 +1,21 @@
 # /app/llm/extractor.py
-import os
-import google.generativeai as genai
-from typing import Tuple
+from llm.provider import get_model
+from typing import Tuple, Optional
+from llm.response_cache import cached_generate, cached_generate_async
+from llm.local_extractor import LocalExtractor
 
 try:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    model = genai.GenerativeModel('gemini-1.5-flash-latest')
+    model = get_model('gemini-1.5-flash-latest', role="extractor")
 except Exception as e:
     print(f"Error al configurar la API de Gemini: {e}")
     model = None
 
-def extract_financial_info(question: str, sub_route: str) -> Tuple[str, str, str]:
-    if not model:
-        print("El modelo de Gemini no está disponible. No se puede extraer la información.")
-        return "", "", ""
+# Tablas de tickers/empresas y monedas: Gemini solo se llama si el resultado local es vacío o ambiguo
+local_extractor = LocalExtractor()
 
+def _extraction_prompt(question: str, sub_route: str) -> Optional[str]:
     if sub_route == "API_COTIZACION":
-        prompt = f"""
+        return f"""
         Eres un asistente experto en finanzas. Tu única tarea es extraer el símbolo de la acción de la siguiente pregunta.
         Si la pregunta menciona una empresa como Apple, devuelve su símbolo (AAPL). Si es Microsoft, devuelve MSFT.
         Si no contiene un símbolo o nombre de empresa, devuelve la cadena "no_encontrado".
@@ -25,16 +24,9 @@ def extract_financial_info(question: str, sub_route: str) -> Tuple[str, str, str
         Pregunta del usuario: "{question}"
         Símbolo:
         """
-        try:
-            response = model.generate_content(prompt)
-            symbol = response.text.strip().upper()
-            return (symbol if symbol != "NO_ENCONTRADO" else "", "", "")
-        except Exception as e:
-            print(f"Error al extraer el símbolo de acción con Gemini: {e}")
-            return "", "", ""
 
     elif sub_route == "TIPO_DE_CAMBIO":
-        prompt = f"""
+        return f"""
         Eres un asistente experto en finanzas. Tu única tarea es extraer la cantidad y los tickers de las monedas de la siguiente pregunta.
         Formato de respuesta: 'CANTIDAD,MONEDA_ORIGEN,MONEDA_DESTINO'. Si no encuentras la información, usa 'no_encontrado'.
         Ejemplos:
@@ -46,20 +38,9 @@ def extract_financial_info(question: str, sub_route: str) -> Tuple[str, str, str
         Pregunta del usuario: "{question}"
         Resultado:
         """
-        try:
-            response = model.generate_content(prompt)
-            result = response.text.strip().upper()
-            if result != "NO_ENCONTRADO":
-                parts = result.split(',')
-                if len(parts) == 3:
-                    return parts[1], parts[2], parts[0]
-            return "", "", ""
-        except Exception as e:
-            print(f"Error al extraer tickers de divisas con Gemini: {e}")
-            return "", "", ""
 
     elif sub_route == "NOTICIAS":
-        prompt = f"""
+        return f"""
         Eres un asistente experto. Tu única tarea es extraer el tema o nombre de la empresa de la que el usuario quiere noticias.
         Si la pregunta no contiene un nombre de empresa o un tema claro, devuelve la cadena "no_encontrado".
 
@@ -71,12 +52,70 @@ def extract_financial_info(question: str, sub_route: str) -> Tuple[str, str, str
         Pregunta del usuario: "{question}"
         Resultado:
         """
-        try:
-            response = model.generate_content(prompt)
-            entity = response.text.strip()
-            return (entity if entity != "no_encontrado" else "", "", "")
-        except Exception as e:
-            print(f"Error al extraer la entidad para noticias con Gemini: {e}")
-            return "", "", ""
-
-    return "", "", ""
\ No newline at end of file
+
+    return None
+
+def _parse_extraction(text: str, sub_route: str) -> Tuple[str, str, str]:
+    if sub_route == "API_COTIZACION":
+        symbol = text.strip().upper()
+        return (symbol if symbol != "NO_ENCONTRADO" else "", "", "")
+
+    elif sub_route == "TIPO_DE_CAMBIO":
+        result = text.strip().upper()
+        if result != "NO_ENCONTRADO":
+            parts = result.split(',')
+            if len(parts) == 3:
+                return parts[1], parts[2], parts[0]
+        return "", "", ""
+
+    elif sub_route == "NOTICIAS":
+        entity = text.strip()
+        return (entity if entity != "no_encontrado" else "", "", "")
+
+    return "", "", ""
+
+_ERROR_MESSAGES = {
+    "API_COTIZACION": "Error al extraer el símbolo de acción con Gemini",
+    "TIPO_DE_CAMBIO": "Error al extraer tickers de divisas con Gemini",
+    "NOTICIAS": "Error al extraer la entidad para noticias con Gemini",
+}
+
+def extract_financial_info(question: str, sub_route: str) -> Tuple[str, str, str]:
+    local = local_extractor.extract(question, sub_route)
+    if local:
+        return local
+
+    if not model:
+        print("El modelo de Gemini no está disponible. No se puede extraer la información.")
+        return "", "", ""
+
+    prompt = _extraction_prompt(question, sub_route)
+    if prompt is None:
+        return "", "", ""
+
+    try:
+        text = cached_generate(model, prompt, "extractor")
+        return _parse_extraction(text, sub_route)
+    except Exception as e:
+        print(f"{_ERROR_MESSAGES[sub_route]}: {e}")
+        return "", "", ""
+
+async def extract_financial_info_async(question: str, sub_route: str) -> Tuple[str, str, str]:
+    local = local_extractor.extract(question, sub_route)
+    if local:
+        return local
+
+    if not model:
+        print("El modelo de Gemini no está disponible. No se puede extraer la información.")
+        return "", "", ""
+
+    prompt = _extraction_prompt(question, sub_route)
+    if prompt is None:
+        return "", "", ""
+
+    try:
+        text = await cached_generate_async(model, prompt, "extractor")
+        return _parse_extraction(text, sub_route)
+    except Exception as e:
+        print(f"{_ERROR_MESSAGES[sub_route]}: {e}")
+        return "", "", ""
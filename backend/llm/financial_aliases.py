@@ -0,0 +1,151 @@
+# /app/llm/financial_aliases.py
+
+# Tablas de alias para el extractor local (ver llm/local_extractor.py).
+# Los alias que empiezan con "=" solo se reconocen respetando mayúsculas, porque
+# también son palabras comunes en español o inglés ("Meta", "Moderna", "Zoom").
+# La tabla de empresas se puede ampliar con el listado oficial de NASDAQ (NASDAQ_SYMBOLS_PATH).
+
+# (símbolo, nombre para mostrar, alias)
+NASDAQ_COMPANIES = [
+    ("AAPL", "Apple", ["apple", "apple inc"]),
+    ("MSFT", "Microsoft", ["microsoft", "msft"]),
+    ("NVDA", "NVIDIA", ["nvidia"]),
+    ("AMZN", "Amazon", ["amazon", "amazon.com"]),
+    ("GOOGL", "Alphabet", ["alphabet", "google"]),
+    ("META", "Meta Platforms", ["=Meta", "meta platforms", "facebook"]),
+    ("TSLA", "Tesla", ["tesla"]),
+    ("AVGO", "Broadcom", ["broadcom"]),
+    ("COST", "Costco", ["costco"]),
+    ("NFLX", "Netflix", ["netflix"]),
+    ("AMD", "AMD", ["amd", "advanced micro devices"]),
+    ("ADBE", "Adobe", ["adobe"]),
+    ("PEP", "PepsiCo", ["pepsico", "pepsi"]),
+    ("CSCO", "Cisco", ["cisco"]),
+    ("INTC", "Intel", ["intel"]),
+    ("QCOM", "Qualcomm", ["qualcomm"]),
+    ("TXN", "Texas Instruments", ["texas instruments"]),
+    ("AMGN", "Amgen", ["amgen"]),
+    ("INTU", "Intuit", ["=Intuit"]),
+    ("ISRG", "Intuitive Surgical", ["intuitive surgical"]),
+    ("CMCSA", "Comcast", ["comcast"]),
+    ("HON", "Honeywell", ["honeywell"]),
+    ("SBUX", "Starbucks", ["starbucks"]),
+    ("BKNG", "Booking Holdings", ["=Booking", "booking holdings", "booking.com"]),
+    ("GILD", "Gilead Sciences", ["gilead"]),
+    ("MDLZ", "Mondelez", ["mondelez", "mondelēz"]),
+    ("ADP", "ADP", ["automatic data processing"]),
+    ("REGN", "Regeneron", ["regeneron"]),
+    ("VRTX", "Vertex Pharmaceuticals", ["vertex pharmaceuticals"]),
+    ("PYPL", "PayPal", ["paypal"]),
+    ("ADI", "Analog Devices", ["analog devices"]),
+    ("MU", "Micron", ["micron", "micron technology"]),
+    ("LRCX", "Lam Research", ["lam research"]),
+    ("AMAT", "Applied Materials", ["applied materials"]),
+    ("KLAC", "KLA", ["kla corporation", "kla-tencor"]),
+    ("PANW", "Palo Alto Networks", ["palo alto networks"]),
+    ("SNPS", "Synopsys", ["synopsys"]),
+    ("CDNS", "Cadence Design Systems", ["=Cadence", "cadence design"]),
+    ("MELI", "MercadoLibre", ["mercadolibre", "mercado libre"]),
+    ("ASML", "ASML", ["asml"]),
+    ("ABNB", "Airbnb", ["airbnb"]),
+    ("CRWD", "CrowdStrike", ["crowdstrike"]),
+    ("MAR", "Marriott", ["marriott"]),
+    ("ORLY", "O'Reilly Automotive", ["o'reilly automotive"]),
+    ("CTAS", "Cintas", ["cintas"]),
+    ("MRNA", "Moderna", ["=Moderna"]),
+    ("PDD", "PDD Holdings", ["pdd holdings", "pinduoduo", "temu"]),
+    ("NTES", "NetEase", ["netease"]),
+    ("JD", "JD.com", ["jd.com"]),
+    ("BIDU", "Baidu", ["baidu"]),
+    ("LULU", "Lululemon", ["lululemon"]),
+    ("ZM", "Zoom Video", ["=Zoom", "zoom video"]),
+    ("DDOG", "Datadog", ["datadog"]),
+    ("TEAM", "Atlassian", ["atlassian"]),
+    ("WDAY", "Workday", ["workday"]),
+    ("EA", "Electronic Arts", ["electronic arts"]),
+    ("TTWO", "Take-Two Interactive", ["take-two", "take two interactive"]),
+    ("KDP", "Keurig Dr Pepper", ["keurig", "dr pepper"]),
+    ("KHC", "Kraft Heinz", ["kraft heinz", "kraft", "heinz"]),
+    ("MNST", "Monster Beverage", ["monster beverage"]),
+    ("DXCM", "Dexcom", ["dexcom"]),
+    ("IDXX", "IDEXX Laboratories", ["idexx"]),
+    ("ILMN", "Illumina", ["illumina"]),
+    ("BIIB", "Biogen", ["biogen"]),
+    ("EBAY", "eBay", ["ebay"]),
+    ("EXPE", "Expedia", ["expedia"]),
+    ("SIRI", "Sirius XM", ["sirius xm", "siriusxm"]),
+    ("WBD", "Warner Bros. Discovery", ["warner bros", "warner bros. discovery", "warner brothers"]),
+    ("CHTR", "Charter Communications", ["charter communications"]),
+    ("TMUS", "T-Mobile", ["t-mobile", "tmobile"]),
+    ("ROST", "Ross Stores", ["ross stores"]),
+    ("DLTR", "Dollar Tree", ["dollar tree"]),
+    ("FAST", "Fastenal", ["fastenal"]),
+    ("PAYX", "Paychex", ["paychex"]),
+    ("ODFL", "Old Dominion Freight Line", ["old dominion"]),
+    ("CSX", "CSX", ["csx"]),
+    ("PCAR", "PACCAR", ["paccar"]),
+    ("CPRT", "Copart", ["copart"]),
+    ("AEP", "American Electric Power", ["american electric power"]),
+    ("XEL", "Xcel Energy", ["xcel energy"]),
+    ("EXC", "Exelon", ["exelon"]),
+    ("COIN", "Coinbase", ["coinbase"]),
+    ("HOOD", "Robinhood", ["robinhood"]),
+    ("PLTR", "Palantir", ["palantir"]),
+    ("ARM", "Arm Holdings", ["arm holdings"]),
+    ("SMCI", "Super Micro Computer", ["supermicro", "super micro computer"]),
+    ("MSTR", "MicroStrategy", ["microstrategy", "strategy inc"]),
+    ("RIVN", "Rivian", ["rivian"]),
+    ("LCID", "Lucid Group", ["lucid motors", "lucid group"]),
+]
+
+# Códigos ISO-4217 y sus alias en español e inglés. Los códigos se reconocen en mayúsculas
+# (y en minúsculas si no chocan con palabras comunes, ver CURRENCY_LOWERCASE_CODES).
+CURRENCIES = {
+    "USD": ["dólar", "dólares", "dolar", "dolares", "dólar estadounidense", "dólares estadounidenses",
+            "dólar americano", "dólares americanos", "dollar", "dollars", "us dollar", "us dollars",
+            "us$", "u$s"],
+    "EUR": ["euro", "euros", "€"],
+    "GBP": ["libra", "libras", "libra esterlina", "libras esterlinas", "pound", "pounds",
+            "pound sterling", "british pound", "£"],
+    "JPY": ["yen", "yenes", "yens", "yen japonés", "yenes japoneses", "japanese yen", "¥"],
+    "CNY": ["yuan", "yuanes", "yuan chino", "yuanes chinos", "renminbi", "chinese yuan"],
+    "CHF": ["franco suizo", "francos suizos", "swiss franc", "swiss francs"],
+    "CAD": ["dólar canadiense", "dólares canadienses", "canadian dollar", "canadian dollars"],
+    "AUD": ["dólar australiano", "dólares australianos", "australian dollar", "australian dollars"],
+    "NZD": ["dólar neozelandés", "dólares neozelandeses", "new zealand dollar", "new zealand dollars"],
+    "HKD": ["dólar de hong kong", "dólares de hong kong", "hong kong dollar", "hong kong dollars"],
+    "SGD": ["dólar de singapur", "dólares de singapur", "singapore dollar", "singapore dollars"],
+    "MXN": ["peso mexicano", "pesos mexicanos", "mexican peso", "mexican pesos"],
+    "ARS": ["peso argentino", "pesos argentinos", "argentine peso", "argentine pesos"],
+    "CLP": ["peso chileno", "pesos chilenos", "chilean peso", "chilean pesos"],
+    "COP": ["peso colombiano", "pesos colombianos", "colombian peso", "colombian pesos"],
+    "UYU": ["peso uruguayo", "pesos uruguayos", "uruguayan peso", "uruguayan pesos"],
+    "PEN": ["sol peruano", "soles", "soles peruanos", "peruvian sol"],
+    "BRL": ["reales", "real brasileño", "reales brasileños", "brazilian real", "brazilian reais", "reais"],
+    "INR": ["rupia india", "rupias indias", "rupias", "indian rupee", "indian rupees", "rupee", "rupees"],
+    "KRW": ["won surcoreano", "wones", "korean won", "south korean won"],
+    "RUB": ["rublo", "rublos", "ruble", "rubles", "rouble", "roubles"],
+    "TRY": ["lira turca", "liras turcas", "turkish lira"],
+    "SEK": ["corona sueca", "coronas suecas", "swedish krona", "swedish kronor"],
+    "NOK": ["corona noruega", "coronas noruegas", "norwegian krone", "norwegian kroner"],
+    "DKK": ["corona danesa", "coronas danesas", "danish krone", "danish kroner"],
+    "PLN": ["zloty", "zlotys", "esloti", "eslotis", "polish zloty"],
+    "CZK": ["corona checa", "coronas checas", "czech koruna"],
+    "HUF": ["forinto", "forintos", "forint", "forints"],
+    "ILS": ["séquel", "shekel", "shekels", "nuevo séquel"],
+    "ZAR": ["rands", "rand sudafricano", "south african rand"],
+    "THB": ["baht", "bat tailandés"],
+    "IDR": ["rupia indonesia", "rupias indonesias", "indonesian rupiah"],
+    "PHP": ["peso filipino", "pesos filipinos", "philippine peso"],
+    "AED": ["dírham", "dirham", "dírhams", "dirhams", "uae dirham"],
+    "SAR": ["riyal saudí", "riyales saudíes", "saudi riyal"],
+    "PYG": ["guaraní", "guaraníes", "paraguayan guarani"],
+    "BOB": ["bolivianos", "peso boliviano", "bolivian boliviano"],
+    "VES": ["bolívar", "bolívares", "bolivar", "bolivares"],
+    "DOP": ["peso dominicano", "pesos dominicanos", "dominican peso"],
+    "GTQ": ["quetzal", "quetzales"],
+    "CRC": ["colón costarricense", "colones", "costa rican colon"],
+}
+
+# Códigos que además se aceptan en minúsculas (los demás chocan con palabras: "try", "pen", "cop"...)
+CURRENCY_LOWERCASE_CODES = {"USD", "EUR", "GBP", "JPY", "CNY", "CHF", "CAD", "AUD", "MXN", "ARS", "CLP", "BRL", "UYU"}
@@ -1,14 +1,16 @@
 # /app/llm/generator.py
 
 import os
-import google.generativeai as genai
-from typing import List, Dict, Optional
+from llm.provider import get_model
+from typing import List, Dict, Optional, AsyncIterator
+from llm.history import SUMMARY_ROLE
+from calculations.compound_interest import compound_interest_answer
+from calculations.arithmetic import arithmetic_answer
 
 try:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
     generation_config = {"response_mime_type": "text/plain"}
-    rag_model = genai.GenerativeModel('gemini-1.5-pro-latest')
-    fallback_model = genai.GenerativeModel('gemini-1.5-flash-latest', generation_config=generation_config)
+    rag_model = get_model('gemini-1.5-pro-latest', role="rag")
+    fallback_model = get_model('gemini-1.5-flash-latest', role="fallback", generation_config=generation_config)
 except Exception as e:
     print(f"Error al configurar la API de Gemini: {e}")
     rag_model = None
@@ -20,14 +22,14 @@ def _format_chat_history_for_prompt(chat_history: Optional[List[Dict[str, str]]]
     
     history_str = ""
     for msg in chat_history:
+        if msg.get("role") == SUMMARY_ROLE:
+            history_str += f"Resumen de la conversación anterior: {msg.get('content')}\n"
+            continue
         role = "Usuario" if msg.get("role") == "user" else "Asistente"
         history_str += f"{role}: {msg.get('content')}\n"
     return history_str
 
-def generate_rag_answer(question: str, chunks: list, chat_history: Optional[List[Dict[str, str]]]) -> str:
-    if not rag_model:
-        return "Error: El modelo de Gemini para RAG no está disponible."
-
+def _rag_prompt(question: str, chunks: list, chat_history: Optional[List[Dict[str, str]]]) -> str:
     context_str = "\n".join([chunk.page_content for chunk in chunks])
     formatted_history = _format_chat_history_for_prompt(chat_history)
 
@@ -53,17 +55,31 @@ def generate_rag_answer(question: str, chunks: list, chat_history: Optional[List
     ---
     RESPUESTA PRECISA Y BASADA EN EL CONTEXTO:
     """
+    return prompt
+
+def generate_rag_answer(question: str, chunks: list, chat_history: Optional[List[Dict[str, str]]]) -> str:
+    if not rag_model:
+        return "Error: El modelo de Gemini para RAG no está disponible."
+
     try:
-        response = rag_model.generate_content(prompt)
+        response = rag_model.generate_content(_rag_prompt(question, chunks, chat_history))
         return response.text
     except Exception as e:
         print(f"Error en generate_rag_answer con Gemini: {e}")
         return "Hubo un error al procesar la respuesta con los documentos."
 
-def generate_fallback_answer(question: str, chat_history: Optional[List[Dict[str, str]]]) -> str:
-    if not fallback_model:
-        return "Error: El modelo de Gemini para fallback no está disponible."
-        
+async def generate_rag_answer_async(question: str, chunks: list, chat_history: Optional[List[Dict[str, str]]]) -> str:
+    if not rag_model:
+        return "Error: El modelo de Gemini para RAG no está disponible."
+
+    try:
+        response = await rag_model.generate_content_async(_rag_prompt(question, chunks, chat_history))
+        return response.text
+    except Exception as e:
+        print(f"Error en generate_rag_answer con Gemini: {e}")
+        return "Hubo un error al procesar la respuesta con los documentos."
+
+def _fallback_prompt(question: str, chat_history: Optional[List[Dict[str, str]]]) -> str:
     formatted_history = _format_chat_history_for_prompt(chat_history)
 
     prompt = f"""
@@ -84,27 +100,46 @@ def generate_fallback_answer(question: str, chat_history: Optional[List[Dict[str
     ---
     RESPUESTA:
     """
+    return prompt
+
+def generate_fallback_answer(question: str, chat_history: Optional[List[Dict[str, str]]]) -> str:
+    if not fallback_model:
+        return "Error: El modelo de Gemini para fallback no está disponible."
 
     try:
-        response = fallback_model.generate_content(prompt)
+        response = fallback_model.generate_content(_fallback_prompt(question, chat_history))
         return response.text
     except Exception as e:
         print(f"Error en generate_fallback_answer con Gemini: {e}")
         return "Hubo un error al generar una respuesta."
 
-def handle_conversational_and_calculations(question: str, sub_route: str, chat_history: Optional[List[Dict[str, str]]]) -> str:
+async def generate_fallback_answer_async(question: str, chat_history: Optional[List[Dict[str, str]]]) -> str:
     if not fallback_model:
-        return "Error: El modelo de Gemini para la generación conversacional no está disponible."
+        return "Error: El modelo de Gemini para fallback no está disponible."
+
+    try:
+        response = await fallback_model.generate_content_async(_fallback_prompt(question, chat_history))
+        return response.text
+    except Exception as e:
+        print(f"Error en generate_fallback_answer con Gemini: {e}")
+        return "Hubo un error al generar una respuesta."
 
+def local_conversational_answer(question: str, sub_route: str) -> Optional[str]:
+    """Sub-rutas que se responden sin llamar a Gemini (None si hace falta el modelo)."""
     if sub_route == "FUERA_DE_TEMA":
         return "Lo siento, mi propósito es asistirte con preguntas sobre finanzas e inversiones. Por favor, hazme una pregunta sobre esos temas."
     
     if sub_route == "INTERES_COMPUESTO":
-        # Aquí iría la lógica para extraer datos y hacer el cálculo
-        # Por ahora, solo devolvemos un mensaje mock.
-        return "La funcionalidad de calculadora de interés compuesto está en desarrollo."
+        # Cálculo local vectorizado (ver calculations/compound_interest.py)
+        return compound_interest_answer(question)
 
-    # Lógica para CONSEJO_GENERAL, CALCULO_GENERAL y otros que usan LLM
+    if sub_route == "CALCULO_GENERAL":
+        # Si la pregunta no es una cuenta simple devuelve None y responde el modelo
+        return arithmetic_answer(question)
+    return None
+
+def _conversational_prompt(question: str, chat_history: Optional[List[Dict[str, str]]]) -> str:
+    # Lógica para CONSEJO_GENERAL, los CALCULO_GENERAL que no se resolvieron localmente y otros que usan LLM
     formatted_history = _format_chat_history_for_prompt(chat_history)
     
     prompt = f"""
@@ -126,21 +161,40 @@ def handle_conversational_and_calculations(question: str, sub_route: str, chat_h
     ---
     RESPUESTA:
     """
+    return prompt
+
+def handle_conversational_and_calculations(question: str, sub_route: str, chat_history: Optional[List[Dict[str, str]]]) -> str:
+    # Las respuestas locales no dependen de que el modelo esté disponible
+    local_answer = local_conversational_answer(question, sub_route)
+    if local_answer:
+        return local_answer
+
+    if not fallback_model:
+        return "Error: El modelo de Gemini para la generación conversacional no está disponible."
     
     try:
-        response = fallback_model.generate_content(prompt)
+        response = fallback_model.generate_content(_conversational_prompt(question, chat_history))
         return response.text
     except Exception as e:
         print(f"Error en handle_conversational_and_calculations con Gemini: {e}")
         return "Hubo un error al generar una respuesta."
-    
-def generate_news_summary(news_articles: list, entity: str) -> str:
-    if not rag_model:
-        return "Error: El modelo de Gemini no está disponible para generar resúmenes."
-        
-    if not news_articles:
-        return f"No se encontraron noticias recientes sobre {entity}."
 
+async def handle_conversational_and_calculations_async(question: str, sub_route: str, chat_history: Optional[List[Dict[str, str]]]) -> str:
+    local_answer = local_conversational_answer(question, sub_route)
+    if local_answer:
+        return local_answer
+
+    if not fallback_model:
+        return "Error: El modelo de Gemini para la generación conversacional no está disponible."
+
+    try:
+        response = await fallback_model.generate_content_async(_conversational_prompt(question, chat_history))
+        return response.text
+    except Exception as e:
+        print(f"Error en handle_conversational_and_calculations con Gemini: {e}")
+        return "Hubo un error al generar una respuesta."
+    
+def _news_prompt(news_articles: list, entity: str) -> str:
     articles_text = "\n\n".join([f"Título: {a['title']}\nDescripción: {a['description']}\nFuente: {a['source']['name']}" for a in news_articles])
 
     prompt = f"""
@@ -154,10 +208,96 @@ def generate_news_summary(news_articles: list, entity: str) -> str:
     ---
     Resumen para '{entity}':
     """
+    return prompt
+
+def generate_news_summary(news_articles: list, entity: str) -> str:
+    if not rag_model:
+        return "Error: El modelo de Gemini no está disponible para generar resúmenes."
+        
+    if not news_articles:
+        return f"No se encontraron noticias recientes sobre {entity}."
+
+    try:
+        response = rag_model.generate_content(_news_prompt(news_articles, entity))
+        return response.text
+    except Exception as e:
+        print(f"Error al generar el resumen de noticias con Gemini: {e}")
+        return "Hubo un error al generar el resumen de noticias."
+
+async def generate_news_summary_async(news_articles: list, entity: str) -> str:
+    if not rag_model:
+        return "Error: El modelo de Gemini no está disponible para generar resúmenes."
+
+    if not news_articles:
+        return f"No se encontraron noticias recientes sobre {entity}."
 
     try:
-        response = rag_model.generate_content(prompt)
+        response = await rag_model.generate_content_async(_news_prompt(news_articles, entity))
         return response.text
     except Exception as e:
         print(f"Error al generar el resumen de noticias con Gemini: {e}")
-        return "Hubo un error al generar el resumen de noticias."
\ No newline at end of file
+        return "Hubo un error al generar el resumen de noticias."
+
+# --- STREAMING ---
+# Variantes que devuelven la respuesta en fragmentos a medida que Gemini los genera,
+# para el endpoint /ask/stream. Si falla antes del primer fragmento, el error se emite
+# como texto, igual que en las versiones completas; si falla a mitad de la respuesta
+# se lanza GenerationError, para no pegar el mensaje de error al texto ya enviado.
+
+class GenerationError(Exception):
+    """La generación en streaming falló después de emitir parte de la respuesta."""
+
+async def _stream_model(model, prompt: str, error_context: str, error_message: str) -> AsyncIterator[str]:
+    sent = False
+    try:
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                sent = True
+                yield chunk.text
+    except Exception as e:
+        print(f"Error en {error_context} con Gemini: {e}")
+        if sent:
+            raise GenerationError(error_message) from e
+        yield error_message
+
+async def stream_rag_answer(question: str, chunks: list, chat_history: Optional[List[Dict[str, str]]]) -> AsyncIterator[str]:
+    if not rag_model:
+        yield "Error: El modelo de Gemini para RAG no está disponible."
+        return
+    async for piece in _stream_model(rag_model, _rag_prompt(question, chunks, chat_history), "generate_rag_answer",
+                                     "Hubo un error al procesar la respuesta con los documentos."):
+        yield piece
+
+async def stream_fallback_answer(question: str, chat_history: Optional[List[Dict[str, str]]]) -> AsyncIterator[str]:
+    if not fallback_model:
+        yield "Error: El modelo de Gemini para fallback no está disponible."
+        return
+    async for piece in _stream_model(fallback_model, _fallback_prompt(question, chat_history), "generate_fallback_answer",
+                                     "Hubo un error al generar una respuesta."):
+        yield piece
+
+async def stream_conversational_and_calculations(question: str, sub_route: str, chat_history: Optional[List[Dict[str, str]]]) -> AsyncIterator[str]:
+    local_answer = local_conversational_answer(question, sub_route)
+    if local_answer:
+        yield local_answer
+        return
+
+    if not fallback_model:
+        yield "Error: El modelo de Gemini para la generación conversacional no está disponible."
+        return
+    async for piece in _stream_model(fallback_model, _conversational_prompt(question, chat_history),
+                                     "handle_conversational_and_calculations", "Hubo un error al generar una respuesta."):
+        yield piece
+
+async def stream_news_summary(news_articles: list, entity: str) -> AsyncIterator[str]:
+    if not rag_model:
+        yield "Error: El modelo de Gemini no está disponible para generar resúmenes."
+        return
+
+    if not news_articles:
+        yield f"No se encontraron noticias recientes sobre {entity}."
+        return
+    async for piece in _stream_model(rag_model, _news_prompt(news_articles, entity), "generate_news_summary",
+                                     "Hubo un error al generar el resumen de noticias."):
+        yield piece
@@ -0,0 +1,206 @@
+# /app/llm/history.py
+
+import os
+import hashlib
+import threading
+from typing import List, Dict, Optional
+from rag.cache import LRUCache
+from llm.speculation import estimate_tokens
+from llm.provider import get_model
+
+# Presupuesto de tokens para el historial que se pega en los prompts de generación.
+# Si el historial lo supera, los turnos más viejos se pliegan en un resumen acumulado
+# por conversación: cada resumen nuevo parte del anterior y solo agrega los turnos
+# que salieron de la ventana, así no se vuelve a resumir toda la charla en cada turno.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 1500))
+HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", 1024))
+# Parte del presupuesto reservada para el resumen; el resto es para los turnos literales
+SUMMARY_TOKEN_SHARE = 0.25
+# Costo fijo aproximado por mensaje ("Usuario: ", salto de línea)
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_ROLE = "summary"
+
+try:
+    summary_model = get_model('gemini-1.5-flash-latest', role="summary")
+except Exception as e:
+    print(f"Error al configurar la API de Gemini: {e}")
+    summary_model = None
+
+
+def message_tokens(msg: Dict[str, str]) -> int:
+    return estimate_tokens(msg.get("content") or "") + _MESSAGE_OVERHEAD_TOKENS
+
+
+def history_tokens(chat_history: Optional[List[Dict[str, str]]]) -> int:
+    return sum(message_tokens(msg) for msg in chat_history or [])
+
+
+def _digest(messages: List[Dict[str, str]]) -> str:
+    h = hashlib.sha256()
+    for msg in messages:
+        h.update(f"{msg.get('role')}\0{msg.get('content')}\0".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _conversation_key(chat_id: Optional[str], chat_history: List[Dict[str, str]]) -> str:
+    # Sin chat_id se identifica la conversación por su primer mensaje
+    return chat_id or f"anon:{_digest(chat_history[:1])}"
+
+
+def _summary_prompt(previous_summary: Optional[str], messages: List[Dict[str, str]], max_tokens: int) -> str:
+    turns = "\n".join(
+        f"{'Usuario' if msg.get('role') == 'user' else 'Asistente'}: {msg.get('content')}" for msg in messages
+    )
+    prompt = f"""
+    Eres un asistente que resume conversaciones sobre finanzas.
+    Actualiza el 'Resumen anterior' incorporando los 'Nuevos mensajes'.
+    Conserva empresas, tickers, cifras, fechas y preferencias del usuario que puedan ser útiles para responder preguntas posteriores.
+    Responde solo con el resumen actualizado, en español y en no más de {max_tokens * 3 // 4} palabras.
+
+    ---
+    RESUMEN ANTERIOR:
+    {previous_summary or "No hay resumen previo."}
+    ---
+    NUEVOS MENSAJES:
+    {turns}
+    ---
+    RESUMEN ACTUALIZADO:
+    """
+    return prompt
+
+
+class HistoryCompactor:
+    """
+    Ajusta el historial al presupuesto: devuelve un mensaje de rol "summary" con los
+    turnos viejos resumidos seguido de los turnos recientes literales.
+
+    El caché por conversación guarda (cantidad de mensajes resumidos, digest de esos
+    mensajes, resumen). Cuando hay que plegar más turnos se resume solo la diferencia
+    a partir del resumen anterior; si el prefijo cambió (chat editado) se rehace entero.
+    Al plegar se deja la ventana reciente a la mitad de su cupo, para que los turnos
+    siguientes reutilicen el mismo resumen en vez de pedir uno nuevo cada vez.
+    """
+
+    def __init__(self, budget_tokens: int = HISTORY_TOKEN_BUDGET, cache_size: int = HISTORY_SUMMARY_CACHE_SIZE):
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = int(budget_tokens * SUMMARY_TOKEN_SHARE)
+        self.recent_tokens = budget_tokens - self.summary_tokens
+        self.summaries = LRUCache(cache_size, name="history_summaries")
+        self._lock = threading.Lock()
+        self.counts = {
+            "requests": 0, "within_budget": 0, "summary_reused": 0,
+            "incremental_summaries": 0, "full_summaries": 0, "summary_failures": 0,
+        }
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def _count(self, field: str):
+        with self._lock:
+            self.counts[field] += 1
+
+    def _fold_point(self, chat_history: List[Dict[str, str]], target_tokens: int) -> int:
+        """Índice desde el que los turnos entran en `target_tokens` (siempre queda el último)."""
+        used = 0
+        for i in range(len(chat_history) - 1, -1, -1):
+            used += message_tokens(chat_history[i])
+            if used > target_tokens:
+                return min(i + 1, len(chat_history) - 1)
+        return 0
+
+    def _plan(self, chat_id: Optional[str], chat_history: List[Dict[str, str]]):
+        """
+        Returns:
+            (key, resultado listo o None, resumen previo, índice desde el que resumir, nuevo punto de pliegue)
+        """
+        key = _conversation_key(chat_id, chat_history)
+        cached = self.summaries.get(key)
+        if cached:
+            count, digest, summary = cached
+            if count < len(chat_history) and _digest(chat_history[:count]) == digest:
+                if history_tokens(chat_history[count:]) <= self.recent_tokens:
+                    self._count("summary_reused")
+                    return key, self._compacted(summary, chat_history[count:]), None, 0, 0
+                fold = self._fold_point(chat_history, self.recent_tokens // 2)
+                return key, None, summary, count, fold
+        fold = self._fold_point(chat_history, self.recent_tokens // 2)
+        return key, None, None, 0, fold
+
+    def _compacted(self, summary: Optional[str], recent: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        if not summary:
+            return list(recent)
+        return [{"role": SUMMARY_ROLE, "content": summary}] + list(recent)
+
+    def _finish(self, key, chat_history, previous_summary, start, fold, summary):
+        if summary:
+            self._count("incremental_summaries" if previous_summary else "full_summaries")
+            self.summaries.put(key, (fold, _digest(chat_history[:fold]), summary))
+            return self._compacted(summary, chat_history[fold:])
+
+        # Sin resumen (modelo no disponible o error): se recortan los turnos viejos
+        self._count("summary_failures")
+        return self._compacted(previous_summary, chat_history[max(fold, start):])
+
+    def _record(self, chat_history, compacted):
+        with self._lock:
+            self.tokens_in += history_tokens(chat_history)
+            self.tokens_out += history_tokens(compacted)
+        return compacted
+
+    def _start(self, chat_history) -> bool:
+        self._count("requests")
+        if history_tokens(chat_history) <= self.budget_tokens:
+            self._count("within_budget")
+            self._record(chat_history, chat_history)
+            return False
+        return True
+
+    def compact(self, chat_id: Optional[str], chat_history: Optional[List[Dict[str, str]]]) -> Optional[List[Dict[str, str]]]:
+        if not chat_history or not self._start(chat_history):
+            return chat_history
+        key, ready, previous_summary, start, fold = self._plan(chat_id, chat_history)
+        if ready is not None:
+            return self._record(chat_history, ready)
+
+        summary = None
+        if summary_model:
+            try:
+                prompt = _summary_prompt(previous_summary, chat_history[start:fold], self.summary_tokens)
+                summary = summary_model.generate_content(prompt).text.strip()
+            except Exception as e:
+                print(f"Error al resumir el historial con Gemini: {e}")
+        return self._record(chat_history, self._finish(key, chat_history, previous_summary, start, fold, summary))
+
+    async def compact_async(self, chat_id: Optional[str], chat_history: Optional[List[Dict[str, str]]]) -> Optional[List[Dict[str, str]]]:
+        if not chat_history or not self._start(chat_history):
+            return chat_history
+        key, ready, previous_summary, start, fold = self._plan(chat_id, chat_history)
+        if ready is not None:
+            return self._record(chat_history, ready)
+
+        summary = None
+        if summary_model:
+            try:
+                prompt = _summary_prompt(previous_summary, chat_history[start:fold], self.summary_tokens)
+                summary = (await summary_model.generate_content_async(prompt)).text.strip()
+            except Exception as e:
+                print(f"Error al resumir el historial con Gemini: {e}")
+        return self._record(chat_history, self._finish(key, chat_history, previous_summary, start, fold, summary))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "budget_tokens": self.budget_tokens,
+                **self.counts,
+                "summary_cache": self.summaries.stats(),
+                "history_tokens_in": self.tokens_in,
+                "history_tokens_out": self.tokens_out,
+                "reduction": round(1 - self.tokens_out / self.tokens_in, 4) if self.tokens_in else 0.0,
+            }
+
+
+history_compactor = HistoryCompactor()
+
+
+def get_history_stats() -> dict:
+    return history_compactor.stats()
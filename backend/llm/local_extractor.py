@@ -0,0 +1,312 @@
+# /app/llm/local_extractor.py
+
+import os
+import re
+import threading
+import unicodedata
+from collections import deque
+from typing import Optional, Tuple
+from llm.financial_aliases import NASDAQ_COMPANIES, CURRENCIES, CURRENCY_LOWERCASE_CODES
+
+# Extractor determinista de tickers, empresas, monedas y cantidades. Se consulta antes
+# que el extractor con Gemini (llm/extractor.py), que queda solo para cuando el resultado
+# local está vacío o es ambiguo.
+LOCAL_EXTRACTOR_ENABLED = os.getenv("LOCAL_EXTRACTOR_ENABLED", "true").lower() == "true"
+# Listado oficial de NASDAQ (nasdaqlisted.txt, separado por "|") para ampliar la tabla de empresas
+NASDAQ_SYMBOLS_PATH = os.getenv("NASDAQ_SYMBOLS_PATH")
+
+_TICKER_RE = re.compile(r"\b[A-Z]{2,5}\b")
+_NUMBER_RE = re.compile(r"(?<![\w.,])(\d[\d.,]*\d|\d)(?:\s*(k|mil millones|mil|millones|millón|millon|million|millions|billion|billions)\b)?", re.IGNORECASE)
+_MULTIPLIERS = {
+    "k": 1e3, "mil": 1e3, "millón": 1e6, "millon": 1e6, "millones": 1e6, "million": 1e6,
+    "millions": 1e6, "mil millones": 1e9, "billion": 1e9, "billions": 1e9,
+}
+# Sufijos del nombre legal que se quitan al cargar el listado de NASDAQ
+_NAME_SUFFIX_RE = re.compile(
+    r"[,\s]+(inc\.?|incorporated|corp\.?|corporation|co\.?|company|ltd\.?|limited|plc|n\.v\.|s\.a\.|holdings?|group|"
+    r"class [a-c]|common stock|ordinary shares|american depositary shares.*)$",
+    re.IGNORECASE,
+)
+_MIN_LISTED_NAME_LENGTH = 4
+# Distancia máxima (en caracteres) entre una cantidad y la moneda que la sigue
+_AMOUNT_CURRENCY_GAP = 3
+
+
+def fold(text: str) -> str:
+    """Minúsculas y sin tildes, conservando el largo (cada carácter se mapea a uno)."""
+    return "".join(unicodedata.normalize("NFD", ch)[0] for ch in unicodedata.normalize("NFC", text).casefold())
+
+
+def _fold_accents(text: str) -> str:
+    return "".join(unicodedata.normalize("NFD", ch)[0] for ch in unicodedata.normalize("NFC", text))
+
+
+class AhoCorasick:
+    """
+    Autómata de Aho-Corasick: encuentra todas las apariciones de miles de alias
+    en una sola pasada sobre el texto.
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+
+    def add(self, pattern: str, value):
+        node = 0
+        for ch in pattern:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[node][ch] = nxt
+            node = nxt
+        self.out[node].append((len(pattern), value))
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def iter(self, text: str):
+        """Genera (inicio, fin, valor) de cada aparición."""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for length, value in self.out[node]:
+                yield i - length + 1, i + 1, value
+
+
+def normalize_number(token: str, decimal_point: bool = False) -> str:
+    """
+    Lleva "1.500", "1,500.25", "1.500,25" o "12,5" a notación con punto decimal y sin
+    separadores de miles. Un separador seguido de exactamente tres dígitos se toma como
+    separador de miles, salvo detrás de un 0 solo ("0.125" y "0,500" son decimales).
+
+    Con decimal_point=True (cálculos, donde la ambigüedad no se puede dejar al LLM) un único
+    "." es siempre punto decimal ("1.005" -> 1.005); "1.000.000" y los números que también
+    tienen "," siguen las reglas de arriba.
+    """
+    if "." in token and "," in token:
+        decimal = "." if token.rfind(".") > token.rfind(",") else ","
+        return token.replace("," if decimal == "." else ".", "").replace(decimal, ".")
+    for sep in (".", ","):
+        if sep in token:
+            parts = token.split(sep)
+            if len(parts) > 2:
+                thousands = True
+            elif decimal_point and sep == ".":
+                thousands = False
+            else:
+                thousands = len(parts[-1]) == 3 and parts[0] != "0"
+            token = token.replace(sep, "" if thousands else ".")
+    return token
+
+
+def parse_number(token: str, multiplier: Optional[str] = None, decimal_point: bool = False) -> Optional[float]:
+    """Interpreta "1.500", "1,500.25", "1.500,25", "12,5" o "3 mil" (ver normalize_number)."""
+    try:
+        value = float(normalize_number(token, decimal_point))
+    except ValueError:
+        return None
+    if multiplier:
+        value *= _MULTIPLIERS[multiplier.lower()]
+    return value
+
+
+def format_amount(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def load_nasdaq_listing(path: str) -> list:
+    """Lee nasdaqlisted.txt y devuelve (símbolo, nombre) con el nombre sin sufijos legales."""
+    companies = []
+    with open(path, encoding="utf-8") as f:
+        header = f.readline().strip().split("|")
+        symbol_col, name_col = header.index("Symbol"), header.index("Security Name")
+        test_col = header.index("Test Issue") if "Test Issue" in header else None
+        for line in f:
+            fields = line.rstrip("\n").split("|")
+            if len(fields) <= max(symbol_col, name_col) or line.startswith("File Creation Time"):
+                continue
+            if test_col is not None and fields[test_col] == "Y":
+                continue
+            name = fields[name_col].split(" - ")[0].strip()
+            previous = None
+            while previous != name:
+                previous, name = name, _NAME_SUFFIX_RE.sub("", name).strip()
+            companies.append((fields[symbol_col].strip(), name))
+    return companies
+
+
+class LocalExtractor:
+    """Motor de alias de empresas y monedas sobre un autómata de Aho-Corasick."""
+
+    def __init__(self, companies=NASDAQ_COMPANIES, currencies=CURRENCIES, listing_path: Optional[str] = NASDAQ_SYMBOLS_PATH):
+        self.symbols = {}
+        aliases = {}
+
+        def _register(alias: str, kind: str, value: str, case_sensitive: bool = False):
+            # "values" valen en cualquier caso; "exact" solo si el texto coincide con la forma registrada
+            entry = aliases.setdefault(fold(alias), {"kind": kind, "values": set(), "exact": {}})
+            if case_sensitive:
+                entry["exact"].setdefault(_fold_accents(alias), set()).add(value)
+            else:
+                entry["values"].add(value)
+
+        for symbol, name, names in companies:
+            self.symbols[symbol] = name
+            for alias in names:
+                if alias.startswith("="):
+                    _register(alias[1:], "company", symbol, case_sensitive=True)
+                else:
+                    _register(alias, "company", symbol)
+
+        if listing_path:
+            try:
+                curated = set(aliases)
+                for symbol, name in load_nasdaq_listing(listing_path):
+                    self.symbols.setdefault(symbol, name)
+                    # Los alias curados tienen prioridad; un nombre repetido entre empresas queda ambiguo
+                    if len(name) >= _MIN_LISTED_NAME_LENGTH and fold(name) not in curated:
+                        _register(name, "company", symbol)
+                print(f"DEBUG: Extractor local: {len(self.symbols)} símbolos cargados de {listing_path}.")
+            except (OSError, ValueError) as e:
+                print(f"DEBUG: No se pudo leer el listado de NASDAQ {listing_path}: {e}")
+
+        for code, names in currencies.items():
+            for alias in names:
+                _register(alias, "currency", code)
+            if code in CURRENCY_LOWERCASE_CODES:
+                _register(code, "currency", code)
+            else:
+                _register(code, "currency", code, case_sensitive=True)
+
+        self.automaton = AhoCorasick()
+        for key, entry in aliases.items():
+            self.automaton.add(key, entry)
+        self.automaton.build()
+        self.alias_count = len(aliases)
+
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def _count(self, sub_route: str, outcome: str):
+        with self._lock:
+            counts = self.counts.setdefault(sub_route, {"local": 0, "ambiguous": 0, "empty": 0})
+            counts[outcome] += 1
+
+    def matches(self, text: str) -> list:
+        """Apariciones (inicio, fin, tipo, valores) sin solaparse, eligiendo la más larga a la izquierda."""
+        folded = fold(text)
+        found = []
+        for start, end, entry in self.automaton.iter(folded):
+            # Solo palabras completas (los símbolos como "€" pueden ir pegados al número)
+            if folded[start].isalnum() and start > 0 and folded[start - 1].isalnum():
+                continue
+            if folded[end - 1].isalnum() and end < len(folded) and folded[end].isalnum():
+                continue
+            values = entry["values"] | entry["exact"].get(_fold_accents(text[start:end]), set())
+            if values:
+                found.append((start, end, entry["kind"], values))
+
+        found.sort(key=lambda m: (m[0], m[0] - m[1]))
+        selected, last_end = [], -1
+        for match in found:
+            if match[0] >= last_end:
+                selected.append(match)
+                last_end = match[1]
+
+        # Tickers escritos explícitamente en mayúsculas ("AAPL")
+        for m in _TICKER_RE.finditer(text):
+            if m.group() in self.symbols and not any(s <= m.start() < e for s, e, _, _ in selected):
+                selected.append((m.start(), m.end(), "company", {m.group()}))
+        selected.sort()
+        return selected
+
+    def companies(self, text: str) -> Optional[dict]:
+        """Símbolos mencionados con el texto tal como aparece, o None si algún alias es ambiguo."""
+        symbols = {}
+        for start, end, kind, values in self.matches(text):
+            if kind != "company":
+                continue
+            if len(values) > 1:
+                return None
+            symbols.setdefault(next(iter(values)), text[start:end])
+        return symbols
+
+    def currencies_and_amount(self, text: str):
+        """Monedas en orden de aparición y la cantidad asociada (si hay una sola o está pegada a una moneda)."""
+        currency_matches = [(s, e, next(iter(v))) for s, e, kind, v in self.matches(text) if kind == "currency"]
+        numbers = [(m.start(), m.end(), parse_number(m.group(1), m.group(2))) for m in _NUMBER_RE.finditer(text)]
+        numbers = [n for n in numbers if n[2] is not None]
+
+        source = None
+        amount = None
+        for n_start, n_end, value in numbers:
+            for c_start, c_end, code in currency_matches:
+                # "100 dólares" o, con el símbolo delante, "€50" / "US$ 100"
+                if 0 <= c_start - n_end <= _AMOUNT_CURRENCY_GAP or 0 <= n_start - c_end <= _AMOUNT_CURRENCY_GAP:
+                    amount, source = value, code
+                    break
+            if source:
+                break
+        if amount is None and len(numbers) == 1:
+            amount = numbers[0][2]
+
+        codes = list(dict.fromkeys(code for _, _, code in currency_matches))
+        return codes, source, amount
+
+    def extract(self, question: str, sub_route: str) -> Optional[Tuple[str, str, str]]:
+        """
+        Returns:
+            La tupla de extract_financial_info para la sub-ruta, o None si el resultado
+            local está vacío o es ambiguo (entonces decide el LLM).
+        """
+        if not LOCAL_EXTRACTOR_ENABLED or sub_route not in ("API_COTIZACION", "NOTICIAS", "TIPO_DE_CAMBIO"):
+            return None
+
+        if sub_route in ("API_COTIZACION", "NOTICIAS"):
+            symbols = self.companies(question)
+            if symbols is None or len(symbols) > 1:
+                self._count(sub_route, "ambiguous")
+                return None
+            if not symbols:
+                self._count(sub_route, "empty")
+                return None
+            self._count(sub_route, "local")
+            (symbol, mention), = symbols.items()
+            # Para noticias se busca por el nombre como lo escribió el usuario ("Google"), igual que el LLM
+            return (symbol if sub_route == "API_COTIZACION" else mention), "", ""
+
+        codes, source, amount = self.currencies_and_amount(question)
+        if not codes and amount is None:
+            self._count(sub_route, "empty")
+            return None
+        if len(codes) != 2 or amount is None:
+            self._count(sub_route, "ambiguous")
+            return None
+        from_currency = source or codes[0]
+        to_currency = codes[1] if from_currency == codes[0] else codes[0]
+        self._count(sub_route, "local")
+        return from_currency, to_currency, format_amount(amount)
+
+    def stats(self) -> dict:
+        with self._lock:
+            by_route = {}
+            for sub_route, counts in self.counts.items():
+                total = sum(counts.values())
+                by_route[sub_route] = {**counts, "local_rate": round(counts["local"] / total, 4) if total else 0.0}
+        return {"enabled": LOCAL_EXTRACTOR_ENABLED, "aliases": self.alias_count, "symbols": len(self.symbols), "sub_routes": by_route}
@@ -0,0 +1,310 @@
+# /app/llm/local_router.py
+"""
+Router local por centroides sobre embeddings de MiniLM.
+
+Cada (ruta, sub-ruta) tiene un centroide: la media normalizada de los embeddings
+de sus ejemplos (semillas de este archivo + rutas que Gemini decidió y quedaron
+registradas en ROUTE_LOG_PATH). Si la pregunta está claramente más cerca de un
+centroide que del resto, se responde localmente (~1 ms); si no, decide Gemini.
+
+Cobertura y acuerdo con Gemini sobre el registro, para ajustar los umbrales:
+    python -m llm.local_router evaluate [min_score] [min_margin]
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+
+ROUTE_LOG_PATH = os.getenv("ROUTE_LOG_PATH", "/app/feedback/route_log.jsonl")
+LOCAL_ROUTER_ENABLED = os.getenv("LOCAL_ROUTER_ENABLED", "true").lower() == "true"
+# Similitud mínima con el centroide ganador y ventaja mínima sobre el segundo
+LOCAL_ROUTER_MIN_SCORE = float(os.getenv("LOCAL_ROUTER_MIN_SCORE", 0.55))
+LOCAL_ROUTER_MIN_MARGIN = float(os.getenv("LOCAL_ROUTER_MIN_MARGIN", 0.08))
+# Máximo de entradas del registro que se usan para entrenar
+ROUTE_LOG_MAX_EXAMPLES = int(os.getenv("ROUTE_LOG_MAX_EXAMPLES", 5000))
+# Al superar este tamaño el registro se rota a <ruta>.1 (se conserva una sola rotación)
+ROUTE_LOG_MAX_BYTES = int(os.getenv("ROUTE_LOG_MAX_BYTES", 5 * 1024 * 1024))
+_TAIL_BLOCK_BYTES = 64 * 1024
+_route_log_lock = threading.Lock()
+
+SEED_EXAMPLES = {
+    ("CONVERSACIONAL", "CONSEJO_GENERAL"): [
+        "hola", "buenas tardes", "hola, ¿cómo estás?", "gracias", "muchas gracias por la ayuda",
+        "adiós", "chau, hasta luego", "¿quién eres?", "¿qué puedes hacer?", "hello", "thanks, bye",
+    ],
+    ("CONVERSACIONAL", "FUERA_DE_TEMA"): [
+        "¿qué tiempo hace hoy?", "¿quién ganó el partido de fútbol?", "recomiéndame una película",
+        "¿cómo se hace una pizza?", "cuéntame un chiste", "what's the weather like?",
+    ],
+    ("CALCULOS_Y_PROYECCIONES", "INTERES_COMPUESTO"): [
+        "¿cuánto tendré si invierto 1000 dólares al 5% anual durante 10 años?",
+        "calcula el interés compuesto de 5000 al 7% por 20 años",
+        "valor futuro de una inversión de 10000 con interés compuesto",
+        "si ahorro 200 por mes al 6% anual, ¿cuánto tendré en 15 años?",
+        "compound interest on 1000 at 5% for 10 years",
+    ],
+    ("CALCULOS_Y_PROYECCIONES", "TIPO_DE_CAMBIO"): [
+        "¿cuánto es 100 dólares en euros?", "convertir 500 yenes a libras", "pasar 50 euros a pesos",
+        "tipo de cambio de 200 USD a EUR", "how much is 100 dollars in euros",
+    ],
+    ("CALCULOS_Y_PROYECCIONES", "CALCULO_GENERAL"): [
+        "¿cuánto es 15% de 2300?", "calcula 2500*1.07^5", "¿cuánto es 340 dividido 4?",
+        "suma 1200 más 350", "what is 12% of 800",
+    ],
+    ("DATOS_ESPECIFICOS", "API_COTIZACION"): [
+        "precio de AAPL", "precio de las acciones de Apple hoy", "¿a cuánto cotiza Tesla?",
+        "cotización de MSFT", "¿cuánto vale la acción de Nvidia ahora?", "stock price of Amazon",
+    ],
+    ("DATOS_ESPECIFICOS", "RAG_NASDAQ"): [
+        "¿qué hace Apple?", "historia de Microsoft", "¿cuáles fueron los ingresos de NVIDIA en 2021?",
+        "principales riesgos de Tesla según su reporte anual", "¿quién es el CEO de Amazon?",
+        "¿en qué segmentos opera Alphabet?", "¿qué es el NASDAQ?", "what does Cisco do",
+    ],
+    ("DATOS_ESPECIFICOS", "NOTICIAS"): [
+        "últimas noticias de Tesla", "noticias recientes de Google", "¿qué pasó hoy con Apple?",
+        "novedades de la bolsa de valores", "latest news about Microsoft",
+    ],
+    ("CONSEJO_FINANCIERO", "RECOMENDACION_COMPRA"): [
+        "¿qué acciones debería comprar?", "¿me recomiendas comprar acciones de Apple?",
+        "¿cuál es la mejor acción para comprar ahora?", "which stocks should I buy",
+    ],
+    ("CONSEJO_FINANCIERO", "RECOMENDACION_PORTAFOLIO"): [
+        "¿cómo armo un portafolio de inversión?", "¿cómo diversifico mi cartera?",
+        "¿qué porcentaje de mi portafolio debería tener en bonos?", "how should I build my portfolio",
+    ],
+    ("CONSEJO_FINANCIERO", "CONSEJO_DE_INVERSION"): [
+        "¿debo invertir en bonos?", "¿conviene invertir en criptomonedas?",
+        "¿dónde invierto mis ahorros?", "¿es buen momento para invertir en la bolsa?",
+    ],
+}
+
+
+def _tail_lines(path: str, limit: int) -> list[bytes]:
+    """Últimas `limit` líneas del archivo, leyendo desde el final por bloques."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= limit:
+            step = min(_TAIL_BLOCK_BYTES, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.splitlines()
+    if position > 0:
+        lines = lines[1:]   # la primera puede estar cortada a la mitad
+    return lines[-limit:]
+
+
+def read_route_log(path: str, limit: int = ROUTE_LOG_MAX_EXAMPLES) -> list[dict]:
+    """Últimas `limit` decisiones de Gemini registradas (pregunta, ruta, sub-ruta), incluida la rotación."""
+    limit = limit or sys.maxsize
+    lines = []
+    for candidate in (path, path + ".1"):
+        try:
+            lines = _tail_lines(candidate, limit - len(lines)) + lines
+        except OSError:
+            pass
+        if len(lines) >= limit:
+            break
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
+
+
+def append_route_log(path: str, question: str, route: str, sub_route: str):
+    line = json.dumps({"question": question, "route": route, "sub_route": sub_route, "ts": time.time()},
+                      ensure_ascii=False) + "\n"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with _route_log_lock:
+            if ROUTE_LOG_MAX_BYTES > 0 and os.path.exists(path) and os.path.getsize(path) >= ROUTE_LOG_MAX_BYTES:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        print(f"DEBUG: No se pudo registrar la ruta en {path}: {e}")
+
+
+class LocalRouter:
+    """
+    Clasificador de centroides más cercanos. `embed` recibe una lista de textos y
+    devuelve sus embeddings (se usa la caché de embeddings del retriever).
+    Los centroides se entrenan en el primer uso y se actualizan con cada ruta aprendida.
+    Cada pregunta (normalizada) se aprende una sola vez: las repetidas, que además suelen
+    venir de la caché de respuestas del router, inclinarían los centroides hacia lo más
+    preguntado.
+    """
+
+    def __init__(self, embed, log_path: str = ROUTE_LOG_PATH, min_score: float = LOCAL_ROUTER_MIN_SCORE,
+                 min_margin: float = LOCAL_ROUTER_MIN_MARGIN, seeds: dict = SEED_EXAMPLES):
+        self.embed = embed
+        self.log_path = log_path
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.seeds = seeds
+        self._lock = threading.Lock()
+        self._train_lock = threading.Lock()
+        self._learned = OrderedDict()   # preguntas normalizadas ya aprendidas (acotado)
+        self.labels = []
+        self._sums = None
+        self._counts = None
+        self._centroids = None
+
+    @staticmethod
+    def _normalize(matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    @staticmethod
+    def _question_key(question: str) -> str:
+        return " ".join(question.casefold().split())
+
+    def _remember(self, key: str) -> bool:
+        """Registra la pregunta; False si ya se había aprendido. Debe llamarse con el lock tomado."""
+        if key in self._learned:
+            self._learned.move_to_end(key)
+            return False
+        self._learned[key] = True
+        while len(self._learned) > max(ROUTE_LOG_MAX_EXAMPLES, 1):
+            self._learned.popitem(last=False)
+        return True
+
+    def _examples(self) -> list[tuple[str, tuple]]:
+        examples = [(text, label) for label, texts in self.seeds.items() for text in texts]
+        valid = set(self.seeds)
+        seen = set()
+        for entry in read_route_log(self.log_path):
+            label = (entry.get("route"), entry.get("sub_route"))
+            question = entry.get("question")
+            if not question or label not in valid:
+                continue
+            key = self._question_key(question)
+            if key not in seen:
+                seen.add(key)
+                examples.append((question, label))
+        return examples
+
+    def train(self):
+        examples = self._examples()
+        labels = list(self.seeds)
+        index = {label: i for i, label in enumerate(labels)}
+        vectors = self._normalize(self.embed([text for text, _ in examples]))
+        sums = np.zeros((len(labels), vectors.shape[1]), dtype=np.float32)
+        counts = np.zeros(len(labels), dtype=np.int64)
+        rows = np.array([index[label] for _, label in examples])
+        np.add.at(sums, rows, vectors)
+        np.add.at(counts, rows, 1)
+        with self._lock:
+            self.labels, self._sums, self._counts = labels, sums, counts
+            self._centroids = self._normalize(sums)
+            for text, _ in examples:
+                self._remember(self._question_key(text))
+        print(f"DEBUG: Router local entrenado con {len(examples)} ejemplos en {len(labels)} rutas.")
+
+    def _ensure_trained(self):
+        if self._centroids is None:
+            # Las primeras requests concurrentes esperan a un único entrenamiento
+            with self._train_lock:
+                if self._centroids is None:
+                    self.train()
+
+    def scores(self, question: str) -> list[tuple[tuple, float]]:
+        """Similitud de la pregunta con cada centroide, de mayor a menor."""
+        self._ensure_trained()
+        query = self._normalize(self.embed([question])[0])
+        similarities = self._centroids @ query
+        order = np.argsort(-similarities)
+        return [(self.labels[i], float(similarities[i])) for i in order]
+
+    def classify(self, question: str):
+        """
+        Returns:
+            tuple: (ruta, sub_ruta, score) si la decisión es confiable, None si debe decidir Gemini.
+        """
+        ranked = self.scores(question)
+        (label, best), (_, second) = ranked[0], ranked[1]
+        if best >= self.min_score and best - second >= self.min_margin:
+            return label[0], label[1], best
+        return None
+
+    def learn(self, question: str, route: str, sub_route: str):
+        """Registra una decisión de Gemini y la suma al centroide correspondiente."""
+        label = (route, sub_route)
+        if label not in self.seeds:
+            return
+        with self._lock:
+            if not self._remember(self._question_key(question)):
+                return
+        append_route_log(self.log_path, question, route, sub_route)
+        if self._centroids is None:
+            return
+        vector = self._normalize(self.embed([question])[0])
+        with self._lock:
+            i = self.labels.index(label)
+            self._sums[i] += vector
+            self._counts[i] += 1
+            self._centroids[i] = self._normalize(self._sums[i])
+
+    def status(self) -> dict:
+        return {
+            "trained": self._centroids is not None,
+            "examples": int(self._counts.sum()) if self._counts is not None else 0,
+            "min_score": self.min_score,
+            "min_margin": self.min_margin,
+        }
+
+
+def evaluate(router: LocalRouter) -> dict:
+    """
+    Cobertura (fracción resuelta localmente) y acuerdo con Gemini sobre el registro
+    de rutas, con validación leave-one-out (cada pregunta se descuenta de su centroide).
+    """
+    router.train()
+    entries = [e for e in read_route_log(router.log_path) if (e.get("route"), e.get("sub_route")) in router.seeds]
+    if not entries:
+        return {"error": f"No hay rutas registradas en {router.log_path}."}
+
+    vectors = router._normalize(router.embed([e["question"] for e in entries]))
+    covered = agreed = 0
+    for entry, vector in zip(entries, vectors):
+        i = router.labels.index((entry["route"], entry["sub_route"]))
+        sums = router._sums.copy()
+        sums[i] -= vector
+        similarities = router._normalize(sums) @ vector
+        order = np.argsort(-similarities)
+        best, second = similarities[order[0]], similarities[order[1]]
+        if best >= router.min_score and best - second >= router.min_margin:
+            covered += 1
+            agreed += int(order[0] == i)
+    return {
+        "logged_questions": len(entries),
+        "coverage": round(covered / len(entries), 4),
+        "agreement_when_local": round(agreed / covered, 4) if covered else 0.0,
+        "min_score": router.min_score,
+        "min_margin": router.min_margin,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "evaluate":
+        print(__doc__)
+        sys.exit(1)
+    from rag.retriever import embed_queries
+    router = LocalRouter(
+        embed_queries,
+        min_score=float(sys.argv[2]) if len(sys.argv) > 2 else LOCAL_ROUTER_MIN_SCORE,
+        min_margin=float(sys.argv[3]) if len(sys.argv) > 3 else LOCAL_ROUTER_MIN_MARGIN,
+    )
+    for key, value in evaluate(router).items():
+        print(f"{key}: {value}")
@@ -0,0 +1,246 @@
+# /app/llm/provider.py
+"""
+Capa de proveedor de LLM. Los módulos de llm/ piden sus modelos con get_model()
+en vez de crear GenerativeModel directamente; el proveedor se elige con LLM_PROVIDER:
+
+  gemini : google.generativeai (por defecto, requiere GEMINI_API_KEY)
+  stub   : backend local determinista, sin red ni API key, para medir el overhead
+           propio y el comportamiento con concurrencia (ver benchmarks/load_test.py)
+
+Los modelos exponen la misma interfaz que usa el código: generate_content(prompt, stream=False),
+generate_content_async(prompt, stream=False) y .model_name; las respuestas tienen .text.
+
+Configuración del stub:
+  STUB_LATENCY / STUB_LATENCY_<ROL>  distribución de la latencia hasta el primer token:
+                                     fixed:ms | uniform:min,max | normal:media,desvío | lognormal:mediana,sigma
+  STUB_STREAM_INTERVAL_MS            espera entre fragmentos al hacer streaming
+  STUB_SEED                          semilla de las distribuciones
+  STUB_SCRIPT_PATH                   JSON {rol: [{"match": regex, "response": texto}, ...]};
+                                     gana la primera regla cuyo regex aparece en el prompt
+Roles: router, route_extractor, extractor, evaluator, rag, fallback, summary.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from typing import Optional
+from llm.scheduler import schedule
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+STUB_LATENCY = os.getenv("STUB_LATENCY", "lognormal:400,0.4")
+STUB_STREAM_INTERVAL_MS = float(os.getenv("STUB_STREAM_INTERVAL_MS", 20))
+STUB_SEED = int(os.getenv("STUB_SEED", 0))
+STUB_SCRIPT_PATH = os.getenv("STUB_SCRIPT_PATH")
+_STREAM_WORDS_PER_CHUNK = 5
+
+_GENERATED_TEXT = (
+    "## Respuesta simulada\n\n"
+    "Esta es una respuesta generada por el **proveedor stub** para pruebas de carga. "
+    "Su largo es fijo para que el costo de armar, transmitir y registrar la respuesta "
+    "sea comparable entre corridas, sin depender de la red ni de la API de Gemini.\n"
+)
+
+# Respuestas por defecto, con el formato que espera el parser de cada módulo
+DEFAULT_RESPONSES = {
+    "router": "DATOS_ESPECIFICOS, RAG_NASDAQ",
+    "route_extractor": '{"route": "DATOS_ESPECIFICOS", "sub_route": "RAG_NASDAQ"}',
+    "extractor": "NO_ENCONTRADO",
+    "evaluator": "sí",
+    "rag": _GENERATED_TEXT,
+    "fallback": _GENERATED_TEXT,
+    "summary": "Resumen simulado de la conversación.",
+}
+
+
+def parse_latency(spec: str):
+    """Convierte 'tipo:params' en una función rng -> milisegundos."""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()]
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Distribución de latencia desconocida: '{spec}'")
+
+
+def _load_script(path: Optional[str]) -> dict:
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        script = json.load(f)
+    return {
+        role: [(re.compile(rule["match"], re.IGNORECASE), rule["response"]) for rule in rules]
+        for role, rules in script.items()
+    }
+
+
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _AsyncStubStream:
+    def __init__(self, pieces: list, interval_s: float):
+        self._pieces = pieces
+        self._interval_s = interval_s
+
+    async def __aiter__(self):
+        for i, piece in enumerate(self._pieces):
+            if i:
+                await asyncio.sleep(self._interval_s)
+            yield _StubResponse(piece)
+
+
+# Contador opcional de las llamadas hechas en el contexto actual (lo usa api/singleflight.py
+# para saber cuántas llamadas se ahorran las requests que se suman a una ejecución en curso)
+llm_call_counter = contextvars.ContextVar("llm_call_counter", default=None)
+
+
+class ProviderStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.simulated_ms = {}
+
+    def record(self, role: str, simulated_ms: float = 0.0):
+        counter = llm_call_counter.get()
+        if counter is not None:
+            counter[0] += 1
+        with self._lock:
+            self.calls[role] = self.calls.get(role, 0) + 1
+            self.simulated_ms[role] = self.simulated_ms.get(role, 0.0) + simulated_ms
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "provider": LLM_PROVIDER,
+                "calls": dict(self.calls),
+                "simulated_ms": {role: round(ms, 1) for role, ms in self.simulated_ms.items()},
+            }
+
+
+provider_stats = ProviderStats()
+
+
+class StubModel:
+    """Modelo local con salidas guionadas y latencia muestreada de una distribución configurable."""
+
+    def __init__(self, model_name: str, role: str, script: Optional[dict] = None):
+        self.model_name = f"stub:{model_name}"
+        self.role = role
+        self.rules = (script or {}).get(role, [])
+        self.latency = parse_latency(os.getenv(f"STUB_LATENCY_{role.upper()}", STUB_LATENCY))
+        self.interval_s = STUB_STREAM_INTERVAL_MS / 1000
+        self._rng = random.Random(f"{STUB_SEED}:{role}")
+        self._lock = threading.Lock()
+
+    def _respond(self, prompt: str) -> str:
+        for pattern, response in self.rules:
+            if pattern.search(prompt):
+                return response
+        return DEFAULT_RESPONSES.get(self.role, _GENERATED_TEXT)
+
+    def _pieces(self, text: str) -> list:
+        words = text.split(" ")
+        return [" ".join(words[i:i + _STREAM_WORDS_PER_CHUNK]) + " "
+                for i in range(0, len(words), _STREAM_WORDS_PER_CHUNK)]
+
+    def _plan(self, prompt: str):
+        text = self._respond(prompt)
+        with self._lock:
+            first_token_s = self.latency(self._rng) / 1000
+        pieces = self._pieces(text)
+        # Sin streaming se espera lo mismo que tardaría en llegar el último fragmento
+        total_s = first_token_s + self.interval_s * (len(pieces) - 1)
+        provider_stats.record(self.role, total_s * 1000)
+        return text, pieces, first_token_s, total_s
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        text, pieces, first_token_s, total_s = self._plan(prompt)
+        if not stream:
+            time.sleep(total_s)
+            return _StubResponse(text)
+        time.sleep(first_token_s)
+
+        def _iterate():
+            for i, piece in enumerate(pieces):
+                if i:
+                    time.sleep(self.interval_s)
+                yield _StubResponse(piece)
+        return _iterate()
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        text, pieces, first_token_s, total_s = self._plan(prompt)
+        if not stream:
+            await asyncio.sleep(total_s)
+            return _StubResponse(text)
+        await asyncio.sleep(first_token_s)
+        return _AsyncStubStream(pieces, self.interval_s)
+
+
+class _CountingModel:
+    """Envuelve un GenerativeModel de Gemini para contar las llamadas por rol."""
+
+    def __init__(self, model, role: str):
+        self._model = model
+        self.role = role
+        self.model_name = model.model_name
+
+    def generate_content(self, prompt, **kwargs):
+        provider_stats.record(self.role)
+        return self._model.generate_content(prompt, **kwargs)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        provider_stats.record(self.role)
+        return await self._model.generate_content_async(prompt, **kwargs)
+
+
+_configured = False
+_script = None
+
+
+def get_model(model_name: str, role: str, generation_config: Optional[dict] = None):
+    """
+    Args:
+        model_name (str): Nombre del modelo de Gemini (el stub lo usa solo como etiqueta)
+        role (str): Para qué se usa el modelo; elige las respuestas y la latencia del stub
+        generation_config (dict): Configuración de generación de Gemini
+
+    Returns:
+        Un modelo con generate_content/generate_content_async, envuelto por el planificador
+        de llm/scheduler.py (cuota, concurrencia y prioridad por rol). Lanza excepción si el
+        proveedor no se puede inicializar (los módulos la capturan y dejan el modelo en None).
+    """
+    global _configured, _script
+    if LLM_PROVIDER == "stub":
+        if _script is None:
+            _script = _load_script(STUB_SCRIPT_PATH)
+        return schedule(StubModel(model_name, role, _script), role)
+    if LLM_PROVIDER != "gemini":
+        raise ValueError(f"LLM_PROVIDER desconocido: '{LLM_PROVIDER}'")
+
+    import google.generativeai as genai
+    if not _configured:
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        _configured = True
+    if generation_config:
+        model = genai.GenerativeModel(model_name, generation_config=generation_config)
+    else:
+        model = genai.GenerativeModel(model_name)
+    return schedule(_CountingModel(model, role), role)
+
+
+def get_provider_stats() -> dict:
+    return provider_stats.stats()
@@ -0,0 +1,188 @@
+# /app/llm/response_cache.py
+
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from rag.cache import LRUCache
+
+# Caché de respuestas para las llamadas deterministas a Gemini (router, extractor, evaluador).
+# La clave es el hash del modelo + namespace + prompt; las entradas viven en un LRU en memoria
+# respaldado por SQLite (sobrevive reinicios) y expiran por TTL.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "/app/feedback/llm_cache.db")
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 4096))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 86400))
+
+
+def prompt_key(model_name: str, namespace: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{namespace}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class PromptResponseCache:
+    """
+    LRU en memoria + tabla SQLite. Cada entrada guarda la latencia que costó
+    generarla, para reportar el tiempo ahorrado por cada acierto.
+
+    Desde código async solo get_memory corre en el event loop: la lectura de disco
+    (get_disk) va en un hilo y las escrituras con put(..., background=True) las
+    hace un único hilo escritor, en orden.
+    """
+
+    def __init__(self, path: str, maxsize: int = 4096, ttl_seconds: float = 86400):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory = LRUCache(maxsize, name="llm_responses")
+        self._lock = threading.Lock()      # contadores
+        self._db_lock = threading.Lock()   # conexión SQLite: el event loop nunca espera por este
+        self._conn = None
+        self._stats = {}
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-cache-writer")
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                "key TEXT PRIMARY KEY, namespace TEXT, response TEXT, latency_ms REAL, created_at REAL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _count(self, namespace: str, field: str, amount: float = 1):
+        stats = self._stats.setdefault(namespace, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "latency_saved_ms": 0.0})
+        stats[field] += amount
+
+    def get(self, key: str, namespace: str):
+        cached = self.get_memory(key, namespace)
+        return cached if cached is not None else self.get_disk(key, namespace)
+
+    def get_memory(self, key: str, namespace: str):
+        """Solo el LRU en memoria; no cuenta fallos (los cuenta get_disk)."""
+        entry = self.memory.get(key)
+        if entry is None or time.time() - entry[2] > self.ttl_seconds:
+            return None
+        with self._lock:
+            self._count(namespace, "memory_hits")
+            self._count(namespace, "latency_saved_ms", entry[1])
+        return entry[0]
+
+    def get_disk(self, key: str, namespace: str):
+        now = time.time()
+        try:
+            with self._db_lock:
+                row = self._connection().execute(
+                    "SELECT response, latency_ms, created_at FROM llm_responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[2] > self.ttl_seconds:
+                    self._connection().execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                    self._connection().commit()
+                    row = None
+        except sqlite3.Error as e:
+            print(f"DEBUG: Error leyendo la caché de respuestas LLM: {e}")
+            row = None
+
+        with self._lock:
+            if row:
+                self._count(namespace, "disk_hits")
+                self._count(namespace, "latency_saved_ms", row[1])
+            else:
+                self._count(namespace, "misses")
+        if not row:
+            return None
+        self.memory.put(key, (row[0], row[1], row[2]))
+        return row[0]
+
+    def put(self, key: str, namespace: str, response: str, latency_ms: float, background: bool = False):
+        created_at = time.time()
+        self.memory.put(key, (response, latency_ms, created_at))
+        if background:
+            self._writer.submit(self._write, key, namespace, response, latency_ms, created_at)
+        else:
+            self._write(key, namespace, response, latency_ms, created_at)
+
+    def _write(self, key: str, namespace: str, response: str, latency_ms: float, created_at: float):
+        try:
+            with self._db_lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, namespace, response, latency_ms, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, namespace, response, latency_ms, created_at)
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"DEBUG: Error escribiendo la caché de respuestas LLM: {e}")
+
+    def purge_expired(self) -> int:
+        with self._db_lock:
+            cursor = self._connection().execute(
+                "DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._connection().commit()
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            by_namespace = {}
+            for namespace, stats in self._stats.items():
+                hits = stats["memory_hits"] + stats["disk_hits"]
+                total = hits + stats["misses"]
+                by_namespace[namespace] = {
+                    **stats,
+                    "latency_saved_ms": round(stats["latency_saved_ms"], 1),
+                    "hit_rate": round(hits / total, 4) if total else 0.0,
+                }
+        return {"enabled": LLM_CACHE_ENABLED, "ttl_seconds": self.ttl_seconds,
+                "memory": self.memory.stats(), "modules": by_namespace}
+
+
+response_cache = PromptResponseCache(LLM_CACHE_PATH, LLM_CACHE_SIZE, LLM_CACHE_TTL_SECONDS)
+
+
+def _model_name(model) -> str:
+    return getattr(model, "model_name", None) or str(model)
+
+
+def cached_generate(model, prompt: str, namespace: str, validate=None) -> str:
+    """
+    generate_content(prompt).text con caché por hash del prompt. Ni los errores ni las
+    respuestas que `validate` rechaza (por ejemplo, un formato inesperado) se cachean.
+    """
+    if not LLM_CACHE_ENABLED:
+        return model.generate_content(prompt).text
+    key = prompt_key(_model_name(model), namespace, prompt)
+    cached = response_cache.get(key, namespace)
+    if cached is not None:
+        return cached
+    start = time.perf_counter()
+    text = model.generate_content(prompt).text
+    if validate is None or validate(text):
+        response_cache.put(key, namespace, text, (time.perf_counter() - start) * 1000)
+    return text
+
+
+async def cached_generate_async(model, prompt: str, namespace: str, validate=None) -> str:
+    """Versión asíncrona de cached_generate."""
+    if not LLM_CACHE_ENABLED:
+        return (await model.generate_content_async(prompt)).text
+    key = prompt_key(_model_name(model), namespace, prompt)
+    cached = response_cache.get_memory(key, namespace)
+    if cached is None:
+        cached = await asyncio.to_thread(response_cache.get_disk, key, namespace)
+    if cached is not None:
+        return cached
+    start = time.perf_counter()
+    text = (await model.generate_content_async(prompt)).text
+    if validate is None or validate(text):
+        response_cache.put(key, namespace, text, (time.perf_counter() - start) * 1000, background=True)
+    return text
+
+
+def get_llm_cache_stats() -> dict:
+    return response_cache.stats()
@@ -0,0 +1,135 @@
+# /app/llm/route_extractor.py
+
+import os
+import json
+from typing import Literal, Optional, Tuple
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+from llm.response_cache import cached_generate, cached_generate_async
+from llm.provider import get_model
+from llm.local_extractor import format_amount
+
+try:
+    model = get_model(
+        'gemini-1.5-flash-latest',
+        role="route_extractor",
+        generation_config={"response_mime_type": "application/json", "temperature": 0},
+    )
+except Exception as e:
+    print(f"Error al configurar la API de Gemini: {e}")
+    model = None
+
+SUB_ROUTES = {
+    "CONVERSACIONAL": {"CONSEJO_GENERAL", "FUERA_DE_TEMA"},
+    "CALCULOS_Y_PROYECCIONES": {"INTERES_COMPUESTO", "TIPO_DE_CAMBIO", "CALCULO_GENERAL"},
+    "DATOS_ESPECIFICOS": {"API_COTIZACION", "RAG_NASDAQ", "NOTICIAS"},
+    "CONSEJO_FINANCIERO": {"RECOMENDACION_COMPRA", "RECOMENDACION_PORTAFOLIO", "CONSEJO_DE_INVERSION"},
+}
+
+
+class RouteExtraction(BaseModel):
+    """Esquema de la respuesta JSON del clasificador-extractor"""
+    route: Literal["CONVERSACIONAL", "CALCULOS_Y_PROYECCIONES", "DATOS_ESPECIFICOS", "CONSEJO_FINANCIERO"]
+    sub_route: str
+    symbol: Optional[str] = None
+    entity: Optional[str] = None
+    from_currency: Optional[str] = None
+    to_currency: Optional[str] = None
+    amount: Optional[float] = Field(default=None, allow_inf_nan=False)
+
+    @field_validator("symbol", "from_currency", "to_currency")
+    @classmethod
+    def _upper_code(cls, value):
+        value = (value or "").strip().upper()
+        return value if value and value != "NO_ENCONTRADO" else None
+
+    @field_validator("entity")
+    @classmethod
+    def _clean_entity(cls, value):
+        value = (value or "").strip()
+        return value if value and value.lower() != "no_encontrado" else None
+
+    @model_validator(mode="after")
+    def _check_sub_route(self):
+        if self.sub_route not in SUB_ROUTES[self.route]:
+            raise ValueError(f"La sub-ruta {self.sub_route} no pertenece a {self.route}")
+        return self
+
+    def extracted(self) -> Tuple[str, str, str]:
+        """Entidades en el mismo formato que devuelve extract_financial_info para la sub-ruta."""
+        if self.sub_route == "API_COTIZACION":
+            return (self.symbol or "", "", "")
+        if self.sub_route == "NOTICIAS":
+            return (self.entity or "", "", "")
+        if self.sub_route == "TIPO_DE_CAMBIO":
+            if self.from_currency and self.to_currency and self.amount is not None:
+                return (self.from_currency, self.to_currency, format_amount(self.amount))
+        return ("", "", "")
+
+
+def parse_route_extraction(text: str) -> Optional[RouteExtraction]:
+    try:
+        return RouteExtraction.model_validate(json.loads(text))
+    except (ValueError, ValidationError) as e:
+        print(f"Respuesta inválida del clasificador-extractor: '{text}' ({e})")
+        return None
+
+
+def _combined_prompt(question: str) -> str:
+    return f"""
+    Eres un clasificador de preguntas de un asistente virtual financiero que además extrae los datos necesarios para responderlas.
+
+    Categorías (route) y sub-categorías (sub_route):
+    - CONVERSACIONAL: CONSEJO_GENERAL (saludos, preguntas abiertas, despedidas), FUERA_DE_TEMA (preguntas no relacionadas con finanzas)
+    - CALCULOS_Y_PROYECCIONES: INTERES_COMPUESTO (valor futuro de una inversión), TIPO_DE_CAMBIO (valor de una divisa en otra), CALCULO_GENERAL (otros cálculos simples)
+    - DATOS_ESPECIFICOS: API_COTIZACION (precio actual de una acción o índice), RAG_NASDAQ (historia, características o datos de una empresa del nasdaq), NOTICIAS (noticias o eventos recientes)
+    - CONSEJO_FINANCIERO: RECOMENDACION_COMPRA (qué acciones comprar), RECOMENDACION_PORTAFOLIO (cómo armar un portafolio), CONSEJO_DE_INVERSION (dónde invertir)
+
+    Campos a extraer (null si no aplican o no aparecen en la pregunta):
+    - symbol: símbolo bursátil para API_COTIZACION (Apple -> "AAPL", Microsoft -> "MSFT").
+    - entity: empresa o tema para NOTICIAS ("Tesla", "bolsa de valores").
+    - from_currency, to_currency: códigos ISO 4217 para TIPO_DE_CAMBIO ("USD", "EUR").
+    - amount: cantidad numérica para TIPO_DE_CAMBIO.
+
+    Responde únicamente con un objeto JSON con las claves route, sub_route, symbol, entity, from_currency, to_currency y amount.
+    Ejemplos:
+    "precio de las acciones de Apple hoy?" -> {{"route": "DATOS_ESPECIFICOS", "sub_route": "API_COTIZACION", "symbol": "AAPL", "entity": null, "from_currency": null, "to_currency": null, "amount": null}}
+    "cuánto es 100 dolares en euros?" -> {{"route": "CALCULOS_Y_PROYECCIONES", "sub_route": "TIPO_DE_CAMBIO", "symbol": null, "entity": null, "from_currency": "USD", "to_currency": "EUR", "amount": 100}}
+    "últimas noticias de Amazon" -> {{"route": "DATOS_ESPECIFICOS", "sub_route": "NOTICIAS", "symbol": null, "entity": "Amazon", "from_currency": null, "to_currency": null, "amount": null}}
+
+    ---
+    Pregunta a clasificar: "{question}"
+    """
+
+
+def classify_and_extract(question: str) -> Optional[RouteExtraction]:
+    """
+    Clasifica la pregunta y extrae sus entidades (símbolo, tema de noticias, monedas
+    y cantidad) en una sola llamada a Gemini con salida JSON.
+
+    Returns:
+        RouteExtraction validado, o None si la llamada falla o el JSON no cumple el esquema
+        (en ese caso se usa el camino de dos llamadas: route_question + extract_financial_info).
+    """
+    if not model:
+        return None
+
+    try:
+        text = cached_generate(model, _combined_prompt(question), "route_extractor",
+                            validate=lambda t: parse_route_extraction(t.strip()) is not None)
+        return parse_route_extraction(text.strip())
+    except Exception as e:
+        print(f"Error en el clasificador-extractor con Gemini: {e}")
+        return None
+
+
+async def classify_and_extract_async(question: str) -> Optional[RouteExtraction]:
+    if not model:
+        return None
+
+    try:
+        text = await cached_generate_async(model, _combined_prompt(question), "route_extractor",
+                            validate=lambda t: parse_route_extraction(t.strip()) is not None)
+        return parse_route_extraction(text.strip())
+    except Exception as e:
+        print(f"Error en el clasificador-extractor con Gemini: {e}")
+        return None
@@ -1,21 +1,122 @@
 # /app/llm/router.py
 
 import os
-import google.generativeai as genai
-from typing import Tuple
+import threading
+from llm.provider import get_model
+from typing import Tuple, Optional
+from rag.metrics import LatencyRecorder
+from llm.local_router import LocalRouter, LOCAL_ROUTER_ENABLED
+from llm.route_extractor import classify_and_extract, classify_and_extract_async
+from rag.executor import run_in_retrieval_pool
+from llm.response_cache import cached_generate, cached_generate_async
+
+# "combined": clasificación y extracción de entidades en una sola llamada JSON (ver llm/route_extractor.py)
+# "separate": route_question y luego extract_financial_info, como antes
+ROUTER_MODE = os.getenv("ROUTER_MODE", "combined").lower()
 
 try:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    model = genai.GenerativeModel('gemini-1.5-flash-latest')
+    model = get_model('gemini-1.5-flash-latest', role="router")
 except Exception as e:
     print(f"Error al configurar la API de Gemini: {e}")
     model = None
-    
+
+def _embed_queries(texts):
+    # Import diferido: importar rag.retriever carga el modelo de embeddings
+    from rag.retriever import embed_queries
+    return embed_queries(texts)
+
+# Router local por embeddings: resuelve las preguntas obvias sin llamar a Gemini
+local_router = LocalRouter(_embed_queries)
+routing_latency = LatencyRecorder()
+routing_counts = {"local": 0, "gemini": 0, "combined": 0, "combined_fallbacks": 0}
+# Los contadores se actualizan desde el event loop y desde los hilos del pool de retrieval
+_counts_lock = threading.Lock()
+
+def _count(key: str):
+    with _counts_lock:
+        routing_counts[key] += 1
+
 def route_question(question: str) -> Tuple[str, str]:
-    if not model:
-        print("El modelo de Gemini no está disponible. Usando ruta por defecto.")
-        return ("CONVERSACIONAL", "CONSEJO_GENERAL")
+    local_route = _route_locally(question) if LOCAL_ROUTER_ENABLED else None
+    if local_route:
+        return local_route
+
+    return _route_with_gemini(question)
+
+def _route_with_gemini(question: str) -> Tuple[str, str]:
+    with routing_latency.measure("gemini"):
+        _count("gemini")
+        return route_question_with_gemini(question)
+
+def route_and_extract(question: str) -> Tuple[str, str, Optional[Tuple[str, str, str]]]:
+    """
+    Como route_question, pero cuando decide Gemini en modo "combined" también devuelve
+    las entidades extraídas (mismo formato que extract_financial_info), ahorrando la
+    segunda llamada. Devuelve None como entidades si hay que llamar al extractor.
+    """
+    local_route = _route_locally(question) if LOCAL_ROUTER_ENABLED else None
+    if local_route:
+        return (*local_route, None)
+
+    if ROUTER_MODE == "combined":
+        with routing_latency.measure("combined"):
+            result = classify_and_extract(question)
+        if result:
+            _count("combined")
+            _learn_route(question, result.route, result.sub_route)
+            return (result.route, result.sub_route, result.extracted())
+        _count("combined_fallbacks")
+        print("DEBUG: El clasificador-extractor falló. Usando el camino de dos llamadas.")
+
+    return (*_route_with_gemini(question), None)
+
+async def route_and_extract_async(question: str) -> Tuple[str, str, Optional[Tuple[str, str, str]]]:
+    """Versión asíncrona de route_and_extract: el router local corre en el pool de retrieval."""
+    local_route = await run_in_retrieval_pool(_route_locally, question) if LOCAL_ROUTER_ENABLED else None
+    if local_route:
+        return (*local_route, None)
+
+    if ROUTER_MODE == "combined":
+        with routing_latency.measure("combined"):
+            result = await classify_and_extract_async(question)
+        if result:
+            _count("combined")
+            await run_in_retrieval_pool(_learn_route, question, result.route, result.sub_route)
+            return (result.route, result.sub_route, result.extracted())
+        _count("combined_fallbacks")
+        print("DEBUG: El clasificador-extractor falló. Usando el camino de dos llamadas.")
 
+    with routing_latency.measure("gemini"):
+        _count("gemini")
+        return (*await route_question_with_gemini_async(question), None)
+
+def _route_locally(question: str) -> Optional[Tuple[str, str]]:
+    try:
+        with routing_latency.measure("local"):
+            decision = local_router.classify(question)
+    except Exception as e:
+        print(f"Error en el router local: {e}")
+        return None
+    if not decision:
+        return None
+    route, sub_route, score = decision
+    print(f"DEBUG: Ruta resuelta localmente (score {score:.3f}).")
+    _count("local")
+    return (route, sub_route)
+
+def get_router_stats() -> dict:
+    with _counts_lock:
+        counts = dict(routing_counts)
+    total = counts["local"] + counts["gemini"] + counts["combined"]
+    return {
+        **counts,
+        "mode": ROUTER_MODE,
+        "local_rate": round(counts["local"] / total, 4) if total else 0.0,
+        "local_router": local_router.status(),
+        "latency": routing_latency.stats(),
+    }
+
+def _routing_prompt(question: str) -> str:
     prompt = f"""
     Eres un clasificador de preguntas de un asistente virtual financiero.
     Tu tarea es clasificar la siguiente pregunta del usuario en la categoría más relevante.
@@ -46,23 +147,61 @@ def route_question(question: str) -> Tuple[str, str]:
 
     Categoría,Sub-categoría:
     """
+    return prompt
 
-    try:
-        response = model.generate_content(prompt)
-        route_str = response.text.strip()
+def _parse_route(route_str: str) -> Optional[Tuple[str, str]]:
+    route_str = route_str.strip()
+    if ',' in route_str:
+        route, sub_route = route_str.split(',', 1)
+        route = route.strip()
+        sub_route = sub_route.strip()
         
-        if ',' in route_str:
-            route, sub_route = route_str.split(',', 1)
-            route = route.strip()
-            sub_route = sub_route.strip()
-            
-            valid_routes = ["CONVERSACIONAL", "CALCULOS_Y_PROYECCIONES", "DATOS_ESPECIFICOS", "CONSEJO_FINANCIERO"]
-            if route in valid_routes:
-                return (route, sub_route)
-        
-        print(f"Respuesta inesperada del router: '{route_str}'. Usando fallback.")
+        valid_routes = ["CONVERSACIONAL", "CALCULOS_Y_PROYECCIONES", "DATOS_ESPECIFICOS", "CONSEJO_FINANCIERO"]
+        if route in valid_routes:
+            return (route, sub_route)
+    
+    print(f"Respuesta inesperada del router: '{route_str}'. Usando fallback.")
+    return None
+
+def route_question_with_gemini(question: str) -> Tuple[str, str]:
+    if not model:
+        print("El modelo de Gemini no está disponible. Usando ruta por defecto.")
+        return ("CONVERSACIONAL", "CONSEJO_GENERAL")
+
+    try:
+        text = cached_generate(model, _routing_prompt(question), "router",
+                            validate=lambda t: _parse_route(t) is not None)
+        parsed = _parse_route(text)
+        if parsed:
+            _learn_route(question, *parsed)
+            return parsed
         return ("CONVERSACIONAL", "CONSEJO_GENERAL")
     
     except Exception as e:
         print(f"Error en el enrutador con Gemini: {e}")
-        return ("CONVERSACIONAL", "CONSEJO_GENERAL")
\ No newline at end of file
+        return ("CONVERSACIONAL", "CONSEJO_GENERAL")
+
+async def route_question_with_gemini_async(question: str) -> Tuple[str, str]:
+    if not model:
+        print("El modelo de Gemini no está disponible. Usando ruta por defecto.")
+        return ("CONVERSACIONAL", "CONSEJO_GENERAL")
+
+    try:
+        text = await cached_generate_async(model, _routing_prompt(question), "router",
+                            validate=lambda t: _parse_route(t) is not None)
+        parsed = _parse_route(text)
+        if parsed:
+            await run_in_retrieval_pool(_learn_route, question, *parsed)
+            return parsed
+        return ("CONVERSACIONAL", "CONSEJO_GENERAL")
+
+    except Exception as e:
+        print(f"Error en el enrutador con Gemini: {e}")
+        return ("CONVERSACIONAL", "CONSEJO_GENERAL")
+
+def _learn_route(question: str, route: str, sub_route: str):
+    # Las decisiones de Gemini alimentan los centroides del router local
+    try:
+        local_router.learn(question, route, sub_route)
+    except Exception as e:
+        print(f"Error al registrar la ruta en el router local: {e}")
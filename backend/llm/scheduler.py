@@ -0,0 +1,307 @@
+# /app/llm/scheduler.py
+"""
+Planificador central de las llamadas salientes a los modelos (ver llm/provider.py,
+que envuelve todos los modelos con ScheduledModel).
+
+Cada familia de modelo (flash, pro) tiene su carril con:
+  - un token bucket con las requests por minuto permitidas (LLM_RPM_<CARRIL>, ráfaga LLM_BURST_<CARRIL>)
+  - concurrencia acotada (LLM_CONCURRENCY_<CARRIL>)
+  - una cola por prioridad: router/extractor/evaluador pasan antes que las generaciones
+    largas, y estas no pueden ocupar los últimos LLM_RESERVED_SLOTS_<CARRIL> lugares
+
+Los errores de cuota (429 / ResourceExhausted) se reintentan con espera exponencial y
+vacían el bucket del carril, para que el resto de las llamadas también baje el ritmo.
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from rag.metrics import LatencyRecorder
+
+LLM_SCHEDULER_ENABLED = os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() == "true"
+LLM_QUOTA_RETRIES = int(os.getenv("LLM_QUOTA_RETRIES", 2))
+LLM_QUOTA_BACKOFF_SECONDS = float(os.getenv("LLM_QUOTA_BACKOFF_SECONDS", 2.0))
+
+LANE_DEFAULTS = {
+    # Solo el carril flash reserva lugares: ahí conviven router/extractor/evaluador con las generaciones
+    "flash": {"rpm": 1000, "concurrency": 32, "reserved": 2},
+    "pro": {"rpm": 360, "concurrency": 8, "reserved": 0},
+}
+
+# Menor número = más prioridad. Las prioridades >= LOW_PRIORITY no usan los lugares reservados.
+ROLE_PRIORITY = {
+    "router": 0,
+    "route_extractor": 0,
+    "extractor": 0,
+    "evaluator": 0,
+    "summary": 1,
+    "fallback": 2,
+    "rag": 2,
+}
+LOW_PRIORITY = 2
+
+
+def lane_for(model_name: str) -> str:
+    return "pro" if "pro" in model_name else "flash"
+
+
+def is_quota_error(error: Exception) -> bool:
+    return type(error).__name__ in ("ResourceExhausted", "TooManyRequests") or "429" in str(error)
+
+
+class _SyncWaiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+    def grant(self) -> bool:
+        self.event.set()
+        return True
+
+
+class _AsyncWaiter:
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+        self.cancelled = False
+
+    def _set(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+    def grant(self) -> bool:
+        try:
+            self.loop.call_soon_threadsafe(self._set)
+            return True
+        except RuntimeError:
+            # El event loop del que esperaba ya se cerró
+            return False
+
+
+class Lane:
+    """Token bucket + semáforo con cola de prioridad, utilizable desde hilos y desde el event loop."""
+
+    def __init__(self, name: str, rpm: float, concurrency: int, burst: float = None, reserved: int = 0):
+        self.name = name
+        self.rpm = rpm
+        self.rate = rpm / 60.0
+        self.capacity = burst if burst is not None else max(1.0, rpm / 10.0)
+        self.concurrency = concurrency
+        self.reserved = max(0, min(reserved, concurrency - 1))
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._heap = []
+        self._seq = itertools.count()
+        self._timer = None
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.counts = {"granted": 0, "quota_errors": 0, "retries": 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _dispatch(self):
+        """Concede lugares a los primeros de la cola mientras haya concurrencia y tokens. Llamar con el lock."""
+        while self._heap:
+            priority, _, waiter = self._heap[0]
+            if waiter.cancelled:
+                heapq.heappop(self._heap)
+                continue
+            limit = self.concurrency - (self.reserved if priority >= LOW_PRIORITY else 0)
+            if self.in_flight >= limit:
+                return
+            self._refill()
+            if self.tokens < 1:
+                self._schedule_retry((1 - self.tokens) / self.rate)
+                return
+            heapq.heappop(self._heap)
+            if not waiter.grant():
+                continue
+            self.tokens -= 1
+            self.in_flight += 1
+            self.counts["granted"] += 1
+            waiter.granted = True
+
+    def _schedule_retry(self, delay: float):
+        if self._timer is not None:
+            return
+
+        def _fire():
+            with self._lock:
+                self._timer = None
+                self._dispatch()
+        self._timer = threading.Timer(delay, _fire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _enqueue(self, priority: int, waiter):
+        with self._lock:
+            heapq.heappush(self._heap, (priority, next(self._seq), waiter))
+            self.max_queue_depth = max(self.max_queue_depth, len(self._heap))
+            self._dispatch()
+
+    def acquire(self, priority: int):
+        waiter = _SyncWaiter()
+        self._enqueue(priority, waiter)
+        waiter.event.wait()
+
+    async def acquire_async(self, priority: int):
+        waiter = _AsyncWaiter(asyncio.get_running_loop())
+        self._enqueue(priority, waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                waiter.cancelled = True
+                granted = waiter.granted
+            if granted:
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def throttle(self):
+        """Un error de cuota vacía el bucket: las llamadas siguientes esperan a que se recargue."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+            self.counts["quota_errors"] += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.counts["retries"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {
+                "rpm": self.rpm,
+                "concurrency": self.concurrency,
+                "reserved_slots": self.reserved,
+                "in_flight": self.in_flight,
+                "queue_depth": sum(1 for _, _, w in self._heap if not w.cancelled),
+                "max_queue_depth": self.max_queue_depth,
+                "tokens_available": round(self.tokens, 2),
+                **self.counts,
+            }
+
+
+def _lane_from_env(name: str) -> Lane:
+    defaults = LANE_DEFAULTS[name]
+    burst = os.getenv(f"LLM_BURST_{name.upper()}")
+    return Lane(
+        name,
+        rpm=float(os.getenv(f"LLM_RPM_{name.upper()}", defaults["rpm"])),
+        concurrency=int(os.getenv(f"LLM_CONCURRENCY_{name.upper()}", defaults["concurrency"])),
+        burst=float(burst) if burst else None,
+        reserved=int(os.getenv(f"LLM_RESERVED_SLOTS_{name.upper()}", defaults["reserved"])),
+    )
+
+
+lanes = {name: _lane_from_env(name) for name in LANE_DEFAULTS}
+wait_latency = LatencyRecorder()
+
+
+class ScheduledModel:
+    """
+    Envuelve un modelo del proveedor: cada llamada espera su turno en el carril,
+    y en streaming el lugar se libera recién cuando termina de llegar la respuesta.
+    """
+
+    def __init__(self, model, role: str):
+        self._model = model
+        self.role = role
+        self.model_name = model.model_name
+        self.priority = ROLE_PRIORITY.get(role, LOW_PRIORITY)
+        self.lane = lanes[lane_for(model.model_name)]
+
+    def _acquire(self):
+        start = time.perf_counter()
+        self.lane.acquire(self.priority)
+        wait_latency.record(self.role, (time.perf_counter() - start) * 1000)
+
+    async def _acquire_async(self):
+        start = time.perf_counter()
+        await self.lane.acquire_async(self.priority)
+        wait_latency.record(self.role, (time.perf_counter() - start) * 1000)
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if not is_quota_error(error):
+            return False
+        self.lane.throttle()
+        if attempt >= LLM_QUOTA_RETRIES:
+            return False
+        self.lane.record_retry()
+        print(f"DEBUG: Cuota agotada en el carril {self.lane.name} ({self.role}); reintento {attempt + 1}.")
+        return True
+
+    def generate_content(self, prompt, stream: bool = False, **kwargs):
+        for attempt in itertools.count():
+            self._acquire()
+            try:
+                response = self._model.generate_content(prompt, stream=stream, **kwargs)
+            except Exception as e:
+                self.lane.release()
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(LLM_QUOTA_BACKOFF_SECONDS * 2 ** attempt)
+                continue
+            if not stream:
+                self.lane.release()
+                return response
+            return self._release_after(response)
+
+    async def generate_content_async(self, prompt, stream: bool = False, **kwargs):
+        for attempt in itertools.count():
+            await self._acquire_async()
+            try:
+                response = await self._model.generate_content_async(prompt, stream=stream, **kwargs)
+            except Exception as e:
+                self.lane.release()
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(LLM_QUOTA_BACKOFF_SECONDS * 2 ** attempt)
+                continue
+            except BaseException:
+                self.lane.release()
+                raise
+            if not stream:
+                self.lane.release()
+                return response
+            return self._release_after_async(response)
+
+    def _release_after(self, response):
+        try:
+            yield from response
+        finally:
+            self.lane.release()
+
+    async def _release_after_async(self, response):
+        try:
+            async for chunk in response:
+                yield chunk
+        finally:
+            self.lane.release()
+
+
+def schedule(model, role: str):
+    return ScheduledModel(model, role) if LLM_SCHEDULER_ENABLED else model
+
+
+def get_scheduler_stats() -> dict:
+    return {
+        "enabled": LLM_SCHEDULER_ENABLED,
+        "lanes": {name: lane.stats() for name, lane in lanes.items()},
+        "wait_ms": wait_latency.stats(),
+    }
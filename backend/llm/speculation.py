@@ -0,0 +1,85 @@
+# /app/llm/speculation.py
+
+import asyncio
+import threading
+from typing import AsyncIterator
+
+_END = object()
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación gruesa (~4 caracteres por token), suficiente para comparar costos."""
+    return len(text) // 4
+
+
+class SpeculationStats:
+    """Contadores del modo especulativo: qué rama ganó y cuántos tokens se gastaron en la perdedora."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.wins = {}
+        self.cancelled_branches = 0
+        self.wasted_prompt_tokens_est = 0
+        self.wasted_output_tokens_est = 0
+
+    def record_run(self, winner: str):
+        with self._lock:
+            self.runs += 1
+            self.wins[winner] = self.wins.get(winner, 0) + 1
+
+    def record_cancelled(self, branch: "SpeculativeBranch"):
+        with self._lock:
+            self.cancelled_branches += 1
+            self.wasted_prompt_tokens_est += branch.prompt_tokens
+            self.wasted_output_tokens_est += estimate_tokens("".join(branch.received))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "wins": dict(self.wins),
+                "cancelled_branches": self.cancelled_branches,
+                "wasted_prompt_tokens_est": self.wasted_prompt_tokens_est,
+                "wasted_output_tokens_est": self.wasted_output_tokens_est,
+            }
+
+
+class SpeculativeBranch:
+    """
+    Consume un generador de fragmentos en una tarea de fondo y los guarda en una cola,
+    para empezar a generar antes de saber si la respuesta se va a usar. Si gana, se
+    leen los fragmentos ya recibidos y los siguientes con pieces(); si pierde, cancel().
+    """
+
+    def __init__(self, name: str, pieces: AsyncIterator[str], prompt_tokens: int = 0):
+        self.name = name
+        self.prompt_tokens = prompt_tokens
+        self.received = []
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(pieces))
+
+    async def _run(self, pieces: AsyncIterator[str]):
+        try:
+            async for piece in pieces:
+                self.received.append(piece)
+                self._queue.put_nowait(piece)
+        except Exception as e:
+            self._queue.put_nowait(e)
+        finally:
+            self._queue.put_nowait(_END)
+
+    async def pieces(self) -> AsyncIterator[str]:
+        while True:
+            item = await self._queue.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def cancel(self, stats: SpeculationStats = None):
+        # Si la tarea ya terminó, el costo completo se pagó igual y se cuenta como desperdicio
+        self._task.cancel()
+        if stats:
+            stats.record_cancelled(self)
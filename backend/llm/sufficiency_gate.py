@@ -0,0 +1,212 @@
+# /app/llm/sufficiency_gate.py
+"""
+Compuerta local de suficiencia de los chunks, basada en los scores del retriever.
+
+Features (de los chunks recuperados que tienen metadata["score"], ordenados por score;
+en modo híbrido el orden de los chunks es el de la fusión y los que solo encontró BM25
+no tienen score, así que no se usa la posición):
+  - top      : similitud del mejor chunk
+  - margin   : diferencia entre el primero y el segundo
+  - agreement: fracción de chunks que vienen del mismo documento que el mejor
+
+Una regresión logística sobre esas features estima P(suficiente). Por encima de
+`high` se decide "sí" y por debajo de `low` "no" sin llamar a Gemini; entre ambos
+(banda de incertidumbre) decide el evaluador LLM. Sin calibración, siempre decide el LLM.
+
+Calibración offline con los feedbacks guardados (like = suficiente, dislike = no):
+    python -m llm.sufficiency_gate calibrate [precisión_objetivo]
+"""
+
+import os
+import sys
+import json
+import threading
+import numpy as np
+from typing import Optional
+
+SUFFICIENCY_GATE_PATH = os.getenv("SUFFICIENCY_GATE_PATH", "/app/feedback/sufficiency_gate.json")
+FEATURES = ("top", "margin", "agreement")
+# Motivos de dislike que no dicen nada sobre la calidad del contexto recuperado
+_UNRELATED_DISLIKES = {"Ofensiva o inapropiada", "Idioma incorrecto"}
+MIN_CALIBRATION_SAMPLES = 30
+
+
+def chunk_features(chunks: list) -> Optional[list[float]]:
+    """Features de score de los chunks (objetos Document o chunks serializados)."""
+    metadatas = [getattr(c, "metadata", None) if not isinstance(c, dict) else c.get("metadata") for c in chunks]
+    metadatas = [m or {} for m in metadatas]
+    scored = sorted((m for m in metadatas if m.get("score") is not None), key=lambda m: -float(m["score"]))
+    if not scored:
+        return None
+    top = float(scored[0]["score"])
+    margin = top - float(scored[1]["score"]) if len(scored) > 1 else top
+    top_source = scored[0].get("source")
+    agreement = sum(1 for m in metadatas if m.get("source") == top_source) / len(metadatas)
+    return [top, margin, agreement]
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def fit_logistic(x: np.ndarray, y: np.ndarray, l2: float = 1e-2, iterations: int = 2000, lr: float = 0.5):
+    """Regresión logística por descenso de gradiente sobre features estandarizadas."""
+    mean, std = x.mean(axis=0), x.std(axis=0)
+    std[std == 0] = 1.0
+    z = (x - mean) / std
+    weights, bias = np.zeros(z.shape[1]), 0.0
+    for _ in range(iterations):
+        error = _sigmoid(z @ weights + bias) - y
+        weights -= lr * (z.T @ error / len(y) + l2 * weights)
+        bias -= lr * error.mean()
+    return {"mean": mean.tolist(), "std": std.tolist(), "weights": weights.tolist(), "bias": float(bias)}
+
+
+def choose_band(probabilities: np.ndarray, y: np.ndarray, target_precision: float = 0.9) -> tuple[float, float]:
+    """
+    Umbrales de la banda de incertidumbre:
+      high: el menor umbral tal que, por encima, la fracción de "suficientes" sea >= target
+      low : el mayor umbral tal que, por debajo, la fracción de "no suficientes" sea >= target
+    Si ningún umbral cumple, ese lado queda cerrado (siempre decide el LLM).
+    """
+    high, low = 1.01, -0.01
+    for threshold in sorted(set(probabilities.tolist())):
+        above = probabilities >= threshold
+        if above.any() and y[above].mean() >= target_precision:
+            high = threshold
+            break
+    for threshold in sorted(set(probabilities.tolist()), reverse=True):
+        below = probabilities <= threshold
+        if below.any() and (1 - y[below]).mean() >= target_precision:
+            low = threshold
+            break
+    if low >= high:
+        # Las dos zonas se solapan: se deja toda la decisión al LLM
+        return -0.01, 1.01
+    return float(low), float(high)
+
+
+class SufficiencyGate:
+    """Carga la calibración (y la relee si cambia el archivo) y decide cuando está fuera de la banda."""
+
+    def __init__(self, path: str = SUFFICIENCY_GATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.model = None
+        self.counts = {"local_sufficient": 0, "local_insufficient": 0, "llm": 0}
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self.model = None
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            try:
+                with open(self.path) as f:
+                    self.model = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"DEBUG: No se pudo leer la calibración de suficiencia {self.path}: {e}")
+                self.model = None
+            self._mtime = mtime
+
+    def probability(self, chunks: list):
+        self.refresh()
+        features = chunk_features(chunks) if self.model else None
+        if features is None:
+            return None
+        z = (np.asarray(features) - np.asarray(self.model["mean"])) / np.asarray(self.model["std"])
+        return float(_sigmoid(z @ np.asarray(self.model["weights"]) + self.model["bias"]))
+
+    def decide(self, chunks: list):
+        """
+        Returns:
+            True/False si la probabilidad cae fuera de la banda, None si debe decidir el LLM.
+        """
+        probability = self.probability(chunks) if chunks else None
+        model = self.model
+        if probability is not None and model is not None and probability >= model["high"]:
+            self.counts["local_sufficient"] += 1
+            print(f"DEBUG: Compuerta local: chunks suficientes (p={probability:.3f}).")
+            return True
+        if probability is not None and model is not None and probability <= model["low"]:
+            self.counts["local_insufficient"] += 1
+            print(f"DEBUG: Compuerta local: chunks insuficientes (p={probability:.3f}).")
+            return False
+        self.counts["llm"] += 1
+        return None
+
+    def stats(self) -> dict:
+        total = sum(self.counts.values())
+        return {
+            **self.counts,
+            "local_rate": round((total - self.counts["llm"]) / total, 4) if total else 0.0,
+            "calibrated": self.model is not None,
+            "band": [self.model["low"], self.model["high"]] if self.model else None,
+        }
+
+
+def load_feedback_samples(db) -> tuple[np.ndarray, np.ndarray]:
+    """Features y etiquetas de los feedbacks cuyos chunks guardados traen scores."""
+    from feedback.database import FeedbackLog
+
+    x, y = [], []
+    for row in db.query(FeedbackLog).all():
+        if row.feedback_type == "dislike" and row.feedback_details in _UNRELATED_DISLIKES:
+            continue
+        if row.feedback_type not in ("like", "dislike"):
+            continue
+        try:
+            chunks = json.loads(row.retrieved_chunks or "[]")
+        except ValueError:
+            continue
+        features = chunk_features(chunks) if chunks else None
+        if features is None:
+            continue
+        x.append(features)
+        y.append(1.0 if row.feedback_type == "like" else 0.0)
+    return np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+
+
+def calibrate(db, path: str = SUFFICIENCY_GATE_PATH, target_precision: float = 0.9) -> dict:
+    x, y = load_feedback_samples(db)
+    if len(y) < MIN_CALIBRATION_SAMPLES or y.min() == y.max():
+        return {"error": f"Se necesitan al menos {MIN_CALIBRATION_SAMPLES} feedbacks con scores y de ambas clases (hay {len(y)})."}
+
+    model = fit_logistic(x, y)
+    z = (x - np.asarray(model["mean"])) / np.asarray(model["std"])
+    probabilities = _sigmoid(z @ np.asarray(model["weights"]) + model["bias"])
+    model["low"], model["high"] = choose_band(probabilities, y, target_precision)
+    model["features"] = list(FEATURES)
+    model["samples"] = int(len(y))
+    model["target_precision"] = target_precision
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(model, f, indent=2)
+    os.replace(tmp_path, path)
+
+    local = (probabilities >= model["high"]) | (probabilities <= model["low"])
+    return {
+        "samples": model["samples"],
+        "band": [round(model["low"], 4), round(model["high"], 4)],
+        "local_coverage": round(float(local.mean()), 4),
+        "local_accuracy": round(float(((probabilities >= model["high"]) == (y == 1))[local].mean()), 4) if local.any() else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "calibrate":
+        print(__doc__)
+        sys.exit(1)
+    from feedback.database import SessionLocal
+    db = SessionLocal()
+    try:
+        result = calibrate(db, target_precision=float(sys.argv[2]) if len(sys.argv) > 2 else 0.9)
+    finally:
+        db.close()
+    for key, value in result.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,194 @@
+# /app/rag/context_packing.py
+
+import os
+import threading
+from langchain_core.documents import Document
+from ingestion.config import CHUNK_OVERLAP
+
+# Empaquetado del contexto para los prompts: los chunks vecinos de la misma página
+# comparten CHUNK_OVERLAP caracteres, así que se fusionan en un único bloque sin el
+# texto repetido, ordenado por posición, y el total se recorta a un presupuesto de tokens.
+CONTEXT_PACKING_ENABLED = os.getenv("CONTEXT_PACKING_ENABLED", "true").lower() == "true"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+# Solape mínimo/máximo a buscar cuando los chunks no traen start_index (índices viejos)
+MIN_TEXT_OVERLAP = 20
+MAX_TEXT_OVERLAP = CHUNK_OVERLAP * 2
+_CHARS_PER_TOKEN = 4
+# Un bloque recortado a menos que esto no aporta contexto y se descarta
+MIN_BLOCK_TOKENS = 50
+
+
+def _tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN
+
+
+def _text_overlap(left: str, right: str) -> int:
+    """Largo del sufijo de `left` que es prefijo de `right` (0 si es menor a MIN_TEXT_OVERLAP)."""
+    for size in range(min(len(left), len(right), MAX_TEXT_OVERLAP), MIN_TEXT_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class _Block:
+    def __init__(self, chunk: Document, rank: int):
+        self.text = chunk.page_content
+        self.metadata = dict(chunk.metadata)
+        self.start = chunk.metadata.get("start_index")
+        self.rank = rank
+        self.merged = 1
+
+    @property
+    def end(self):
+        return self.start + len(self.text)
+
+    def absorb(self, chunk: Document, rank: int) -> int:
+        """
+        Fusiona `chunk` al bloque si se solapa o es contiguo.
+
+        Returns:
+            Caracteres repetidos eliminados, o -1 si no se pudo fusionar.
+        """
+        text, start = chunk.page_content, chunk.metadata.get("start_index")
+        if self.start is not None and start is not None:
+            if start > self.end:
+                return -1
+            overlap = min(self.end - start, len(text))
+        else:
+            overlap = len(text) if text in self.text else _text_overlap(self.text, text)
+            if not overlap:
+                # Sin posiciones no se sabe el orden: el chunk puede ir antes del bloque
+                overlap = _text_overlap(text, self.text)
+                if not overlap:
+                    return -1
+                self.text = text[:-overlap] + self.text
+                return self._absorbed(chunk, rank, overlap)
+        self.text += text[overlap:]
+        return self._absorbed(chunk, rank, overlap)
+
+    def _absorbed(self, chunk: Document, rank: int, overlap: int) -> int:
+        self.merged += 1
+        self.rank = min(self.rank, rank)
+        score = chunk.metadata.get("score")
+        if score is not None and score > (self.metadata.get("score") or float("-inf")):
+            self.metadata["score"] = score
+        return overlap
+
+    def to_document(self) -> Document:
+        metadata = {**self.metadata, "merged_chunks": self.merged}
+        if self.start is not None:
+            metadata["start_index"] = self.start
+        return Document(page_content=self.text, metadata=metadata)
+
+
+def _merge_group(group: list) -> tuple[list, int]:
+    """Fusiona los chunks (rank, Document) de una misma fuente y página."""
+    if all(chunk.metadata.get("start_index") is not None for _, chunk in group):
+        group = sorted(group, key=lambda item: item[1].metadata["start_index"])
+    blocks, removed = [], 0
+    for rank, chunk in group:
+        for block in blocks:
+            overlap = block.absorb(chunk, rank)
+            if overlap >= 0:
+                removed += overlap
+                break
+        else:
+            blocks.append(_Block(chunk, rank))
+    return blocks, removed
+
+
+def _trim(text: str, max_tokens: int) -> str:
+    cut = text[:max_tokens * _CHARS_PER_TOKEN]
+    # Se corta en el último espacio para no dejar una palabra a medias
+    space = cut.rfind(" ")
+    return (cut[:space] if space > len(cut) // 2 else cut).rstrip() + " […]"
+
+
+class ContextPacker:
+    """Empaqueta los chunks recuperados y acumula cuánto texto ahorra."""
+
+    def __init__(self, budget_tokens: int = CONTEXT_TOKEN_BUDGET):
+        self.budget_tokens = budget_tokens
+        self._lock = threading.Lock()
+        self.counts = {"packs": 0, "chunks_in": 0, "blocks_out": 0, "truncated_blocks": 0, "dropped_blocks": 0}
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.overlap_chars_removed = 0
+
+    def pack(self, chunks: list) -> list:
+        """
+        Args:
+            chunks (list): Documents en orden de relevancia, con source/page (y start_index si existe)
+
+        Returns:
+            list: Documents fusionados. Las páginas se ordenan por su chunk más relevante y,
+                  dentro de cada página, el texto por posición. Conservan source, page y
+                  score (el mejor de los fusionados) para las citas.
+        """
+        if not CONTEXT_PACKING_ENABLED or not chunks:
+            return chunks
+
+        groups = {}
+        for rank, chunk in enumerate(chunks):
+            key = (chunk.metadata.get("source"), chunk.metadata.get("page"))
+            groups.setdefault(key, []).append((rank, chunk))
+
+        blocks, removed = [], 0
+        for group in groups.values():
+            group_blocks, group_removed = _merge_group(group)
+            blocks.extend(group_blocks)
+            removed += group_removed
+        # El presupuesto se reparte por relevancia: los bloques menos relevantes se recortan o descartan
+        selected, used, truncated, dropped = [], 0, 0, 0
+        for block in sorted(blocks, key=lambda b: b.rank):
+            remaining = self.budget_tokens - used
+            if remaining < min(MIN_BLOCK_TOKENS, _tokens(block.text)) or remaining <= 0:
+                dropped += 1
+                continue
+            document = block.to_document()
+            if _tokens(block.text) > remaining:
+                document.page_content = _trim(block.text, remaining)
+                document.metadata["truncated"] = True
+                truncated += 1
+            used += _tokens(document.page_content)
+            selected.append((block, document))
+
+        # Orden final: primero la página más relevante y, dentro de ella, por posición
+        group_rank = {key: min(rank for rank, _ in group) for key, group in groups.items()}
+        selected.sort(key=lambda item: (group_rank[(item[0].metadata.get("source"), item[0].metadata.get("page"))],
+                                        item[0].start if item[0].start is not None else item[0].rank))
+        packed = [document for _, document in selected]
+
+        with self._lock:
+            self.counts["packs"] += 1
+            self.counts["chunks_in"] += len(chunks)
+            self.counts["blocks_out"] += len(packed)
+            self.counts["truncated_blocks"] += truncated
+            self.counts["dropped_blocks"] += dropped
+            self.tokens_in += sum(_tokens(c.page_content) for c in chunks)
+            self.tokens_out += used
+            self.overlap_chars_removed += removed
+        return packed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": CONTEXT_PACKING_ENABLED,
+                "budget_tokens": self.budget_tokens,
+                **self.counts,
+                "overlap_chars_removed": self.overlap_chars_removed,
+                "context_tokens_in": self.tokens_in,
+                "context_tokens_out": self.tokens_out,
+                "reduction": round(1 - self.tokens_out / self.tokens_in, 4) if self.tokens_in else 0.0,
+            }
+
+
+context_packer = ContextPacker()
+
+
+def pack_context(chunks: list) -> list:
+    return context_packer.pack(chunks)
+
+
+def get_packing_stats() -> dict:
+    return context_packer.stats()
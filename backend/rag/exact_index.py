@@ -0,0 +1,271 @@
+# /app/rag/exact_index.py
+"""
+Índice exacto sobre una matriz NumPy memory-mapped.
+
+El paso de exportación vuelca la colección de ChromaDB a:
+  - embeddings.npy   : matriz float16 (N x 384) con los vectores normalizados
+  - sidecar.json     : ids y metadatos en el mismo orden que las filas
+  - texts.bin        : textos de los chunks en UTF-8, uno detrás de otro
+  - text_offsets.npy : int64 (N + 1), el texto de la fila i es texts.bin[offsets[i]:offsets[i + 1]]
+
+La búsqueda es un producto matriz-vector por bloques con argpartition. Matriz y textos
+se abren con mmap: arranca al instante, los workers de uvicorn comparten las páginas
+del SO (solo se decodifican los textos de los top_k) y los resultados son deterministas:
+sirve como línea base de recall exacto frente al HNSW.
+
+Uso:
+    python -m rag.exact_index export [nombre_coleccion]
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from ingestion.config import CHROMA_PERSIST_DIR, GENERATION_FILE_PATH
+from ingestion.generation import read_generation
+from ingestion.metadata_index import FilterIndex
+
+logger = logging.getLogger(__name__)
+
+EXACT_INDEX_DIR = os.getenv("EXACT_INDEX_DIR", os.path.join(CHROMA_PERSIST_DIR, "exact_index"))
+MATRIX_FILE = "embeddings.npy"
+SIDECAR_FILE = "sidecar.json"
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "text_offsets.npy"
+BLOCK_SIZE = int(os.getenv("EXACT_INDEX_BLOCK_SIZE", 65536))
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def export_collection(persist_directory: str, collection_name: str, index_dir: str,
+                      generation: int = 0, page_size: int = 5000) -> int:
+    """
+    Exporta la colección de ChromaDB al formato del índice exacto.
+    Escribe en un directorio temporal y lo reemplaza al final para que los
+    lectores nunca vean un índice a medio escribir.
+
+    Returns:
+        int: Cantidad de vectores exportados
+    """
+    import chromadb
+
+    client = chromadb.PersistentClient(path=persist_directory)
+    collection = client.get_collection(collection_name)
+    total = collection.count()
+    logger.info(f"📤 Exportando {total:,} vectores de '{collection_name}' a {index_dir}")
+
+    tmp_dir = f"{index_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    matrix = None
+    ids, metadatas, offsets = [], [], [0]
+    texts = open(os.path.join(tmp_dir, TEXTS_FILE), "wb")
+    for offset in range(0, total, page_size):
+        page = collection.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=page_size,
+            offset=offset
+        )
+        vectors = np.asarray(page["embeddings"], dtype=np.float32)
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(
+                os.path.join(tmp_dir, MATRIX_FILE), mode="w+",
+                dtype=np.float16, shape=(total, vectors.shape[1])
+            )
+        matrix[offset:offset + len(vectors)] = _normalize_rows(vectors).astype(np.float16)
+        ids.extend(page["ids"])
+        metadatas.extend(m or {} for m in page["metadatas"])
+        for text in page["documents"]:
+            offsets.append(offsets[-1] + texts.write((text or "").encode("utf-8")))
+
+    texts.close()
+    if matrix is not None:
+        matrix.flush()
+        del matrix
+
+    np.save(os.path.join(tmp_dir, OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(tmp_dir, SIDECAR_FILE), "w") as f:
+        json.dump({
+            "collection": collection_name,
+            "generation": generation,
+            "ids": ids,
+            "metadatas": metadatas,
+        }, f, ensure_ascii=False)
+
+    old_dir = f"{index_dir}.old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(index_dir):
+        os.replace(index_dir, old_dir)
+    os.replace(tmp_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    logger.info(f"✅ Índice exacto exportado ({len(ids):,} vectores)")
+    return len(ids)
+
+
+class _Snapshot:
+    """
+    Una carga completa del índice. Nunca se modifica: cada recarga arma una nueva y la
+    publica con una sola asignación, así una búsqueda concurrente no mezcla generaciones.
+    """
+
+    def __init__(self, signature, matrix, ids: list, metadatas: list, texts, offsets, generation: int):
+        self.signature = signature
+        self.matrix = matrix
+        self.ids = ids
+        self.metadatas = metadatas
+        self.texts = texts
+        self.offsets = offsets
+        self.generation = generation
+        self.row_by_id = {doc_id: row for row, doc_id in enumerate(ids)}
+        self.filter_index = FilterIndex(metadatas)
+
+    def text(self, row: int) -> str:
+        return bytes(self.texts[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+    def document(self, row: int) -> Document:
+        return Document(page_content=self.text(row), metadata=dict(self.metadatas[row]))
+
+
+class ExactIndex:
+    """
+    Backend de búsqueda exacta sobre la matriz exportada. Expone la misma interfaz
+    que WarmCollection (query/fetch/status) para que el retriever pueda elegirlo
+    por configuración.
+    """
+
+    def __init__(self, index_dir: str, block_size: int = BLOCK_SIZE):
+        self.index_dir = index_dir
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._stale = True
+        self._snapshot = None
+
+    def _file_signature(self):
+        try:
+            st = os.stat(os.path.join(self.index_dir, SIDECAR_FILE))
+            return (st.st_ino, st.st_mtime_ns)
+        except OSError:
+            return None
+
+    def _load(self, signature) -> _Snapshot:
+        with open(os.path.join(self.index_dir, SIDECAR_FILE)) as f:
+            sidecar = json.load(f)
+        ids = sidecar["ids"]
+        if ids:
+            matrix = np.load(os.path.join(self.index_dir, MATRIX_FILE), mmap_mode="r")
+            texts = np.memmap(os.path.join(self.index_dir, TEXTS_FILE), dtype=np.uint8, mode="r")
+            offsets = np.load(os.path.join(self.index_dir, OFFSETS_FILE), mmap_mode="r")
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float16)
+            texts, offsets = np.zeros(0, dtype=np.uint8), np.zeros(1, dtype=np.int64)
+
+        snapshot = _Snapshot(signature, matrix, ids, sidecar["metadatas"], texts, offsets,
+                             sidecar.get("generation", 0))
+        logger.info(f" exact_index.py: Índice exacto cargado con {len(ids)} vectores (generación {snapshot.generation}).")
+        return snapshot
+
+    def ensure_loaded(self) -> _Snapshot:
+        """Devuelve la carga vigente del índice, recargándolo si cambió en disco."""
+        signature = self._file_signature()
+        if signature is None:
+            raise FileNotFoundError(f"No existe el índice exacto en {self.index_dir}. Ejecuta 'python -m rag.exact_index export'.")
+        snapshot = self._snapshot
+        if self._stale or snapshot is None or signature != snapshot.signature:
+            with self._lock:
+                snapshot = self._snapshot
+                if self._stale or snapshot is None or signature != snapshot.signature:
+                    snapshot = self._load(signature)
+                    self._snapshot = snapshot
+                    self._stale = False
+        return snapshot
+
+    def search(self, embeddings, top_k: int, rows=None, snapshot: _Snapshot = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k exacto por producto interno (coseno, los vectores están normalizados).
+
+        Args:
+            embeddings: Matriz (Q x D) de queries
+            top_k: Resultados por query
+            rows: Subconjunto opcional de filas candidatas (ordenado)
+            snapshot: Carga del índice sobre la que se calcularon `rows` (por defecto, la vigente)
+
+        Returns:
+            (filas, scores): matrices (Q x k) ordenadas por score descendente
+        """
+        snapshot = snapshot or self.ensure_loaded()
+        queries = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        n_rows = len(snapshot.ids) if rows is None else len(rows)
+        k = min(top_k, n_rows)
+        if k == 0:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        cand_rows, cand_scores = [], []
+        for start in range(0, n_rows, self.block_size):
+            if rows is None:
+                block_rows = np.arange(start, min(start + self.block_size, n_rows))
+                block = snapshot.matrix[start:start + self.block_size]
+            else:
+                block_rows = np.asarray(rows[start:start + self.block_size])
+                block = snapshot.matrix[block_rows]
+            scores = queries @ np.asarray(block, dtype=np.float32).T  # (Q x B)
+
+            kb = min(k, scores.shape[1])
+            part = np.argpartition(-scores, kb - 1, axis=1)[:, :kb]
+            cand_rows.append(block_rows[part])
+            cand_scores.append(np.take_along_axis(scores, part, axis=1))
+
+        all_rows = np.concatenate(cand_rows, axis=1)
+        all_scores = np.concatenate(cand_scores, axis=1)
+
+        # Orden determinista: score descendente y, ante empates, fila ascendente.
+        out_rows = np.empty((len(queries), k), dtype=np.int64)
+        out_scores = np.empty((len(queries), k), dtype=np.float32)
+        for q in range(len(queries)):
+            order = np.lexsort((all_rows[q], -all_scores[q]))[:k]
+            out_rows[q] = all_rows[q][order]
+            out_scores[q] = all_scores[q][order]
+        return out_rows, out_scores
+
+    def query(self, embeddings: list[list[float]], top_k: int, filters: dict = None) -> tuple[list[list[str]], list[list[Document]], list[list[float]]]:
+        snapshot = self.ensure_loaded()
+        rows, scores = self.search(embeddings, top_k, rows=snapshot.filter_index.rows(filters), snapshot=snapshot)
+        ids = [[snapshot.ids[r] for r in query_rows] for query_rows in rows]
+        docs = [[snapshot.document(r) for r in query_rows] for query_rows in rows]
+        return ids, docs, scores.tolist()
+
+    def fetch(self, ids: list[str]) -> dict[str, Document]:
+        snapshot = self.ensure_loaded()
+        return {doc_id: snapshot.document(snapshot.row_by_id[doc_id]) for doc_id in ids if doc_id in snapshot.row_by_id}
+
+    def mark_unhealthy(self):
+        self._stale = True
+
+    def status(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "index_dir": self.index_dir,
+            "loaded": snapshot is not None,
+            "vectors": len(snapshot.ids) if snapshot else 0,
+            "generation": snapshot.generation if snapshot else 0,
+        }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(sys.argv) < 2 or sys.argv[1] != "export":
+        print(__doc__)
+        sys.exit(1)
+    collection_name = sys.argv[2] if len(sys.argv) > 2 else "financial_documents"
+    export_collection(CHROMA_PERSIST_DIR, collection_name, EXACT_INDEX_DIR,
+                      generation=read_generation(GENERATION_FILE_PATH))
@@ -0,0 +1,41 @@
+# /app/rag/executor.py
+
+import os
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+# Pool acotado para el trabajo bloqueante de CPU (embeddings, búsqueda vectorial, BM25)
+# que se llama desde endpoints async. Así una búsqueda lenta no congela el event loop
+# y la cantidad de búsquedas simultáneas queda limitada.
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", 4))
+
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+_lock = threading.Lock()
+_counts = {"submitted": 0, "in_flight": 0, "max_in_flight": 0}
+
+
+async def run_in_retrieval_pool(fn, *args, **kwargs):
+    """Ejecuta `fn` en el pool de retrieval y espera su resultado sin bloquear el loop."""
+    with _lock:
+        _counts["submitted"] += 1
+        _counts["in_flight"] += 1
+        _counts["max_in_flight"] = max(_counts["max_in_flight"], _counts["in_flight"])
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(retrieval_executor, partial(fn, *args, **kwargs))
+    finally:
+        with _lock:
+            _counts["in_flight"] -= 1
+
+
+def get_executor_stats() -> dict:
+    with _lock:
+        # Las tareas en vuelo que superan el número de workers están esperando en la cola
+        return {
+            "workers": RETRIEVAL_WORKERS,
+            **_counts,
+            "queued": max(0, _counts["in_flight"] - RETRIEVAL_WORKERS),
+        }
@@ -0,0 +1,72 @@
+# /app/rag/filters.py
+
+import os
+import re
+import threading
+from ingestion.metadata_index import read_metadata_summary
+
+_YEAR_RE = re.compile(r"(?<!\d)(19[89]\d|20\d{2})(?!\d)")
+_UPPER_TOKEN_RE = re.compile(r"\b[A-Z]{1,5}\b")
+
+
+class MetadataSummary:
+    """
+    Resumen de tickers y años presentes en el corpus (lo escribe la ingestión).
+    Se relee solo cuando cambia el archivo.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.tickers = {}
+        self.years = set()
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            summary = read_metadata_summary(self.path)
+            self.tickers = summary.get("tickers", {})
+            self.years = {int(year) for year in summary.get("years", {})}
+            self._mtime = mtime
+
+
+def _single_or_list(values: list):
+    return values[0] if len(values) == 1 else values
+
+
+def infer_filters(question: str, summary: MetadataSummary, ticker_hints=None) -> dict:
+    """
+    Deduce filtros de ticker y año a partir de la pregunta. Solo usa valores que
+    existen en el corpus, para no restringir la búsqueda a un conjunto vacío.
+    `ticker_hints` son símbolos ya resueltos por otro medio (p. ej. "Apple" -> AAPL
+    con el extractor local), que se suman a los escritos en mayúsculas.
+    """
+    summary.refresh()
+    filters = {}
+
+    candidates = list(ticker_hints or []) + _UPPER_TOKEN_RE.findall(question)
+    tickers = list(dict.fromkeys(t for t in candidates if t in summary.tickers))
+    if tickers:
+        filters["ticker"] = _single_or_list(tickers)
+
+    years = list(dict.fromkeys(int(y) for y in _YEAR_RE.findall(question) if int(y) in summary.years))
+    if years:
+        filters["year"] = _single_or_list(years)
+
+    return filters
+
+
+def filters_key(filters: dict) -> tuple:
+    """Representación hashable de los filtros, para usarla en claves de caché."""
+    return tuple(sorted(
+        (field, tuple(sorted(value)) if isinstance(value, (list, tuple, set)) else value)
+        for field, value in (filters or {}).items()
+    ))
@@ -0,0 +1,57 @@
+# /app/rag/metrics.py
+
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+class LatencyRecorder:
+    """
+    Acumula latencias por etapa (en milisegundos, o en la unidad `unit`) de forma segura
+    para hilos. Guarda las últimas `window` muestras de cada etapa para calcular p50/p95.
+    """
+
+    def __init__(self, window: int = 1000, unit: str = "ms"):
+        self.window = window
+        self.unit = unit
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counts = {}
+        self._totals = {}
+
+    def record(self, stage: str, elapsed_ms: float):
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=self.window)
+                self._counts[stage] = 0
+                self._totals[stage] = 0.0
+            self._samples[stage].append(elapsed_ms)
+            self._counts[stage] += 1
+            self._totals[stage] += elapsed_ms
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * (1e6 if self.unit == "us" else 1000))
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = {stage: (sorted(samples), self._counts[stage], self._totals[stage])
+                        for stage, samples in self._samples.items()}
+
+        def _pct(values, p):
+            return round(values[min(len(values) - 1, int(p * len(values)))], 3) if values else 0.0
+
+        return {
+            stage: {
+                "count": count,
+                f"avg_{self.unit}": round(total / count, 3) if count else 0.0,
+                f"p50_{self.unit}": _pct(values, 0.50),
+                f"p95_{self.unit}": _pct(values, 0.95),
+            }
+            for stage, (values, count, total) in snapshot.items()
+        }
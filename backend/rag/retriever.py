@@ -1,27 +1,254 @@
+import os
+import hashlib
 import logging
-from langchain_community.vectorstores import Chroma
+from array import array
+from typing import Optional
 from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain_core.documents import Document
-from ingestion.config import CHROMA_PERSIST_DIR # Usamos la ruta centralizada
+from ingestion.config import ( # Usamos la ruta centralizada
+    CHROMA_PERSIST_DIR, GENERATION_FILE_PATH, SPARSE_INDEX_DIR, QUANTIZED_STORE_DIR, METADATA_SUMMARY_PATH,
+    EMBEDDING_ENGINE, ONNX_MODEL_DIR
+)
+from ingestion.generation import read_generation
+from ingestion.sparse_index import SparseIndex
+from ingestion.metadata_index import matches
+from ingestion.onnx_embeddings import OnnxEmbeddings
+from rag.vector_store import WarmCollection
+from rag.exact_index import ExactIndex, EXACT_INDEX_DIR
+from rag.quantized_index import QuantizedIndex
+from rag.cache import LRUCache
+from rag.metrics import LatencyRecorder
+from rag.filters import MetadataSummary, infer_filters, filters_key
+from rag.executor import run_in_retrieval_pool
 
 logger = logging.getLogger(__name__)
 
 # --- CONFIGURACIÓN ---
 COLLECTION_NAME = "financial_documents"
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 2048))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 1024))
+# "chroma" (HNSW), "exact" (matriz NumPy memory-mapped, ver rag/exact_index.py)
+# o "quantized" (códigos int8/PQ con re-scoring exacto, ver rag/quantized_index.py)
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "chroma").lower()
+# "dense" (por defecto) solo usa embeddings; "hybrid" fusiona la búsqueda densa con BM25
+# (índice léxico de la ingestión). El índice BM25 solo cubre lo ingerido después de que
+# existiera, así que antes de activar "hybrid" hay que reconstruirlo con
+# `python process_s3_documents.py --rebuild-sparse-index`.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense").lower()
+# Candidatos densos que se fusionan con BM25 (solo en modo "hybrid")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))
+RRF_K = 60
+# Si está activo, los filtros de ticker/año se deducen de la pregunta cuando no se pasan explícitamente
+# (en /ask también con los nombres de empresa que reconoce el extractor local: "Apple" -> AAPL).
+# Desactivado por defecto: el ticker y el año de cada chunk salen de la clave del PDF en S3
+# (ingestion/metadata_index.py), y los documentos cuya clave no los trae quedan fuera del filtro
+# aunque sean relevantes. Solo si el filtro no devuelve nada se reintenta sin filtros.
+INFER_FILTERS = os.getenv("RETRIEVAL_INFER_FILTERS", "false").lower() == "true"
 
 # --- INICIALIZACIÓN ---
-try:
-    print(" retriever.py: Cargando modelo de embeddings...")
-    embedding_function = SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-    print(" retriever.py: Modelo de embeddings cargado exitosamente.")
-except Exception as e:
-    logger.critical(f" retriever.py: No se pudo cargar el modelo de embeddings: {e}")
-    embedding_function = None
+embedding_function = None
+if EMBEDDING_ENGINE in ("onnx", "onnx-int8"):
+    try:
+        print(f" retriever.py: Cargando modelo de embeddings con ONNX Runtime ({EMBEDDING_ENGINE})...")
+        embedding_function = OnnxEmbeddings(ONNX_MODEL_DIR, quantized=EMBEDDING_ENGINE == "onnx-int8")
+        print(" retriever.py: Modelo ONNX cargado exitosamente.")
+    except Exception as e:
+        logger.error(f" retriever.py: No se pudo cargar el modelo ONNX, se usa PyTorch: {e}")
+
+if embedding_function is None:
+    try:
+        print(" retriever.py: Cargando modelo de embeddings...")
+        embedding_function = SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        print(" retriever.py: Modelo de embeddings cargado exitosamente.")
+    except Exception as e:
+        logger.critical(f" retriever.py: No se pudo cargar el modelo de embeddings: {e}")
+        embedding_function = None
+
+# Un solo backend abierto por proceso, compartido por todas las peticiones.
+if RETRIEVER_BACKEND == "exact":
+    search_backend = ExactIndex(EXACT_INDEX_DIR)
+elif RETRIEVER_BACKEND == "quantized":
+    search_backend = QuantizedIndex(
+        QUANTIZED_STORE_DIR,
+        documents=WarmCollection(COLLECTION_NAME, embedding_function, CHROMA_PERSIST_DIR),
+        rerank_factor=int(os.getenv("QUANTIZED_RERANK_FACTOR", 10))
+    )
+else:
+    search_backend = WarmCollection(COLLECTION_NAME, embedding_function, CHROMA_PERSIST_DIR)
+if embedding_function:
+    try:
+        print(f" retriever.py: Abriendo el backend de búsqueda '{RETRIEVER_BACKEND}'...")
+        search_backend.query([embedding_function.embed_query("warmup")], 1)
+    except Exception as e:
+        logger.error(f" retriever.py: No se pudo abrir el backend al iniciar (se reintentará en la primera búsqueda): {e}")
+
+sparse_index = SparseIndex(SPARSE_INDEX_DIR)
+metadata_summary = MetadataSummary(METADATA_SUMMARY_PATH)
+stage_latency = LatencyRecorder()
+
+# texto normalizado -> embedding
+embedding_cache = LRUCache(EMBEDDING_CACHE_SIZE, name="query_embeddings")
+# (hash del embedding, top_k, filtros) -> [(id, similitud)]; se vacía cuando cambia la generación de la ingestión
+result_cache = LRUCache(RESULT_CACHE_SIZE, name="retrieval_results")
+_result_cache_generation = read_generation(GENERATION_FILE_PATH)
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+def embed_query(query: str) -> list[float]:
+    """Devuelve el embedding de la query, usando la caché LRU por texto normalizado."""
+    return embed_queries([query])[0]
+
+def embed_queries(queries: list[str]) -> list[list[float]]:
+    """
+    Devuelve los embeddings de varias queries. Las que no están en caché se
+    codifican juntas en una sola llamada al modelo.
+    """
+    keys = [_normalize_query(q) for q in queries]
+    embeddings = [embedding_cache.get(key) for key in keys]
+
+    missing = list(dict.fromkeys(key for key, emb in zip(keys, embeddings) if emb is None))
+    if missing:
+        with stage_latency.measure("embed"):
+            computed = dict(zip(missing, embedding_function.embed_documents(missing)))
+        for key, emb in computed.items():
+            embedding_cache.put(key, emb)
+        embeddings = [emb if emb is not None else computed[key] for key, emb in zip(keys, embeddings)]
+
+    return embeddings
+
+def _embedding_key(embedding: list[float]) -> str:
+    return hashlib.sha1(array("f", embedding).tobytes()).hexdigest()
+
+def _check_generation():
+    """Invalida la caché de resultados si la ingestión agregó documentos nuevos."""
+    global _result_cache_generation
+    generation = read_generation(GENERATION_FILE_PATH)
+    if generation != _result_cache_generation:
+        print(f"DEBUG: La generación de la ingestión cambió ({_result_cache_generation} -> {generation}). Vaciando caché de resultados.")
+        result_cache.clear()
+        _result_cache_generation = generation
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = RRF_K) -> list[str]:
+    """Fusiona varios rankings de ids con Reciprocal Rank Fusion."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))
+
+def _fuse_with_sparse(query: str, dense_ids: list[str], dense_docs: list[Document], dense_scores: list[float],
+                      top_k: int, filters: dict = None) -> tuple[list[str], list[Document], list[float]]:
+    """
+    Combina el ranking denso con el de BM25 y completa los documentos que solo encontró BM25.
+    El índice léxico no tiene metadatos, así que sus resultados se filtran después de recuperarlos.
+    Los documentos que solo encontró BM25 no tienen similitud densa y quedan con score None
+    (sin metadata["score"]): el orden fusionado no es un orden por similitud.
+    """
+    with stage_latency.measure("sparse"):
+        sparse_hits = sparse_index.search(query, max(top_k, HYBRID_CANDIDATES))
+    if not sparse_hits:
+        return dense_ids[:top_k], dense_docs[:top_k], dense_scores[:top_k]
+
+    with stage_latency.measure("fusion"):
+        fused_ids = reciprocal_rank_fusion([dense_ids, [doc_id for doc_id, _ in sparse_hits]])
+    if not filters:
+        fused_ids = fused_ids[:top_k]
+
+    # Con filtros se traen los metadatos de todos los candidatos fusionados y se filtra antes
+    # de cortar: si no, los que no pasan el filtro dejan menos de top_k resultados
+    docs_by_id = dict(zip(dense_ids, dense_docs))
+    scores_by_id = dict(zip(dense_ids, dense_scores))
+    missing = [doc_id for doc_id in fused_ids if doc_id not in docs_by_id]
+    if missing:
+        with stage_latency.measure("fetch"):
+            docs_by_id.update(search_backend.fetch(missing))
 
-def retrieve_chunks(query: str, top_k: int = 3) -> list[Document]:
+    fused_ids = [
+        doc_id for doc_id in fused_ids
+        if doc_id in docs_by_id and matches(docs_by_id[doc_id].metadata, filters)
+    ][:top_k]
+    return (fused_ids, [docs_by_id[doc_id] for doc_id in fused_ids],
+            [scores_by_id.get(doc_id) for doc_id in fused_ids])
+
+def _with_scores(docs: list[Document], scores: list[Optional[float]]) -> list[Document]:
+    """Copia de los documentos con la similitud coseno con la query en metadata["score"] (si la tienen)."""
+    return [
+        Document(page_content=doc.page_content,
+                 metadata={**doc.metadata, "score": round(float(score), 4)} if score is not None else dict(doc.metadata))
+        for doc, score in zip(docs, scores)
+    ]
+
+def _search(queries: list[str], embeddings: list[list[float]], top_k: int, filters: list[dict]) -> list[list[Document]]:
+    """
+    Busca los top_k chunks de cada query. Los que no están en la caché de
+    resultados se resuelven con una consulta multi-query al backend por cada
+    combinación de filtros y, en modo híbrido, se fusionan con BM25.
+    Cada chunk lleva su similitud con la query en metadata["score"].
     """
-    Recupera los chunks más relevantes de ChromaDB de forma obligatoria.
+    cache_keys = [(_embedding_key(emb), top_k, filters_key(f)) for emb, f in zip(embeddings, filters)]
+    cached = [result_cache.get(key) for key in cache_keys]
+    results = [None] * len(embeddings)
+
+    groups = {}
+    for i, hits in enumerate(cached):
+        if hits is None:
+            groups.setdefault(cache_keys[i][2], []).append(i)
+
+    hybrid = RETRIEVAL_MODE == "hybrid"
+    n_dense = max(top_k, HYBRID_CANDIDATES) if hybrid else top_k
+    for pending in groups.values():
+        group_filters = filters[pending[0]]
+        print(f"DEBUG: Ejecutando similarity_search con k={n_dense} para {len(pending)} queries (modo {RETRIEVAL_MODE}, filtros {group_filters or 'ninguno'})...")
+        with stage_latency.measure("dense"):
+            ids, docs, scores = search_backend.query([embeddings[i] for i in pending], n_dense, filters=group_filters)
+        for row, i in enumerate(pending):
+            if hybrid:
+                found_ids, found_docs, found_scores = _fuse_with_sparse(
+                    queries[i], ids[row], docs[row], scores[row], top_k, group_filters
+                )
+            else:
+                found_ids, found_docs, found_scores = ids[row], docs[row], scores[row]
+            results[i] = _with_scores(found_docs, found_scores)
+            result_cache.put(cache_keys[i], list(zip(found_ids, found_scores)))
+
+    for i, hits in enumerate(cached):
+        if hits is not None:
+            print(f"DEBUG: Resultado en caché ({len(hits)} ids). Se omite similarity_search.")
+            with stage_latency.measure("fetch"):
+                docs_by_id = search_backend.fetch([doc_id for doc_id, _ in hits])
+            hits = [(doc_id, score) for doc_id, score in hits if doc_id in docs_by_id]
+            results[i] = _with_scores([docs_by_id[doc_id] for doc_id, _ in hits], [score for _, score in hits])
+
+    return results
+
+def get_cache_stats() -> dict:
+    """Contadores de aciertos/fallos de las cachés y latencia por etapa del retriever."""
+    return {
+        "generation": _result_cache_generation,
+        "embedding_cache": embedding_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "backend": RETRIEVER_BACKEND,
+        "backend_status": search_backend.status(),
+        "retrieval_mode": RETRIEVAL_MODE,
+        "sparse_index": sparse_index.status(),
+        "stage_latency": stage_latency.stats(),
+    }
+
+def _resolve_filters(query: str, filters: Optional[dict], ticker_hints: Optional[list[str]] = None) -> tuple[dict, bool]:
+    """Devuelve (filtros, inferidos). Con filters=None se deducen de la pregunta; {} desactiva el filtrado."""
+    if filters is not None or not INFER_FILTERS:
+        return filters or {}, False
+    inferred = infer_filters(query, metadata_summary, ticker_hints)
+    return inferred, bool(inferred)
+
+def retrieve_chunks(query: str, top_k: int = 3, filters: Optional[dict] = None,
+                    ticker_hints: Optional[list[str]] = None) -> list[Document]:
+    """
+    Recupera los chunks más relevantes del backend configurado (ChromaDB por defecto).
+    Acepta filtros de metadatos ({"ticker": "AAPL", "year": 2021}); si no se pasan y
+    RETRIEVAL_INFER_FILTERS está activo, se deducen de la pregunta (y de `ticker_hints`).
     Devuelve una lista vacía si no hay resultados o si ocurre un error.
     """
     print("\n--- retrieve_chunks ---")
@@ -33,17 +260,15 @@ def retrieve_chunks(query: str, top_k: int = 3) -> list[Document]:
         return []
 
     try:
-        print(f"DEBUG: Intentando conectar a ChromaDB en: {CHROMA_PERSIST_DIR}")
-        vectorstore = Chroma(
-            collection_name=COLLECTION_NAME,
-            embedding_function=embedding_function,
-            persist_directory=CHROMA_PERSIST_DIR
-        )
-        print("DEBUG: Conexión a ChromaDB exitosa.")
-
-        print(f"DEBUG: Ejecutando similarity_search con k={top_k}...")
-        results = vectorstore.similarity_search(query, k=top_k)
-        
+        _check_generation()
+
+        query_filters, inferred = _resolve_filters(query, filters, ticker_hints)
+        embedding = embed_query(query)
+        results = _search([query], [embedding], top_k, [query_filters])[0]
+        if not results and inferred:
+            print(f"DEBUG: Sin resultados con los filtros deducidos {query_filters}. Reintentando sin filtros.")
+            results = _search([query], [embedding], top_k, [{}])[0]
+
         if not results:
             print("DEBUG: La búsqueda no arrojó resultados. La base de datos puede estar vacía o el contenido no es relevante.")
             print("--- Fin de retrieve_chunks ---\n")
@@ -54,8 +279,54 @@ def retrieve_chunks(query: str, top_k: int = 3) -> list[Document]:
         return results
 
     except Exception as e:
-        logger.error(f" retriever.py: Error crítico al conectar o buscar en ChromaDB: {e}")
+        search_backend.mark_unhealthy()
+        logger.error(f" retriever.py: Error crítico al conectar o buscar en el backend: {e}")
         print(f"DEBUG: La excepción fue: {e}")
         print("DEBUG: Devolviendo lista vacía debido a un error.")
         print("--- Fin de retrieve_chunks ---\n")
-        return []
\ No newline at end of file
+        return []
+
+def retrieve_chunks_batch(queries: list[str], top_k: int = 3, filters: Optional[list[dict]] = None) -> list[list[Document]]:
+    """
+    Versión por lotes de retrieve_chunks para evaluaciones y fan-out de queries.
+    Codifica todas las queries en una sola pasada del modelo y hace una única
+    búsqueda multi-query por combinación de filtros. Devuelve una lista de
+    resultados por query (vacía si falla).
+    """
+    print(f"\n--- retrieve_chunks_batch ({len(queries)} queries) ---")
+
+    if not queries:
+        return []
+
+    if not embedding_function:
+        logger.error(" retriever.py: El embedding_function no está disponible. No se puede buscar.")
+        return [[] for _ in queries]
+
+    try:
+        _check_generation()
+
+        resolved = [_resolve_filters(q, None if filters is None else filters[i]) for i, q in enumerate(queries)]
+        embeddings = embed_queries(queries)
+        results = _search(queries, embeddings, top_k, [query_filters for query_filters, _ in resolved])
+
+        # Igual que retrieve_chunks: si los filtros deducidos no encuentran nada, se reintenta sin filtros
+        retry = [i for i, (_, inferred) in enumerate(resolved) if inferred and not results[i]]
+        if retry:
+            print(f"DEBUG: {len(retry)} queries sin resultados con los filtros deducidos. Reintentando sin filtros.")
+            retried = _search([queries[i] for i in retry], [embeddings[i] for i in retry], top_k, [{} for _ in retry])
+            for i, found in zip(retry, retried):
+                results[i] = found
+        print(f"DEBUG: Búsqueda por lotes encontró {sum(len(r) for r in results)} chunks en total.")
+        print("--- Fin de retrieve_chunks_batch ---\n")
+        return results
+
+    except Exception as e:
+        search_backend.mark_unhealthy()
+        logger.error(f" retriever.py: Error crítico en la búsqueda por lotes: {e}")
+        print("--- Fin de retrieve_chunks_batch ---\n")
+        return [[] for _ in queries]
+
+async def retrieve_chunks_async(query: str, top_k: int = 3, filters: Optional[dict] = None,
+                                ticker_hints: Optional[list[str]] = None) -> list[Document]:
+    """Versión asíncrona de retrieve_chunks: la búsqueda corre en el pool acotado de retrieval."""
+    return await run_in_retrieval_pool(retrieve_chunks, query, top_k, filters, ticker_hints)
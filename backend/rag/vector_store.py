@@ -1 +1,160 @@
+# /app/rag/vector_store.py
 
+import os
+import logging
+import threading
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Archivos del directorio persistente cuyo cambio indica que otro proceso (la ingestión) escribió en la base.
+_WATCHED_FILES = ("chroma.sqlite3", "chroma.sqlite3-wal", "ingestion_generation")
+
+
+def to_chroma_where(filters: dict):
+    """Traduce {"ticker": "AAPL", "year": [2020, 2021]} al formato `where` de Chroma."""
+    clauses = [
+        {field: {"$in": list(value)} if isinstance(value, (list, tuple, set)) else value}
+        for field, value in (filters or {}).items()
+    ]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def distance_to_similarity(distance: float, space: str = "l2") -> float:
+    """
+    Convierte la distancia de Chroma en similitud coseno. Los embeddings de MiniLM
+    están normalizados, así que con l2 (distancia al cuadrado) coseno = 1 - d/2.
+    """
+    if space == "l2":
+        return 1.0 - distance / 2.0
+    # "cosine" e "ip" devuelven 1 - similitud
+    return 1.0 - distance
+
+
+class WarmCollection:
+    """
+    Mantiene una única instancia "caliente" de la colección de ChromaDB por proceso.
+
+    La colección se abre una sola vez y se reutiliza entre peticiones concurrentes.
+    Se reabre automáticamente si cambia el directorio persistente (por ejemplo después
+    de una corrida de ingestión) o si una búsqueda la marcó como no saludable.
+    """
+
+    def __init__(self, collection_name: str, embedding_function, persist_directory: str):
+        self.collection_name = collection_name
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+
+        self._lock = threading.Lock()
+        self._store = None
+        self._signature = None
+        self._healthy = False
+        self.reopen_count = 0
+
+    def _persist_signature(self) -> tuple:
+        """Huella barata (solo stat) del directorio persistente."""
+        signature = [os.path.realpath(self.persist_directory)]
+        for name in ("",) + _WATCHED_FILES:
+            try:
+                st = os.stat(os.path.join(self.persist_directory, name))
+                signature.append((st.st_ino, st.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _detach_cached_client(self, store):
+        """
+        Chroma cachea el sistema por ruta; para releer los segmentos hay que sacarlo de esa caché.
+        Solo se quita la entrada de esta ruta y sin detenerlo (clear_system_cache vacía la de todas
+        las rutas, bajo los pies de los demás clientes): las búsquedas en curso sobre la colección
+        vieja terminan con su sistema, que se libera cuando nadie más lo referencia.
+        """
+        try:
+            from chromadb.api.client import SharedSystemClient
+            identifier = SharedSystemClient._get_identifier_from_settings(store._client.get_settings())
+            SharedSystemClient._identifier_to_system.pop(identifier, None)
+        except Exception as e:
+            logger.warning(f" vector_store.py: No se pudo soltar el cliente cacheado de Chroma: {e}")
+
+    def _open(self, signature: tuple):
+        """Abre la colección y verifica que responda. Debe llamarse con el lock tomado."""
+        if self._store is not None:
+            self._detach_cached_client(self._store)
+
+        store = Chroma(
+            collection_name=self.collection_name,
+            embedding_function=self.embedding_function,
+            persist_directory=self.persist_directory
+        )
+        count = store._collection.count()
+
+        # Se cambia la referencia; quien ya tomó la colección vieja sigue usándola hasta terminar
+        self._store = store
+        self._signature = signature
+        self._healthy = True
+        self.reopen_count += 1
+        logger.info(f" vector_store.py: Colección '{self.collection_name}' abierta con {count} documentos.")
+        return store
+
+    def get(self):
+        """
+        Devuelve la colección abierta, reabriéndola solo si hace falta.
+        Lanza la excepción original si no se puede abrir.
+        """
+        signature = self._persist_signature()
+        store = self._store
+        if store is not None and self._healthy and signature == self._signature:
+            return store
+
+        with self._lock:
+            # Otro hilo pudo haberla reabierto mientras esperábamos el lock.
+            if self._store is not None and self._healthy and signature == self._signature:
+                return self._store
+            return self._open(signature)
+
+    def query(self, embeddings: list[list[float]], top_k: int, filters: dict = None) -> tuple[list[list[str]], list[list[Document]], list[list[float]]]:
+        """
+        Búsqueda multi-query sobre la colección. Devuelve (ids, documentos, similitudes) por query.
+        Los filtros se resuelven en Chroma sobre los metadatos indexados antes de la búsqueda vectorial.
+        """
+        collection = self.get()._collection
+        found = collection.query(
+            query_embeddings=embeddings,
+            n_results=top_k,
+            where=to_chroma_where(filters),
+            include=["documents", "metadatas", "distances"]
+        )
+        docs = [
+            [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+            for texts, metadatas in zip(found["documents"], found["metadatas"])
+        ]
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        scores = [[distance_to_similarity(d, space) for d in distances] for distances in found["distances"]]
+        return found["ids"], docs, scores
+
+    def fetch(self, ids: list[str]) -> dict[str, Document]:
+        """Recupera documentos por id. Los ids inexistentes no aparecen en el resultado."""
+        if not ids:
+            return {}
+        found = self.get()._collection.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            doc_id: Document(page_content=text, metadata=metadata or {})
+            for doc_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+
+    def mark_unhealthy(self):
+        """Fuerza la reapertura en la próxima llamada (por ejemplo tras un error de búsqueda)."""
+        self._healthy = False
+
+    def status(self) -> dict:
+        """Estado actual del handle, útil para health checks y métricas."""
+        return {
+            "collection": self.collection_name,
+            "persist_directory": self.persist_directory,
+            "open": self._store is not None,
+            "healthy": self._healthy,
+            "reopen_count": self.reopen_count,
+        }
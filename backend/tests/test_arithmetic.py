@@ -0,0 +1,87 @@
+# /app/tests/test_arithmetic.py
+# Ejecutar desde backend/: python -m pytest tests
+
+from decimal import Decimal
+
+import pytest
+
+from calculations.arithmetic import arithmetic_answer, evaluate, format_decimal, to_expression
+
+
+def _value(question):
+    parsed = to_expression(question)
+    assert parsed is not None, question
+    expression, numbers, _ = parsed
+    return evaluate(expression, numbers)
+
+
+@pytest.mark.parametrize("question, expected", [
+    # Porcentajes
+    ("¿cuánto es 15% de 2300?", "345"),
+    ("15 % del 80", "12"),
+    ("what is 12% of 800", "96"),
+    ("20 por ciento de 150", "30"),
+    ("10%", "0.1"),
+    ("-20%", "-0.2"),
+    # Porcentaje sobre el término anterior
+    ("100 + 10%", "110"),
+    ("100 más 10%", "110"),
+    ("100 menos 20%", "80"),
+    ("50 - 10 por ciento", "45"),
+    ("2 * 50 + 10%", "110"),
+    ("100 + 10% de 50", "105"),
+    # Operadores en palabras
+    ("¿cuánto es 340 dividido 4?", "85"),
+    ("340 dividido entre 4", "85"),
+    ("100 entre 4", "25"),
+    ("suma 1200 más 350", "1550"),
+    ("1200 plus 350", "1550"),
+    ("10 menos 3", "7"),
+    ("6 multiplicado por 7", "42"),
+    ("6 por 7", "42"),
+    ("3x4", "12"),
+    ("2 elevado a 10", "1024"),
+    ("2 to the power of 3", "8"),
+    ("7 al cuadrado", "49"),
+    ("3 al cubo", "27"),
+    ("raíz cuadrada de 144", "12"),
+    ("raiz cuadrada de (16+9)", "5"),
+    ("valor absoluto de -5", "5"),
+    # Números con separadores y multiplicadores
+    ("calcula 2500*1.07^5", "3506.37932675"),
+    ("1000*1.005^12", "1061.677811864499568789707617431640625"),
+    ("2500*1.075^10", "5152.5789054117796421051025390625"),
+    ("0.125*8", "1"),
+    ("1.000.000 / 4", "250000"),
+    ("(1.500,50 - 200) / 3", "433.5"),
+    ("0,1 + 0,2", "0.3"),
+    ("2 mil por 3", "6000"),
+])
+def test_phrasing(question, expected):
+    assert _value(question) == Decimal(expected)
+
+
+@pytest.mark.parametrize("question", [
+    "¿qué hace Apple?",
+    "dime 5 por favor",          # sin operador no es una cuenta
+    "__import__('os')",
+    "(100 + 10%)",               # porcentaje relativo dentro de un paréntesis abierto: ambiguo
+    "raíz de",
+])
+def test_not_arithmetic(question):
+    assert to_expression(question) is None
+
+
+def test_large_integers_are_exact():
+    assert _value("12345678901234567890*98765432109876543210") == Decimal(12345678901234567890 * 98765432109876543210)
+
+
+def test_division_by_zero_and_limits():
+    assert "división por cero" in arithmetic_answer("10 / 0")
+    assert arithmetic_answer("2**99999999") is None
+
+
+def test_format_decimal():
+    assert format_decimal(Decimal("1550")) == "1.550"
+    assert format_decimal(Decimal(1) / Decimal(3)) == "≈ 0,333333"
+    assert format_decimal(Decimal("0.0000001")).startswith("≈ 1,000000 × 10^-7")
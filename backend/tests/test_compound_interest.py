@@ -0,0 +1,32 @@
+# /app/tests/test_compound_interest.py
+# Ejecutar desde backend/: python -m pytest tests
+
+import pytest
+
+from calculations.compound_interest import compound_interest_answer, future_values, parse_question
+
+
+@pytest.mark.parametrize("question, principal, base_rate", [
+    ("10000 al 2.125% durante 10 años", 10000, 2.125),
+    ("10.000 dólares al 6,5% anual por 10 años", 10000, 6.5),
+    ("invierto 1.500 al 0.125% por 5 años", 1500, 0.125),
+])
+def test_parse_rate_and_principal(question, principal, base_rate):
+    query = parse_question(question)
+    assert query.principal == principal
+    assert query.base_rate == pytest.approx(base_rate)
+
+
+def test_rate_with_three_decimals_is_answered():
+    answer = compound_interest_answer("10000 al 2.125% durante 10 años")
+    assert answer.startswith("### Proyección de interés compuesto")
+    assert "2,125 %" in answer
+
+
+def test_future_value():
+    grid = future_values(1000, [0.05], [10])
+    assert grid[0, 0] == pytest.approx(1000 * 1.05 ** 10)
+
+
+def test_out_of_range():
+    assert "supera" in compound_interest_answer("1000 al 900% mensual durante 500 años")
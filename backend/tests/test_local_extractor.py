@@ -0,0 +1,39 @@
+# /app/tests/test_local_extractor.py
+# Ejecutar desde backend/: python -m pytest tests
+
+import pytest
+
+from llm.local_extractor import normalize_number, parse_number
+
+
+@pytest.mark.parametrize("token, expected", [
+    ("1.500", "1500"),
+    ("1,500", "1500"),
+    ("1.000.000", "1000000"),
+    ("1,500.25", "1500.25"),
+    ("1.500,25", "1500.25"),
+    ("12,5", "12.5"),
+    ("2.5", "2.5"),
+    # Detrás de un 0 solo el separador nunca es de miles
+    ("0.125", "0.125"),
+    ("0,500", "0.500"),
+])
+def test_normalize_number(token, expected):
+    assert normalize_number(token) == expected
+
+
+@pytest.mark.parametrize("token, expected", [
+    ("1.005", "1.005"),
+    ("1.075", "1.075"),
+    ("2.125", "2.125"),
+    ("1.000.000", "1000000"),
+    ("1.500,25", "1500.25"),
+    ("1,500", "1500"),
+])
+def test_normalize_number_decimal_point(token, expected):
+    assert normalize_number(token, decimal_point=True) == expected
+
+
+def test_parse_number_multiplier():
+    assert parse_number("1,5", "millones") == 1.5e6
+    assert parse_number("abc") is None
@@ -129,6 +129,7 @@ function App() {
         },
         body: JSON.stringify({
           question: messageText,
+          chat_id: String(currentChatId),
           chat_history: updatedUserMessages.map(msg => ({
             role: msg.sender === 'user' ? 'user' : 'assistant',
             content: msg.text,